@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Batched, cached resolution of handles (and DIDs) to profiles.
+
+Every crawl used to start with one blocking `getProfile` per account just
+to learn a DID that almost never changes. ActorResolver answers from a
+small SQLite file (`actors.db`) instead, and looks up whatever is missing
+or expired with `app.bsky.actor.getProfiles`, 25 actors per call: 1,000
+handles resolve in 40 requests cold and none warm.
+    - entries are keyed by DID, with the handle indexed for lookups, and
+      expire after ACTOR_TTL
+    - handles move: when a fetched profile shows an account under a new
+      handle, its old handle stops resolving to it; when another account
+      claims a handle, the previous holder loses it; a handle the server
+      no longer resolves is forgotten
+    - observe(did, handle) applies handle changes seen elsewhere (e.g.
+      Jetstream identity events) without a request
+    - if a lookup fails, expired entries are served rather than nothing
+
+Usage:
+    resolver = get_resolver()
+    profiles = resolver.resolve_many(['iwriteok.bsky.social', 'did:plc:...'], BASE_URL)
+    python3 actor_resolver.py iwriteok.bsky.social other.bsky.social
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from transport import xrpc_get
+
+BASE_URL = "https://public.api.bsky.app/xrpc"
+RESOLVER_PATH = 'actors.db'
+
+# getProfiles accepts at most this many actors per call
+BATCH_SIZE = 25
+
+# Seconds a resolved profile is trusted before it's looked up again
+ACTOR_TTL = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS actors (
+    did TEXT PRIMARY KEY,
+    handle TEXT,
+    profile TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_actors_handle ON actors(handle);
+"""
+
+def normalize_actor(actor: str) -> str:
+    """DIDs as given; handles lowercased, without a leading '@'."""
+    actor = actor.strip()
+    if actor.startswith('did:'):
+        return actor
+    return actor.lstrip('@').lower()
+
+class ActorResolver:
+    """Handle/DID -> profile cache backed by SQLite, filled in getProfiles batches."""
+
+    def __init__(self, path: Optional[str] = RESOLVER_PATH, ttl: float = ACTOR_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ':memory:', check_same_thread=False, timeout=30)
+        if path:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.stats = {'hits': 0, 'misses': 0, 'requests': 0, 'handle_changes': 0}
+
+    def _lookup(self, actor: str) -> Optional[Dict]:
+        """Cached row for a normalized handle or DID: {'profile', 'fresh'}."""
+        column = 'did' if actor.startswith('did:') else 'handle'
+        row = self.conn.execute(
+            f'SELECT profile, fetched_at FROM actors WHERE {column} = ?', (actor,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'profile': json.loads(row[0]), 'fresh': row[1] + self.ttl > time.time()}
+
+    def _store(self, profile: Dict):
+        did, handle = profile['did'], profile['handle'].lower()
+        previous = self.conn.execute('SELECT handle FROM actors WHERE did = ?', (did,)).fetchone()
+        if previous and previous[0] != handle:
+            self.stats['handle_changes'] += 1
+        # A handle belongs to one account at a time
+        self.conn.execute('UPDATE actors SET handle = NULL WHERE handle = ? AND did != ?', (handle, did))
+        self.conn.execute(
+            'INSERT OR REPLACE INTO actors (did, handle, profile, fetched_at) VALUES (?, ?, ?, ?)',
+            (did, handle, json.dumps(profile, ensure_ascii=False), time.time())
+        )
+
+    def _fetch(self, actors: List[str], base_url: str) -> List[Dict]:
+        self.stats['requests'] += 1
+        # Not through the response cache: it could hand back a handle observe() just replaced
+        return xrpc_get(base_url, 'app.bsky.actor.getProfiles', {'actors': actors},
+                        use_cache=False).get('profiles', [])
+
+    def resolve_many(self, actors: Iterable[str], base_url: str = BASE_URL) -> Dict[str, Optional[Dict]]:
+        """
+        Profiles keyed by each actor as given (None if it doesn't resolve).
+
+        Fresh cache entries cost nothing; the rest are fetched BATCH_SIZE at a time.
+        """
+        actors = list(actors)
+        resolved: Dict[str, Optional[Dict]] = {}
+        stale: Dict[str, Dict] = {}
+        missing: List[str] = []
+
+        with self.lock:
+            for actor in dict.fromkeys(map(normalize_actor, actors)):
+                cached = self._lookup(actor)
+                if cached and cached['fresh']:
+                    self.stats['hits'] += 1
+                    resolved[actor] = cached['profile']
+                    continue
+                self.stats['misses'] += 1
+                if cached:
+                    stale[actor] = cached['profile']
+                missing.append(actor)
+
+            for start in range(0, len(missing), BATCH_SIZE):
+                batch = missing[start:start + BATCH_SIZE]
+                try:
+                    profiles = self._fetch(batch, base_url)
+                except Exception as e:
+                    print(f"Error resolving {len(batch)} actors: {e}")
+                    resolved.update((actor, stale.get(actor)) for actor in batch)
+                    continue
+
+                found = {}
+                with self.conn:
+                    for profile in profiles:
+                        self._store(profile)
+                        found[profile['did']] = found[profile['handle'].lower()] = profile
+                    for actor in batch:
+                        if actor not in found:
+                            # Gone: a deleted account, or a handle nobody holds any more
+                            if actor.startswith('did:'):
+                                self.conn.execute('DELETE FROM actors WHERE did = ?', (actor,))
+                            else:
+                                self.conn.execute('UPDATE actors SET handle = NULL WHERE handle = ?', (actor,))
+                        resolved[actor] = found.get(actor)
+
+        return {actor: resolved[normalize_actor(actor)] for actor in actors}
+
+    def resolve(self, actor: str, base_url: str = BASE_URL) -> Optional[Dict]:
+        return self.resolve_many([actor], base_url)[actor]
+
+    def observe(self, did: str, handle: str) -> bool:
+        """Record that did now uses handle (from an authoritative source). True if that changed it."""
+        handle = normalize_actor(handle)
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT handle, profile FROM actors WHERE did = ?', (did,)).fetchone()
+            holder = self.conn.execute('SELECT did FROM actors WHERE handle = ?', (handle,)).fetchone()
+            if (row is None or row[0] == handle) and (holder is None or holder[0] == did):
+                return False
+
+            self.stats['handle_changes'] += 1
+            self.conn.execute('UPDATE actors SET handle = NULL WHERE handle = ? AND did != ?', (handle, did))
+            if row is not None:
+                profile = {**json.loads(row[1]), 'handle': handle}
+                # Expired, so the rest of the profile is refreshed on next use
+                self.conn.execute('UPDATE actors SET handle = ?, profile = ?, fetched_at = 0 WHERE did = ?',
+                                  (handle, json.dumps(profile, ensure_ascii=False), did))
+            return True
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM actors')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_resolver: Optional[ActorResolver] = None
+_resolver_lock = threading.Lock()
+
+def get_resolver() -> ActorResolver:
+    """The process-wide resolver (opened on first use)."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = ActorResolver()
+    return _resolver
+
+def set_resolver(resolver: ActorResolver):
+    """Replace the process-wide resolver (e.g. ActorResolver(None) for an in-memory one)."""
+    global _resolver
+    _resolver = resolver
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve Bluesky handles/DIDs in batches, with a local cache")
+    parser.add_argument('actors', nargs='+', help="handles or DIDs")
+    parser.add_argument('--db', default=RESOLVER_PATH, help=f"resolver cache (default {RESOLVER_PATH})")
+    parser.add_argument('--base-url', default=BASE_URL)
+    args = parser.parse_args()
+
+    with ActorResolver(args.db) as resolver:
+        for actor, profile in resolver.resolve_many(args.actors, args.base_url).items():
+            if profile:
+                print(f"{actor}\t{profile['did']}\t@{profile['handle']}")
+            else:
+                print(f"{actor}\t(not found)")
+        print(f"\n{resolver.stats}")
+
+if __name__ == '__main__':
+    main()
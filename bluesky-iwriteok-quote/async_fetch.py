@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Concurrent multi-account fetcher for Bluesky author feeds.
+
+Crawls many handles/DIDs at once over a single keep-alive connection pool
+instead of walking one account at a time with blocking requests. Each
+account's pages are still fetched in cursor order; the concurrency comes
+from crawling accounts side by side. A post reposted by several of the
+accounts is kept once (by CID), under whichever account reached it first.
+
+Requirements:
+    pip install aiohttp requests
+
+Usage:
+    python3 async_fetch.py iwriteok.bsky.social did:plc:... --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Collection, Dict, List, Optional
+
+import aiohttp
+
+import rate_limit
+from cid_set import CidSet
+from crawl_metrics import METRICS
+from feed_decoder import feed_item_to_post
+from rate_limit import MAX_RETRIES, RETRY_STATUSES, backoff_delay, retry_delay
+from transport import DEFAULT_HEADERS
+from working_fetch_script import BASE_URL, FEED_FILTERS, FEED_REASONS, MAX_POSTS, filter_posts, resolve_dids
+
+# Maximum number of XRPC requests in flight at once across all accounts
+DEFAULT_CONCURRENCY = 8
+
+# Seconds an idle pooled connection is kept open for reuse
+KEEPALIVE_TIMEOUT = 30
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+async def xrpc_get(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                   method: str, params: Dict) -> Dict:
+    """GET an XRPC method through the shared rate limiter, retrying 429s, 5xx and network errors."""
+    url = f"{BASE_URL}/{method}"
+
+    for attempt in range(MAX_RETRIES + 1):
+        await rate_limit.LIMITER.acquire_async()
+        try:
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.get(url, params=params) as response:
+                    body = await response.read()
+                    METRICS.observe_request(method, response.status, time.perf_counter() - started,
+                                            len(body), params)
+                    rate_limit.LIMITER.update_from_headers(response.headers)
+                    if response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                        METRICS.record_retry(method, str(response.status))
+                        delay = retry_delay(attempt, response.headers)
+                        if response.status == 429:
+                            rate_limit.LIMITER.pause(delay)
+                            delay = 0
+                    else:
+                        response.raise_for_status()
+                        with METRICS.phase('parse'):
+                            return json.loads(body)
+
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            METRICS.record_error(method, e)
+            if attempt == MAX_RETRIES:
+                raise
+            METRICS.record_retry(method, e.__class__.__name__)
+            delay = backoff_delay(attempt)
+
+        # Sleep outside the semaphore so waiting retries don't hold a connection slot
+        await asyncio.sleep(delay)
+
+async def get_author_feed(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                          actor: str, limit: int = 100, cursor: Optional[str] = None,
+                          feed_filter: Optional[str] = None) -> Dict:
+    """Get one page of an author's feed through the shared session (raises once retries run out)."""
+    params = {'actor': actor, 'limit': str(limit)}
+    if cursor:
+        params['cursor'] = cursor
+    if feed_filter:
+        params['filter'] = feed_filter
+
+    return await xrpc_get(session, semaphore, 'app.bsky.feed.getAuthorFeed', params)
+
+async def fetch_author_posts(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                             actor: str, max_posts: int = MAX_POSTS, seen: Optional[CidSet] = None,
+                             reasons: Optional[Collection[str]] = None,
+                             feed_filter: Optional[str] = None) -> List[Dict]:
+    """Fetch all posts for one handle or DID, page by page, skipping CIDs already in seen."""
+    posts = []
+    cursor = None
+
+    while len(posts) < max_posts:
+        try:
+            response = await get_author_feed(session, semaphore, actor, limit=100, cursor=cursor,
+                                             feed_filter=feed_filter)
+        except Exception as e:
+            print(f"  @{actor}: crawl incomplete after {len(posts)} posts: {e}")
+            raise
+
+        if not response.get('feed'):
+            break
+
+        page_posts = [post for post in map(feed_item_to_post, response['feed']) if post]
+        posts.extend(filter_posts(page_posts, reasons, seen))
+
+        cursor = response.get('cursor')
+        if not cursor:
+            break
+
+    print(f"  @{actor}: {len(posts)} posts")
+    return posts
+
+async def fetch_many(actors: List[str], max_posts: int = MAX_POSTS,
+                     concurrency: int = DEFAULT_CONCURRENCY, seen: Optional[CidSet] = None,
+                     reasons: Optional[Collection[str]] = None,
+                     feed_filter: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """
+    Fetch posts for many actors concurrently, keyed by the actor as given; each CID once overall.
+
+    Handles are resolved to DIDs first, in getProfiles batches (or from the resolver cache).
+    """
+    if seen is None:
+        seen = CidSet()
+    dids = await asyncio.to_thread(resolve_dids, actors)
+    unique_dids = list(dict.fromkeys(dids.values()))
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT)
+
+    async with aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS,
+                                     timeout=REQUEST_TIMEOUT) as session:
+        results = await asyncio.gather(*(
+            fetch_author_posts(session, semaphore, did, max_posts, seen, reasons, feed_filter)
+            for did in unique_dids
+        ))
+
+    by_did = dict(zip(unique_dids, results))
+    # An account named twice (say by handle and by DID) is crawled once, under its first name
+    return {actor: by_did.pop(dids[actor], []) if actor in dids else [] for actor in actors}
+
+def fetch_all_posts_concurrent(actors: List[str], max_posts: int = MAX_POSTS,
+                               concurrency: int = DEFAULT_CONCURRENCY, seen: Optional[CidSet] = None,
+                               reasons: Optional[Collection[str]] = None,
+                               feed_filter: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """Blocking wrapper around fetch_many for use from scripts."""
+    return asyncio.run(fetch_many(actors, max_posts, concurrency, seen, reasons, feed_filter))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch many Bluesky author feeds concurrently")
+    parser.add_argument('actors', nargs='+', help="handles or DIDs to crawl")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"max requests in flight (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--max-posts', type=int, default=MAX_POSTS, help="max posts per actor")
+    parser.add_argument('--output', default='all_posts.json', help="where to save the combined posts")
+    parser.add_argument('--seen', default=None,
+                        help="persistent CID set file, to also skip posts fetched by earlier runs")
+    parser.add_argument('--filter', choices=FEED_FILTERS, default=None, help="server-side feed filter")
+    parser.add_argument('--skip-reposts', action='store_true', help="drop reposts of other accounts' posts")
+    args = parser.parse_args()
+
+    reasons = [reason for reason in FEED_REASONS if reason != 'repost'] if args.skip_reposts else None
+    print(f"Fetching {len(args.actors)} accounts with concurrency {args.concurrency}...")
+    with CidSet(args.seen) as seen:
+        results = fetch_all_posts_concurrent(args.actors, args.max_posts, args.concurrency,
+                                             seen, reasons, args.filter)
+
+    posts = [post for actor in args.actors for post in results[actor]]
+    print(f"\nFetched {len(posts)} total posts")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(posts, f, indent=2, ensure_ascii=False)
+    print(f"Saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
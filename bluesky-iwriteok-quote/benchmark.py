@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for fetching and scoring.
+
+Runs against the local stand-in server in `xrpc_stub_server.py` instead of
+public.api.bsky.app, so numbers are reproducible and every performance
+change can be compared against the same baseline. Reports:
+    - crawl: pages/sec, p50/p99 page latency, end-to-end crawl time, retries
+      caused by injected errors/429s, and connections opened (--connect-latency-ms
+      charges each new connection a handshake delay, as TLS to the AppView would). The server advertises the AppView's
+      3000 requests / 5 minutes budget by default, which the rate limiter
+      turns into ~10 pages/sec; raise --rate-limit to measure the client alone
+    - scoring: posts/sec for `calculate_relevance_score` and `search_posts`
+    - decoding: parse time and peak memory per 100-item page for
+      `json.loads` + `feed_item_to_post` vs `feed_decoder.decode_feed_page`,
+      on pages padded out to what the real AppView hydrates
+    - with --pipeline: crawl + score + write end to end, serially
+      (`fetch_all_posts`, `search_posts`, write) vs `pipeline.CrawlPipeline`.
+      The server runs in a child process for this, so its request handling
+      doesn't compete with the client's scoring for the GIL
+    - with --windowed: a single-account backfill along one cursor chain vs
+      `windowed_fetch`'s concurrently crawled time windows
+    - with --sharded N: `crawl_queue` draining --accounts accounts (the
+      server mirrors the captured one under extra DIDs) with 1 and N
+      worker processes. The workers share one rate budget, so this only
+      scales with --latency-ms and a raised --rate-limit
+
+The response cache is disabled for the crawl so every page hits the server.
+
+Usage:
+    python3 benchmark.py
+    python3 benchmark.py --latency-ms 80 --jitter-ms 20 --error-rate 0.02 --throttle-rate 0.01
+    python3 benchmark.py --connect-latency-ms 60 --rate-limit 1000000
+    python3 benchmark.py --latency-ms 20 --rate-limit 1000000 --pipeline
+    python3 benchmark.py --latency-ms 80 --rate-limit 1000000 --windowed
+    python3 benchmark.py --latency-ms 200 --rate-limit 1000000 --sharded 4
+    python3 benchmark.py --json > baseline.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from typing import Dict, List, Sequence
+
+import async_fetch
+import http_cache
+import rate_limit
+import transport
+import working_fetch_script
+from actor_resolver import ActorResolver, set_resolver
+from crawl_queue import CrawlQueue, run_workers
+from feed_decoder import decode_feed_page, feed_item_to_post
+from jsonl_store import append_posts
+from pipeline import CrawlPipeline
+from windowed_fetch import fetch_windowed
+from working_fetch_script import (KEYWORDS, calculate_relevance_score, fetch_all_posts, get_profile,
+                                  iter_feed_pages, search_posts)
+from xrpc_stub_server import HANDLE, MAX_PAGE, StubConfig, StubXrpcServer, build_feed, load_posts
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def _reset_client(base_url: str):
+    """Point the client at base_url with no response cache, resolver cache or spent rate budget."""
+    working_fetch_script.BASE_URL = async_fetch.BASE_URL = base_url
+    http_cache.set_cache(None)
+    set_resolver(ActorResolver(None))
+    # Fresh bucket so one run's budget doesn't leak into the next
+    rate_limit.LIMITER = rate_limit.RateLimiter()
+
+def bench_crawl(server: StubXrpcServer, handle: str = HANDLE) -> Dict:
+    """Crawl the stand-in server's account page by page and time it."""
+    _reset_client(server.base_url)
+    # Start with an empty connection pool so handshakes are counted
+    transport.close_session()
+
+    requests_before = server.requests
+    connections_before = server.connections
+    start = time.perf_counter()
+
+    profile = get_profile(handle)
+    if not profile:
+        raise RuntimeError("stand-in server did not return a profile")
+
+    latencies = []
+    posts = 0
+    pages = iter_feed_pages(profile['did'])
+    while True:
+        page_start = time.perf_counter()
+        try:
+            page_posts, _ = next(pages)
+        except StopIteration:
+            break
+        latencies.append(time.perf_counter() - page_start)
+        posts += len(page_posts)
+
+    elapsed = time.perf_counter() - start
+    requests = server.requests - requests_before
+
+    return {
+        'pages': len(latencies),
+        'posts': posts,
+        'requests': requests,
+        'retries': requests - len(latencies) - 1,
+        'connections': server.connections - connections_before,
+        'crawl_seconds': round(elapsed, 4),
+        'pages_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'page_latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'page_latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+def _serve(posts: List[Dict], config: StubConfig, conn, mirror_dids: Sequence[str] = ()):
+    with StubXrpcServer(posts, config, mirror_dids=mirror_dids) as server:
+        conn.send(server.base_url)
+        # Serve until the parent says stop
+        conn.recv()
+
+@contextmanager
+def stub_in_subprocess(posts: List[Dict], config: StubConfig, mirror_dids: Sequence[str] = ()):
+    """Run a stand-in server in a child process; yields its base URL."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(posts, config, child, mirror_dids), daemon=True)
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        parent.send(None)
+        process.join()
+
+def bench_pipeline(base_url: str, handle: str = HANDLE) -> Dict:
+    """Crawl, score and write the account serially, then through CrawlPipeline."""
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        _reset_client(base_url)
+        start = time.perf_counter()
+        posts = fetch_all_posts(handle, max_posts=10 ** 6)
+        network_seconds = time.perf_counter() - start
+        matches = search_posts(posts, KEYWORDS)
+        with open(os.path.join(tmp, 'serial.jsonl'), 'w', encoding='utf-8') as f:
+            append_posts(f, posts)
+        with open(os.path.join(tmp, 'serial_matches.jsonl'), 'w', encoding='utf-8') as f:
+            append_posts(f, matches)
+        serial_seconds = time.perf_counter() - start
+
+        _reset_client(base_url)
+        pipeline = CrawlPipeline([handle], os.path.join(tmp, 'pipelined.jsonl'),
+                                 os.path.join(tmp, 'pipelined_matches.jsonl'), max_posts=10 ** 6)
+        pipelined_matches = pipeline.run()
+
+    stats = pipeline.stats
+    return {
+        'posts': stats['posts'],
+        'matches': stats['matches'],
+        'same_matches': [m['uri'] for m in matches] == [m['uri'] for m in pipelined_matches],
+        'network_seconds': round(network_seconds, 4),
+        'serial_seconds': round(serial_seconds, 4),
+        'pipelined_seconds': stats['seconds'],
+        'busy_seconds': {stage: round(seconds, 4) for stage, seconds in stats['busy_seconds'].items()},
+    }
+
+def bench_windowed(base_url: str, handle: str = HANDLE, workers: int = 8) -> Dict:
+    """Backfill the account with one cursor chain, then as parallel time windows."""
+    with redirect_stdout(io.StringIO()):
+        _reset_client(base_url)
+        start = time.perf_counter()
+        posts = fetch_all_posts(handle, max_posts=10 ** 6)
+        serial_seconds = time.perf_counter() - start
+
+        _reset_client(base_url)
+        start = time.perf_counter()
+        windowed, stats = asyncio.run(fetch_windowed(handle, 10 ** 6, workers))
+        windowed_seconds = time.perf_counter() - start
+
+    return {
+        'posts': len(windowed),
+        'same_posts': [p['uri'] for p in posts] == [p['uri'] for p in windowed],
+        'workers': workers,
+        'windows': stats['windows'],
+        'pages': stats['pages'],
+        'serial_seconds': round(serial_seconds, 4),
+        'windowed_seconds': round(windowed_seconds, 4),
+    }
+
+def bench_sharded(base_url: str, dids: List[str], workers: int) -> Dict:
+    """Drain a crawl queue of dids with one worker process, then with workers."""
+    seconds = {}
+    with tempfile.TemporaryDirectory() as tmp, redirect_stdout(io.StringIO()):
+        _reset_client(base_url)
+        for count in dict.fromkeys([1, workers]):
+            queue_path = os.path.join(tmp, f'queue-{count}.db')
+            with CrawlQueue(queue_path) as queue:
+                queue.enqueue(dids)
+            start = time.perf_counter()
+            pages = run_workers(count, queue_path, os.path.join(tmp, f'posts-{count}.db'), base_url)
+            seconds[count] = time.perf_counter() - start
+
+    return {
+        'accounts': len(dids),
+        'pages': pages,
+        'workers': workers,
+        'one_worker_seconds': round(seconds[1], 4),
+        'sharded_seconds': round(seconds[workers], 4),
+        'speedup': round(seconds[1] / seconds[workers], 2),
+    }
+
+def _appview_shaped(item: Dict) -> Dict:
+    """A stub feed item with the extra hydration the real AppView sends (author view, viewer, labels, facets)."""
+    post = dict(item['post'])
+    post['author'] = {
+        **post['author'],
+        'displayName': 'Robert Evans',
+        'avatar': f"https://cdn.bsky.app/img/avatar/plain/{post['author']['did']}/"
+                  "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku@jpeg",
+        'associated': {'chat': {'allowIncoming': 'following'}},
+        'viewer': {'muted': False, 'blockedBy': False},
+        'labels': [],
+        'createdAt': '2023-04-28T20:41:24.000Z',
+    }
+    post['record'] = {
+        **post['record'],
+        'langs': ['en'],
+        'facets': [{'index': {'byteStart': 0, 'byteEnd': 10},
+                    'features': [{'$type': 'app.bsky.richtext.facet#link', 'uri': 'https://example.com/path'}]}],
+    }
+    post['quoteCount'] = 0
+    post['viewer'] = {'threadMuted': False, 'embeddingDisabled': False}
+    post['labels'] = []
+    return {**item, 'post': post}
+
+def _json_decode_page(body: bytes) -> List[Dict]:
+    """The old path: the whole tree with json.loads, then feed_item_to_post."""
+    return [post for post in map(feed_item_to_post, json.loads(body)['feed']) if post]
+
+def bench_decoding(posts: List[Dict], repeat: int = 5) -> Dict:
+    """Parse time and peak memory per 100-item AppView-shaped page, full json vs decode_feed_page."""
+    feed = [_appview_shaped(item) for item in build_feed(posts)]
+    bodies = [json.dumps({'feed': feed[i:i + MAX_PAGE], 'cursor': 'x'}).encode('utf-8')
+              for i in range(0, len(feed), MAX_PAGE)]
+
+    results = {'pages': len(bodies), 'page_bytes': sum(map(len, bodies)) // len(bodies)}
+    for name, decode in (('json', _json_decode_page), ('selective', decode_feed_page)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for body in bodies:
+                decode(body)
+        results[f'{name}_ms_per_page'] = round((time.perf_counter() - start) / repeat / len(bodies) * 1000, 3)
+
+        tracemalloc.start()
+        decode(bodies[0])
+        results[f'{name}_peak_kib'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return results
+
+def bench_scoring(posts: List[Dict], repeat: int = 5) -> Dict:
+    """Throughput of calculate_relevance_score alone and of a full search_posts."""
+    calculate_relevance_score(posts[0], KEYWORDS)  # compile the matcher outside the timing
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for post in posts:
+            calculate_relevance_score(post, KEYWORDS)
+    score_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        matches = search_posts(posts, KEYWORDS)
+    search_seconds = time.perf_counter() - start
+
+    scored = len(posts) * repeat
+    return {
+        'posts': len(posts),
+        'repeat': repeat,
+        'matches': len(matches),
+        'score_posts_per_second': round(scored / score_seconds),
+        'search_posts_per_second': round(scored / search_seconds),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline fetch and scoring benchmarks")
+    parser.add_argument('--posts', default='all_posts.json', help="captured posts to replay")
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0.2,
+                        help="Retry-After seconds sent with injected 429s")
+    parser.add_argument('--rate-limit', type=int, default=3000,
+                        help="requests per 5-minute window the server advertises (the AppView's is 3000)")
+    parser.add_argument('--connect-latency-ms', type=float, default=0.0,
+                        help="delay the server charges each new connection")
+    parser.add_argument('--repeat', type=int, default=5, help="scoring passes over the corpus")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="also compare a serial crawl + score + write with the pipelined one")
+    parser.add_argument('--windowed', action='store_true',
+                        help="also compare a serial backfill with windowed_fetch's parallel time windows")
+    parser.add_argument('--sharded', type=int, default=0, metavar='WORKERS',
+                        help="also drain a crawl queue of --accounts mirror accounts with 1 and WORKERS processes")
+    parser.add_argument('--accounts', type=int, default=4, help="accounts the server mirrors for --sharded")
+    parser.add_argument('--json', action='store_true', help="print results as JSON only")
+    args = parser.parse_args()
+
+    posts = load_posts(args.posts)
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+                        args.retry_after, args.rate_limit, connect_latency_ms=args.connect_latency_ms)
+
+    with StubXrpcServer(posts, config) as server:
+        crawl = bench_crawl(server)
+    pipelined = windowed = sharded = None
+    mirror_dids = [f'did:plc:mirror{i:04d}' for i in range(args.accounts)] if args.sharded else []
+    if args.pipeline or args.windowed or args.sharded:
+        with stub_in_subprocess(posts, config, mirror_dids) as base_url:
+            if args.pipeline:
+                pipelined = bench_pipeline(base_url)
+            if args.windowed:
+                windowed = bench_windowed(base_url)
+            if args.sharded:
+                sharded = bench_sharded(base_url, mirror_dids, args.sharded)
+    scoring = bench_scoring(posts, args.repeat)
+    decoding = bench_decoding(posts, args.repeat)
+
+    results = {'config': vars(config), 'crawl': crawl, 'scoring': scoring, 'decoding': decoding}
+    if pipelined:
+        results['pipeline'] = pipelined
+    if windowed:
+        results['windowed'] = windowed
+    if sharded:
+        results['sharded'] = sharded
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("=" * 80)
+    print("CRAWL (local stand-in server)")
+    print("=" * 80)
+    print(f"Pages: {crawl['pages']} ({crawl['posts']} posts, {crawl['requests']} requests, {crawl['retries']} retries, {crawl['connections']} connections)")
+    print(f"End-to-end: {crawl['crawl_seconds']:.2f}s, {crawl['pages_per_second']:.1f} pages/sec")
+    print(f"Page latency: p50 {crawl['page_latency_p50_ms']:.1f}ms, p99 {crawl['page_latency_p99_ms']:.1f}ms")
+    print()
+    print("=" * 80)
+    print("SCORING")
+    print("=" * 80)
+    print(f"calculate_relevance_score: {scoring['score_posts_per_second']:,} posts/sec")
+    print(f"search_posts:              {scoring['search_posts_per_second']:,} posts/sec ({scoring['matches']} matches)")
+    print()
+    print("=" * 80)
+    print(f"FEED DECODING ({decoding['page_bytes']:,}-byte AppView-shaped pages)")
+    print("=" * 80)
+    print(f"json.loads + feed_item_to_post: {decoding['json_ms_per_page']:.2f}ms/page, "
+          f"peak {decoding['json_peak_kib']} KiB")
+    print(f"decode_feed_page:               {decoding['selective_ms_per_page']:.2f}ms/page, "
+          f"peak {decoding['selective_peak_kib']} KiB")
+
+    if pipelined:
+        print()
+        print("=" * 80)
+        print("CRAWL + SCORE + WRITE")
+        print("=" * 80)
+        print(f"Crawl alone: {pipelined['network_seconds']:.2f}s")
+        print(f"Serial:      {pipelined['serial_seconds']:.2f}s")
+        print(f"Pipelined:   {pipelined['pipelined_seconds']:.2f}s (same matches: {pipelined['same_matches']})")
+        print("Busy per stage: " + ', '.join(f"{stage} {seconds:.2f}s"
+                                          for stage, seconds in pipelined['busy_seconds'].items()))
+
+    if windowed:
+        print()
+        print("=" * 80)
+        print(f"SINGLE-ACCOUNT BACKFILL ({windowed['workers']} workers)")
+        print("=" * 80)
+        print(f"Serial cursor chain: {windowed['serial_seconds']:.2f}s")
+        print(f"Time windows:        {windowed['windowed_seconds']:.2f}s ({windowed['windows']} windows, "
+              f"{windowed['pages']} pages, same posts: {windowed['same_posts']})")
+
+    if sharded:
+        print()
+        print("=" * 80)
+        print(f"SHARDED CRAWL QUEUE ({sharded['accounts']} accounts, {sharded['pages']} pages)")
+        print("=" * 80)
+        print(f"1 worker:   {sharded['one_worker_seconds']:.2f}s")
+        print(f"{sharded['workers']} workers: {sharded['sharded_seconds']:.2f}s ({sharded['speedup']:.2f}x)")
+        if args.rate_limit <= 3000 or args.latency_ms < 50:
+            print("(workers split the rate budget and this machine's CPU; try --latency-ms 200 --rate-limit 1000000)")
+
+if __name__ == '__main__':
+    main()
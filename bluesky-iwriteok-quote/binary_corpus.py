@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped binary corpus format.
+
+Loading `all_posts.json` parses the whole pretty-printed file into Python
+objects before we can look at one post. A `.bposts` file is laid out for
+random access instead, and is opened with mmap so nothing is read until
+it's touched:
+
+    header   magic 'BSKYPOST', version, count, offsets of the text blob and index
+    records  per post: u32 length prefix, then a fixed part
+             (text offset/length into the blob, likes, reposts, replies)
+             followed by u16-length-prefixed uri, cid, created_at, author
+             and an optional JSON object of extra keys
+    text     one UTF-8 blob holding every post's text back to back
+    index    count x u64 absolute record offsets
+
+`corpus[n]` and `corpus[a:b]` return PostView mappings that decode fields
+lazily from the mapped file, and `corpus.raw_text(n)` is a zero-copy
+memoryview. PostViews behave like post dicts, so `search_posts(corpus,
+KEYWORDS)` and the other search functions run on the file directly.
+
+Usage:
+    python3 binary_corpus.py convert all_posts.json all_posts.bposts
+    python3 binary_corpus.py search all_posts.bposts
+"""
+
+import argparse
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Union
+
+from stream_search import iter_posts
+from working_fetch_script import KEYWORDS, search_posts
+
+MAGIC = b'BSKYPOST'
+VERSION = 1
+
+# magic, version, count, text blob offset, text blob length, index offset
+HEADER = struct.Struct('<8sIIQQQ')
+LENGTH = struct.Struct('<I')
+# text offset (into the blob), text length, likes, reposts, replies
+FIXED = struct.Struct('<QIqqq')
+STRING_LENGTH = struct.Struct('<H')
+
+POST_KEYS = ('uri', 'cid', 'text', 'created_at', 'author', 'likes', 'reposts', 'replies')
+STRING_KEYS = ('uri', 'cid', 'created_at', 'author')
+
+def _pack_strings(values: Iterable[str]) -> bytes:
+    parts = []
+    for value in values:
+        encoded = value.encode('utf-8')
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b''.join(parts)
+
+def write_corpus(posts: Iterable[Dict], path: str) -> int:
+    """Write posts to a binary corpus file, streaming. Returns the number of posts."""
+    offsets = array('Q')
+    text_length = 0
+
+    with open(path, 'wb') as out, tempfile.TemporaryFile() as text_blob:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+
+        for post in posts:
+            text = post['text'].encode('utf-8')
+            text_blob.write(text)
+
+            extra = {key: value for key, value in post.items() if key not in POST_KEYS}
+            payload = (
+                FIXED.pack(text_length, len(text), post['likes'], post['reposts'], post['replies'])
+                + _pack_strings(post[key] for key in STRING_KEYS)
+                + _pack_strings([json.dumps(extra, ensure_ascii=False) if extra else ''])
+            )
+            text_length += len(text)
+
+            offsets.append(out.tell())
+            out.write(LENGTH.pack(len(payload)))
+            out.write(payload)
+
+        text_offset = out.tell()
+        text_blob.seek(0)
+        shutil.copyfileobj(text_blob, out)
+
+        index_offset = out.tell()
+        out.write(offsets.tobytes())
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, len(offsets), text_offset, text_length, index_offset))
+
+    return len(offsets)
+
+class PostView(Mapping):
+    """Read-only post dict backed by one record of a mapped corpus."""
+
+    __slots__ = ('_corpus', '_index', '_fields')
+
+    def __init__(self, corpus: 'BinaryCorpus', index: int):
+        self._corpus = corpus
+        self._index = index
+        self._fields = None
+
+    def _decode(self) -> Dict:
+        if self._fields is None:
+            self._fields = self._corpus._decode_record(self._index)
+        return self._fields
+
+    def __getitem__(self, key: str):
+        if key == 'text':
+            return self._corpus.text(self._index)
+        return self._decode()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._decode())
+
+    def __len__(self) -> int:
+        return len(self._decode())
+
+    def __repr__(self) -> str:
+        return f"PostView({self._index}, {self._decode().get('uri')!r})"
+
+class BinaryCorpus:
+    """Random access to a .bposts file through mmap."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, self.count, self._text_offset, self._text_length, index_offset = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} binary corpus")
+
+        # Zero-copy view of the offset index
+        self._offsets = self._view[index_offset:index_offset + 8 * self.count].cast('Q')
+
+    def close(self):
+        self._offsets.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[PostView, List[PostView]]:
+        if isinstance(index, slice):
+            return [PostView(self, i) for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return PostView(self, index)
+
+    def __iter__(self) -> Iterator[PostView]:
+        for index in range(self.count):
+            yield PostView(self, index)
+
+    def _fixed(self, index: int):
+        return FIXED.unpack_from(self._mmap, self._offsets[index] + LENGTH.size)
+
+    def raw_text(self, index: int) -> memoryview:
+        """The UTF-8 bytes of post index's text, without copying."""
+        text_offset, text_length = self._fixed(index)[:2]
+        start = self._text_offset + text_offset
+        return self._view[start:start + text_length]
+
+    def text(self, index: int) -> str:
+        return str(self.raw_text(index), 'utf-8')
+
+    def _decode_record(self, index: int) -> Dict:
+        record_offset = self._offsets[index]
+        text_offset, text_length, likes, reposts, replies = \
+            FIXED.unpack_from(self._mmap, record_offset + LENGTH.size)
+
+        position = record_offset + LENGTH.size + FIXED.size
+        strings = []
+        for _ in range(len(STRING_KEYS) + 1):
+            (length,) = STRING_LENGTH.unpack_from(self._mmap, position)
+            position += STRING_LENGTH.size
+            strings.append(str(self._view[position:position + length], 'utf-8'))
+            position += length
+
+        uri, cid, created_at, author, extra = strings
+        start = self._text_offset + text_offset
+        post = {
+            'uri': uri,
+            'cid': cid,
+            'text': str(self._view[start:start + text_length], 'utf-8'),
+            'created_at': created_at,
+            'author': author,
+            'likes': likes,
+            'reposts': reposts,
+            'replies': replies,
+        }
+        if extra:
+            post.update(json.loads(extra))
+        return post
+
+    def texts(self) -> Iterator[str]:
+        """Every post text in order, decoded straight from the blob."""
+        for index in range(self.count):
+            yield self.text(index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary memory-mapped post corpus")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_cmd = commands.add_parser('convert', help="convert a .json/.jsonl corpus")
+    convert_cmd.add_argument('source', nargs='?', default='all_posts.json')
+    convert_cmd.add_argument('target', nargs='?', default='all_posts.bposts')
+
+    search_cmd = commands.add_parser('search', help="run search_posts on a binary corpus")
+    search_cmd.add_argument('corpus', nargs='?', default='all_posts.bposts')
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        count = write_corpus(iter_posts(args.source), args.target)
+        print(f"Wrote {count} posts to {args.target}")
+
+    elif args.command == 'search':
+        with BinaryCorpus(args.corpus) as corpus:
+            matches = search_posts(corpus, KEYWORDS)
+            print(f"Found {len(matches)} posts with relevant keywords in {len(corpus)} posts")
+            for post in matches[:20]:
+                print(f"  [{post['relevance_score']}] {post['text'][:100]!r}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+BM25 ranked retrieval over an incremental inverted index.
+
+`calculate_relevance_score` counts substring hits plus hand-tuned bonuses,
+rescans every post for every query, and weighs a word that's in half the
+corpus ("understand") the same as a rare one ("dopamine"). BM25Index
+tokenizes each post once into an inverted index:
+    - postings per term: doc ids and term frequencies in typed arrays
+    - per-term document frequencies and per-document lengths, which give
+      BM25 its IDF weighting and length normalisation (k1=1.2, b=0.75)
+
+A query only walks the posting lists of its terms, so its cost grows with
+how many posts contain them rather than with the corpus. `term*` matches
+every indexed term with that prefix (`addict*`: addict, addicted,
+addiction, ...).
+
+The index updates in place: add_posts() indexes new posts, skips ones it
+already has (same uri and cid) and re-indexes edited ones. Replaced posts
+leave dead postings behind until enough accumulate for compact() to
+rebuild. save()/load() keep it in a `.bm25` file:
+
+    header   magic 'BSKYBM25', version, doc count, term count, metadata length
+    metadata JSON: k1, b, the posts, and each term with its posting count
+    lengths  doc count x u32 token counts
+    postings per term: u32 doc ids, then u16 term frequencies
+
+Usage:
+    python3 bm25_index.py build all_posts.json
+    python3 bm25_index.py update new_posts.jsonl
+    python3 bm25_index.py search "social media addict* drugs"
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from post_store import load_posts_file
+
+INDEX_FILE = 'all_posts.bm25'
+
+MAGIC = b'BSKYBM25'
+VERSION = 1
+
+# magic, version, doc count, term count, metadata length
+HEADER = struct.Struct('<8sIIIQ')
+
+# Standard BM25 parameters: term-frequency saturation and length normalisation
+K1 = 1.2
+B = 0.75
+
+# Rebuild once dead postings (from replaced posts) are this fraction of all docs
+COMPACT_FRACTION = 0.25
+
+# Words, keeping inner apostrophes ("don't")
+TOKEN_RE = re.compile(r"\w+(?:'\w+)*")
+QUERY_TERM_RE = re.compile(r"\w+(?:'\w+)*\*?")
+
+# Term frequencies are stored as u16
+MAX_TF = 0xFFFF
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower().replace('’', "'"))
+
+def _to_file_order(values: array) -> array:
+    """Arrays are stored little-endian whatever the machine's byte order."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+class BM25Index:
+    """Inverted index over post texts with BM25 scoring; posts can be added at any time."""
+
+    def __init__(self, k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        # doc id -> post, None once the post has been replaced
+        self.posts: List[Optional[Dict]] = []
+        self.lengths = array('I')
+        # term -> (doc ids, term frequencies), doc ids ascending
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # term -> number of live posts containing it
+        self.df: Dict[str, int] = {}
+        self.by_uri: Dict[str, int] = {}
+        self.total_length = 0
+        self.dead = 0
+        self._vocabulary: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.by_uri)
+
+    def add_post(self, post: Dict) -> bool:
+        """Index post; True if it was new or its text changed, False if already indexed."""
+        doc = self.by_uri.get(post['uri'])
+        if doc is not None:
+            if self.posts[doc]['cid'] == post['cid']:
+                # Same content; keep the fresher engagement counts
+                self.posts[doc] = post
+                return False
+            self.remove(post['uri'])
+
+        doc = len(self.posts)
+        tokens = tokenize(post['text'])
+        for term, tf in Counter(tokens).items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array('I'), array('H'))
+                self._vocabulary = None
+            entry[0].append(doc)
+            entry[1].append(min(tf, MAX_TF))
+            self.df[term] = self.df.get(term, 0) + 1
+
+        self.posts.append(post)
+        self.lengths.append(len(tokens))
+        self.by_uri[post['uri']] = doc
+        self.total_length += len(tokens)
+        return True
+
+    def add_posts(self, posts: Iterable[Dict]) -> int:
+        """Index many posts (see add_post). Returns how many were new or changed."""
+        added = sum(self.add_post(post) for post in posts)
+        if self.dead > COMPACT_FRACTION * len(self.posts):
+            self.compact()
+        return added
+
+    def remove(self, uri: str) -> bool:
+        """Drop a post from the results; its postings stay until compact()."""
+        doc = self.by_uri.pop(uri, None)
+        if doc is None:
+            return False
+        for term in set(tokenize(self.posts[doc]['text'])):
+            self.df[term] -= 1
+        self.posts[doc] = None
+        self.total_length -= self.lengths[doc]
+        self.dead += 1
+        return True
+
+    def compact(self):
+        """Rebuild without the postings of replaced or removed posts."""
+        live = [post for post in self.posts if post is not None]
+        self.__init__(self.k1, self.b)
+        for post in live:
+            self.add_post(post)
+
+    def _vocabulary_sorted(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def query_terms(self, query: str) -> List[str]:
+        """Distinct index terms for a query, expanding `prefix*` against the vocabulary."""
+        terms = []
+        for word in QUERY_TERM_RE.findall(query.lower().replace('’', "'")):
+            if word.endswith('*'):
+                prefix = word[:-1]
+                vocabulary = self._vocabulary_sorted()
+                start = bisect_left(vocabulary, prefix)
+                end = bisect_left(vocabulary, prefix + '\U0010ffff')
+                terms.extend(vocabulary[start:end])
+            else:
+                terms.append(word)
+        return list(dict.fromkeys(terms))
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (the non-negative +1 form)."""
+        df = self.df.get(term, 0)
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: Optional[int] = 20) -> List[Dict]:
+        """
+        Posts ranked by BM25 score for a free-text query, best first.
+
+        Each result is the post plus 'bm25_score' and 'matched_terms'.
+        """
+        if not len(self):
+            return []
+        average_length = self.total_length / len(self)
+        k1, b = self.k1, self.b
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, List[str]] = {}
+        for term in self.query_terms(query):
+            if not self.df.get(term):
+                continue
+            idf = self.idf(term)
+            doc_ids, tfs = self.postings[term]
+            for doc, tf in zip(doc_ids, tfs):
+                if self.posts[doc] is None:
+                    continue
+                norm = k1 * (1 - b + b * self.lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+                matched.setdefault(doc, []).append(term)
+
+        if top_k is None:
+            ranked = sorted(scores.items(), key=itemgetter(1), reverse=True)
+        else:
+            ranked = heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+        return [{**self.posts[doc], 'matched_terms': matched[doc], 'bm25_score': round(score, 4)}
+                for doc, score in ranked]
+
+    def save(self, path: str):
+        """Write the (compacted) index to path, atomically."""
+        if self.dead:
+            self.compact()
+        terms = list(self.postings)
+        metadata = json.dumps({
+            'k1': self.k1,
+            'b': self.b,
+            'posts': self.posts,
+            'terms': [[term, len(self.postings[term][0])] for term in terms],
+        }, ensure_ascii=False).encode('utf-8')
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.posts), len(terms), len(metadata)))
+            f.write(metadata)
+            f.write(_to_file_order(self.lengths).tobytes())
+            for term in terms:
+                doc_ids, tfs = self.postings[term]
+                f.write(_to_file_order(doc_ids).tobytes())
+                f.write(_to_file_order(tfs).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, doc_count, term_count, metadata_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} BM25 index")
+
+        pos = HEADER.size
+        metadata = json.loads(data[pos:pos + metadata_length])
+        pos += metadata_length
+
+        def read_array(typecode: str, count: int) -> array:
+            nonlocal pos
+            values = array(typecode)
+            values.frombytes(data[pos:pos + count * values.itemsize])
+            pos += count * values.itemsize
+            return _to_file_order(values)
+
+        index = cls(metadata['k1'], metadata['b'])
+        index.posts = metadata['posts']
+        index.lengths = read_array('I', doc_count)
+        index.total_length = sum(index.lengths)
+        index.by_uri = {post['uri']: doc for doc, post in enumerate(index.posts)}
+        for term, count in metadata['terms']:
+            index.postings[term] = (read_array('I', count), read_array('H', count))
+            index.df[term] = count
+        return index
+
+def load_or_build(index_path: str, posts_path: Optional[str] = None) -> BM25Index:
+    """The saved index at index_path, or a new one built from posts_path."""
+    if os.path.exists(index_path):
+        return BM25Index.load(index_path)
+    index = BM25Index()
+    if posts_path:
+        index.add_posts(load_posts_file(posts_path))
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 ranked search over an inverted index of posts")
+    parser.add_argument('--index', default=INDEX_FILE, help=f"index file (default {INDEX_FILE})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_cmd = commands.add_parser('build', help="index a .json or .jsonl posts file from scratch")
+    build_cmd.add_argument('posts')
+
+    update_cmd = commands.add_parser('update', help="add new or edited posts to the index")
+    update_cmd.add_argument('files', nargs='+')
+
+    search_cmd = commands.add_parser('search', help="rank posts for a free-text query")
+    search_cmd.add_argument('query', nargs='+')
+    search_cmd.add_argument('--top', type=int, default=20)
+    search_cmd.add_argument('--posts', default='all_posts.json', help="posts to index if there's no index file yet")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        index = BM25Index()
+        index.add_posts(load_posts_file(args.posts))
+        index.save(args.index)
+        print(f"Indexed {len(index)} posts ({len(index.postings)} terms) in "
+              f"{time.perf_counter() - start:.2f}s -> {args.index}")
+
+    elif args.command == 'update':
+        index = load_or_build(args.index)
+        for path in args.files:
+            print(f"{index.add_posts(load_posts_file(path))} new or changed posts from {path}")
+        index.save(args.index)
+        print(f"{len(index)} posts in {args.index}")
+
+    elif args.command == 'search':
+        index = load_or_build(args.index, args.posts)
+        query = ' '.join(args.query)
+        start = time.perf_counter()
+        results = index.search(query, args.top)
+        elapsed = time.perf_counter() - start
+        for post in results:
+            print(f"[{post['bm25_score']:.2f}] {post['created_at'][:10]} @{post['author']} "
+                  f"({', '.join(post['matched_terms'])})")
+            print(f"  {post['text'][:200]!r}\n")
+        print(f"{len(results)} results in {elapsed * 1000:.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+"""
+Bulk account export from a repository CAR file instead of paging the feed.
+
+`get_author_feed` needs ~51 sequential requests for one account's history
+(see fetch_all_output.txt), each returning heavy hydrated views. An
+account's repository holds every record it ever wrote, and the PDS hands
+it out in one download (`com.atproto.sync.getRepo`) as a CAR archive of
+DAG-CBOR blocks. This module:
+    - resolves the account's PDS from its DID document (plc.directory or
+      did:web) and streams the CAR to disk
+    - reads the CAR block by block, keeping only the commit, the Merkle
+      Search Tree (MST) nodes and `app.bsky.feed.post` records; likes,
+      follows etc. are decoded and dropped
+    - walks the MST in key order to recover each post's rkey (needed for its
+      URI) and emits the usual post dicts, newest first
+    - can hydrate likes/reposts/replies later with `app.bsky.feed.getPosts`
+      (25 URIs per call); until then the counts are 0
+
+Reposts are separate `app.bsky.feed.repost` records pointing at someone
+else's post, so an export holds the account's own posts only.
+
+`write_repo_car()` builds a valid repository CAR (real MST layout) from post
+dicts, for fixtures and for the local stand-in server.
+
+Usage:
+    python3 car_export.py fetch iwriteok.bsky.social --hydrate
+    python3 car_export.py fixture all_posts.json iwriteok.car
+    python3 car_export.py parse iwriteok.car --handle iwriteok.bsky.social
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+import working_fetch_script
+from crawl_metrics import METRICS
+from rate_limit import MAX_RETRIES, RETRY_STATUSES, RateLimiter, backoff_delay, retry_delay
+from transport import CONNECT_TIMEOUT, get_session, http_get, xrpc_get
+from working_fetch_script import get_profile
+
+PLC_DIRECTORY = "https://plc.directory"
+
+POST_COLLECTION = 'app.bsky.feed.post'
+REPOST_COLLECTION = 'app.bsky.feed.repost'
+
+# Multicodec codes
+DAG_CBOR = 0x71
+SHA2_256 = 0x12
+
+# app.bsky.feed.getPosts accepts at most this many URIs
+GET_POSTS_BATCH = 25
+
+# Repos can be large; give the download more time between bytes than an XRPC page
+DOWNLOAD_TIMEOUT = (CONNECT_TIMEOUT, 60)
+
+# One bucket per PDS: a PDS has its own budget, and its RateLimit-* headers
+# mustn't re-tune the AppView's shared rate_limit.LIMITER
+_pds_limiters: Dict[str, RateLimiter] = {}
+DOWNLOAD_CHUNK = 64 * 1024
+
+class CID(bytes):
+    """Binary CIDv1; str() gives the usual base32 form ('bafyrei...')."""
+
+    def __str__(self) -> str:
+        return 'b' + base64.b32encode(self).decode('ascii').lower().rstrip('=')
+
+    def __repr__(self) -> str:
+        return f"CID({str(self)!r})"
+
+    @classmethod
+    def for_block(cls, data: bytes, codec: int = DAG_CBOR) -> 'CID':
+        return cls(bytes([1, codec, SHA2_256, 32]) + hashlib.sha256(data).digest())
+
+    def digest(self) -> bytes:
+        """The sha2-256 digest (CIDv0 is a bare multihash; v1 fields before it are one-byte varints)."""
+        return self[2:] if self[:2] == b'\x12\x20' else self[4:]
+
+# ---------------------------------------------------------------------------
+# DAG-CBOR
+# ---------------------------------------------------------------------------
+
+def _read_head(data: bytes, pos: int) -> Tuple[int, int, int, int]:
+    """(major type, additional info, argument, new position) of the item at pos."""
+    initial = data[pos]
+    major, info = initial >> 5, initial & 0x1f
+    pos += 1
+    if info < 24:
+        return major, info, info, pos
+    if info > 27:
+        raise ValueError(f"indefinite-length or reserved CBOR item at {pos - 1}")
+    size = 1 << (info - 24)
+    return major, info, int.from_bytes(data[pos:pos + size], 'big'), pos + size
+
+def _decode(data: bytes, pos: int):
+    major, info, arg, pos = _read_head(data, pos)
+
+    if major == 0:
+        return arg, pos
+    if major == 1:
+        return -1 - arg, pos
+    if major == 2:
+        return bytes(data[pos:pos + arg]), pos + arg
+    if major == 3:
+        return bytes(data[pos:pos + arg]).decode('utf-8'), pos + arg
+    if major == 4:
+        items = []
+        for _ in range(arg):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        result = {}
+        for _ in range(arg):
+            key, pos = _decode(data, pos)
+            result[key], pos = _decode(data, pos)
+        return result, pos
+    if major == 6:
+        item, pos = _decode(data, pos)
+        if arg == 42:
+            # CID link: byte string with a leading 0x00 multibase prefix
+            return CID(item[1:]), pos
+        return item, pos
+
+    if info == 20:
+        return False, pos
+    if info == 21:
+        return True, pos
+    if info == 22:
+        return None, pos
+    if info == 27:
+        return struct.unpack('>d', arg.to_bytes(8, 'big'))[0], pos
+    raise ValueError(f"unsupported CBOR simple value {info}")
+
+def decode_dag_cbor(data: bytes):
+    value, pos = _decode(data, 0)
+    if pos != len(data):
+        raise ValueError(f"{len(data) - pos} trailing bytes after DAG-CBOR value")
+    return value
+
+def _head(major: int, arg: int) -> bytes:
+    if arg < 24:
+        return bytes([major << 5 | arg])
+    for info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+        if arg < 1 << (8 * size):
+            return bytes([major << 5 | info]) + arg.to_bytes(size, 'big')
+    raise ValueError(f"integer too large for CBOR: {arg}")
+
+def _encode(value, out: List[bytes]):
+    if isinstance(value, CID):
+        out.append(b'\xd8\x2a')
+        _encode(b'\x00' + bytes(value), out)
+    elif value is None:
+        out.append(b'\xf6')
+    elif isinstance(value, bool):
+        out.append(b'\xf5' if value else b'\xf4')
+    elif isinstance(value, int):
+        out.append(_head(0, value) if value >= 0 else _head(1, -1 - value))
+    elif isinstance(value, bytes):
+        out.append(_head(2, len(value)))
+        out.append(value)
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8')
+        out.append(_head(3, len(encoded)))
+        out.append(encoded)
+    elif isinstance(value, list):
+        out.append(_head(4, len(value)))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        # Canonical key order: shorter keys first, then bytewise
+        keys = sorted(value, key=lambda key: (len(key.encode('utf-8')), key.encode('utf-8')))
+        out.append(_head(5, len(keys)))
+        for key in keys:
+            _encode(key, out)
+            _encode(value[key], out)
+    else:
+        raise TypeError(f"can't encode {type(value).__name__} as DAG-CBOR")
+
+def encode_dag_cbor(value) -> bytes:
+    out: List[bytes] = []
+    _encode(value, out)
+    return b''.join(out)
+
+# ---------------------------------------------------------------------------
+# CAR v1
+# ---------------------------------------------------------------------------
+
+def _read_varint(stream: BinaryIO) -> Optional[int]:
+    """Unsigned LEB128 varint from the stream, or None at a clean EOF."""
+    value = shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            if shift:
+                raise ValueError("CAR truncated inside a varint")
+            return None
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _cid_length(section: bytes) -> int:
+    """Byte length of the binary CID at the start of a block section."""
+    if section[:2] == b'\x12\x20':
+        return 34  # CIDv0: bare sha2-256 multihash
+    pos = 0
+    for _ in range(3):  # version, codec, multihash code
+        while section[pos] & 0x80:
+            pos += 1
+        pos += 1
+    digest_length = 0
+    shift = 0
+    while True:
+        byte = section[pos]
+        digest_length |= (byte & 0x7f) << shift
+        pos += 1
+        if byte < 0x80:
+            return pos + digest_length
+        shift += 7
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("CAR truncated inside a block")
+    return data
+
+def read_car_header(stream: BinaryIO) -> Dict:
+    length = _read_varint(stream)
+    if length is None:
+        raise ValueError("empty CAR file")
+    header = decode_dag_cbor(_read_exact(stream, length))
+    if header.get('version') != 1:
+        raise ValueError(f"unsupported CAR version {header.get('version')}")
+    return header
+
+def iter_car_blocks(stream: BinaryIO, verify: bool = False) -> Iterator[Tuple[CID, bytes]]:
+    """Yield (cid, block bytes) one block at a time; call after read_car_header()."""
+    while True:
+        length = _read_varint(stream)
+        if length is None:
+            return
+        section = _read_exact(stream, length)
+        split = _cid_length(section)
+        cid, data = CID(section[:split]), section[split:]
+        if verify and hashlib.sha256(data).digest() != cid.digest():
+            raise ValueError(f"block {cid} does not match its hash")
+        yield cid, data
+
+# ---------------------------------------------------------------------------
+# Repository (commit + MST + records)
+# ---------------------------------------------------------------------------
+
+def _is_mst_node(value) -> bool:
+    return isinstance(value, dict) and set(value) == {'l', 'e'}
+
+def _walk_mst(nodes: Dict[CID, Dict], cid: Optional[CID]) -> Iterator[Tuple[str, CID]]:
+    """In-order (sorted by key) walk yielding (key, record cid); missing nodes are skipped."""
+    node = nodes.get(cid) if cid else None
+    if node is None:
+        return
+    yield from _walk_mst(nodes, node['l'])
+    key = b''
+    for entry in node['e']:
+        key = key[:entry['p']] + entry['k']
+        yield key.decode('ascii'), entry['v']
+        yield from _walk_mst(nodes, entry.get('t'))
+
+def read_repo(stream: BinaryIO, collection: str = POST_COLLECTION,
+              verify: bool = False) -> Tuple[Dict, List[Tuple[str, CID, Dict]]]:
+    """
+    Stream a repository CAR and return (commit, [(rkey, cid, record)]) for one collection.
+
+    Only the commit, MST nodes and records of the collection are kept in memory.
+    """
+    root = read_car_header(stream)['roots'][0]
+    commit = None
+    nodes: Dict[CID, Dict] = {}
+    records: Dict[CID, Dict] = {}
+
+    for cid, data in iter_car_blocks(stream, verify):
+        value = decode_dag_cbor(data)
+        if cid == root:
+            commit = value
+        elif _is_mst_node(value):
+            nodes[cid] = value
+        elif isinstance(value, dict) and value.get('$type') == collection:
+            records[cid] = value
+
+    if commit is None:
+        raise ValueError("CAR does not contain its root commit")
+
+    prefix = f"{collection}/"
+    found = []
+    for key, cid in _walk_mst(nodes, commit['data']):
+        if key.startswith(prefix) and cid in records:
+            found.append((key[len(prefix):], cid, records[cid]))
+    return commit, found
+
+def record_to_post(did: str, handle: str, rkey: str, cid: CID, record: Dict) -> Dict:
+    """A post record in the same dict schema as feed_item_to_post (counts not hydrated)."""
+    return {
+        'uri': f"at://{did}/{POST_COLLECTION}/{rkey}",
+        'cid': str(cid),
+        'text': record.get('text', ''),
+        'created_at': record.get('createdAt', ''),
+        'author': handle,
+        'likes': 0,
+        'reposts': 0,
+        'replies': 0,
+        'reason': 'reply' if record.get('reply') else 'original',
+    }
+
+def export_posts(stream: BinaryIO, handle: Optional[str] = None, verify: bool = False) -> List[Dict]:
+    """All posts in a repository CAR, newest first. author is the handle if given, else the DID."""
+    commit, records = read_repo(stream, POST_COLLECTION, verify)
+    did = commit['did']
+    posts = [record_to_post(did, handle or did, rkey, cid, record) for rkey, cid, record in records]
+    posts.sort(key=lambda post: post['created_at'], reverse=True)
+    return posts
+
+# ---------------------------------------------------------------------------
+# Writing repositories (fixtures, stand-in server)
+# ---------------------------------------------------------------------------
+
+TID_CHARS = '234567abcdefghijklmnopqrstuvwxyz'
+
+def make_tid(timestamp_us: int, clock_id: int = 0) -> str:
+    """Timestamp identifier: 53 bits of microseconds + 10 bits of clock id, base32-sortable."""
+    value = (timestamp_us << 10) | (clock_id & 0x3ff)
+    return ''.join(TID_CHARS[(value >> shift) & 0x1f] for shift in range(60, -1, -5))
+
+def _key_layer(key: str) -> int:
+    """MST layer of a key: leading zero bits of its SHA-256, counted in pairs."""
+    layer = 0
+    for byte in hashlib.sha256(key.encode('ascii')).digest():
+        if byte == 0:
+            layer += 4
+            continue
+        layer += (8 - byte.bit_length()) // 2
+        break
+    return layer
+
+def _build_mst(items: List[Tuple[str, CID, int]], layer: int,
+               blocks: List[Tuple[CID, bytes]]) -> Optional[CID]:
+    """Build the MST node for sorted (key, cid, layer) items at this layer; returns its CID."""
+    if not items:
+        return None
+
+    left = None
+    entries = []
+    segment: List[Tuple[str, CID, int]] = []
+    for item in items:
+        if item[2] < layer:
+            segment.append(item)
+            continue
+        subtree = _build_mst(segment, layer - 1, blocks)
+        if entries:
+            entries[-1][2] = subtree
+        else:
+            left = subtree
+        entries.append([item[0], item[1], None])
+        segment = []
+    subtree = _build_mst(segment, layer - 1, blocks)
+    if entries:
+        entries[-1][2] = subtree
+    else:
+        left = subtree
+
+    node_entries = []
+    previous = b''
+    for key, cid, tree in entries:
+        key_bytes = key.encode('ascii')
+        shared = 0
+        while shared < min(len(previous), len(key_bytes)) and previous[shared] == key_bytes[shared]:
+            shared += 1
+        node_entries.append({'p': shared, 'k': key_bytes[shared:], 'v': cid, 't': tree})
+        previous = key_bytes
+
+    data = encode_dag_cbor({'l': left, 'e': node_entries})
+    cid = CID.for_block(data)
+    blocks.append((cid, data))
+    return cid
+
+def posts_to_records(posts: List[Dict], handle: str) -> List[Tuple[str, str, Dict]]:
+    """
+    (collection, rkey, record) for flat post dicts in feed order: the account's own posts,
+    and reposts of everything else (including later feed entries of its own posts).
+    """
+    records = []
+    seen = set()
+    for index, post in enumerate(posts):
+        if post['author'] == handle and post['uri'] not in seen:
+            seen.add(post['uri'])
+            rkey = post['uri'].rsplit('/', 1)[-1]
+            records.append((POST_COLLECTION, rkey, {
+                '$type': POST_COLLECTION,
+                'text': post['text'],
+                'createdAt': post['created_at'],
+            }))
+        else:
+            rkey = make_tid(int(time.time() * 1_000_000) - index, index)
+            records.append((REPOST_COLLECTION, rkey, {
+                '$type': REPOST_COLLECTION,
+                'subject': {'uri': post['uri'], 'cid': post['cid']},
+                'createdAt': post['created_at'],
+            }))
+    return records
+
+def write_repo_car(stream: BinaryIO, did: str, records: List[Tuple[str, str, Dict]]):
+    """Write a repository CAR (commit, MST, records) for (collection, rkey, record) tuples."""
+    blocks: List[Tuple[CID, bytes]] = []
+    items = []
+    for collection, rkey, record in records:
+        data = encode_dag_cbor(record)
+        cid = CID.for_block(data)
+        blocks.append((cid, data))
+        key = f"{collection}/{rkey}"
+        items.append((key, cid, _key_layer(key)))
+    items.sort()
+
+    top_layer = max((layer for _, _, layer in items), default=0)
+    root = _build_mst(items, top_layer, blocks)
+    if root is None:
+        data = encode_dag_cbor({'l': None, 'e': []})
+        root = CID.for_block(data)
+        blocks.append((root, data))
+
+    commit = encode_dag_cbor({
+        'did': did,
+        'version': 3,
+        'data': root,
+        'rev': make_tid(int(time.time() * 1_000_000)),
+        'prev': None,
+        'sig': bytes(64),  # unsigned: fixtures only
+    })
+    commit_cid = CID.for_block(commit)
+
+    header = encode_dag_cbor({'version': 1, 'roots': [commit_cid]})
+    stream.write(_varint(len(header)) + header)
+    for cid, data in [(commit_cid, commit)] + blocks:
+        stream.write(_varint(len(cid) + len(data)) + cid + data)
+
+# ---------------------------------------------------------------------------
+# Network
+# ---------------------------------------------------------------------------
+
+def resolve_pds(did: str) -> str:
+    """The account's PDS endpoint from its DID document (did:plc or did:web)."""
+    if did.startswith('did:plc:'):
+        url = f"{PLC_DIRECTORY}/{did}"
+    elif did.startswith('did:web:'):
+        url = f"https://{did[len('did:web:'):]}/.well-known/did.json"
+    else:
+        raise ValueError(f"unsupported DID method: {did}")
+
+    response = http_get(url)
+    response.raise_for_status()
+    for service in response.json().get('service', []):
+        if service.get('id', '').endswith('#atproto_pds'):
+            return service['serviceEndpoint'].rstrip('/')
+    raise ValueError(f"no atproto PDS in the DID document for {did}")
+
+def download_repo(pds_url: str, did: str, path: str) -> int:
+    """
+    Stream com.atproto.sync.getRepo to path; returns the number of bytes written.
+
+    Goes through the PDS's own rate limiter and retries 429s, 5xx and network errors
+    (including a connection dropped mid-download) like transport.xrpc_get.
+    """
+    method = 'com.atproto.sync.getRepo'
+    tmp_path = f"{path}.tmp"
+    limiter = _pds_limiters.setdefault(pds_url, RateLimiter())
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        started = time.perf_counter()
+        size = 0
+        try:
+            with get_session().get(f"{pds_url}/xrpc/{method}", params={'did': did}, stream=True,
+                                   headers={'Accept': 'application/vnd.ipld.car'},
+                                   timeout=DOWNLOAD_TIMEOUT) as response:
+                limiter.update_from_headers(response.headers)
+                retry = response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES
+                if not retry:
+                    response.raise_for_status()
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                            f.write(chunk)
+                            size += len(chunk)
+                METRICS.observe_request(method, response.status_code, time.perf_counter() - started,
+                                        size, {'did': did})
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            METRICS.record_error(method, e, time.perf_counter() - started)
+            if attempt == MAX_RETRIES:
+                raise
+            METRICS.record_retry(method, e.__class__.__name__)
+            delay = backoff_delay(attempt)
+            print(f"\n  {method}: {e.__class__.__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if retry:
+            METRICS.record_retry(method, str(response.status_code))
+            delay = retry_delay(attempt, response.headers)
+            print(f"\n  {method}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+            if response.status_code == 429:
+                # Throttle every caller of this PDS, not just this one
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+            continue
+
+        os.replace(tmp_path, path)
+        return size
+
+def hydrate_engagement(posts: List[Dict], base_url: Optional[str] = None) -> int:
+    """Fill likes/reposts/replies in place from app.bsky.feed.getPosts; returns posts updated."""
+    base_url = base_url or working_fetch_script.BASE_URL
+    by_uri = {post['uri']: post for post in posts}
+    uris = list(by_uri)
+    updated = 0
+
+    for start in range(0, len(uris), GET_POSTS_BATCH):
+        batch = uris[start:start + GET_POSTS_BATCH]
+        response = xrpc_get(base_url, 'app.bsky.feed.getPosts', {'uris': batch})
+        for view in response.get('posts', []):
+            post = by_uri.get(view['uri'])
+            if post is None:
+                continue
+            post['likes'] = view.get('likeCount', 0)
+            post['reposts'] = view.get('repostCount', 0)
+            post['replies'] = view.get('replyCount', 0)
+            updated += 1
+
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an account's posts from its repository CAR")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch_cmd = commands.add_parser('fetch', help="download an account's repo and export its posts")
+    fetch_cmd.add_argument('actor', help="handle or DID")
+    fetch_cmd.add_argument('--pds', help="PDS URL (default: resolved from the DID document)")
+    fetch_cmd.add_argument('--car', help="where to save the CAR (default: <did>.car)")
+    fetch_cmd.add_argument('--output', default='all_posts_repo.json')
+    fetch_cmd.add_argument('--hydrate', action='store_true', help="fill engagement counts via getPosts")
+
+    parse_cmd = commands.add_parser('parse', help="export posts from a local CAR file")
+    parse_cmd.add_argument('car')
+    parse_cmd.add_argument('--handle', help="author value for the posts (default: the DID)")
+    parse_cmd.add_argument('--output', default='all_posts_repo.json')
+    parse_cmd.add_argument('--verify', action='store_true', help="check every block against its CID")
+
+    fixture_cmd = commands.add_parser('fixture', help="build a repo CAR from a posts JSON file")
+    fixture_cmd.add_argument('posts')
+    fixture_cmd.add_argument('car')
+    fixture_cmd.add_argument('--handle', default='iwriteok.bsky.social')
+    fixture_cmd.add_argument('--did', default='did:plc:kjixfa7wudorsmbyyfios3kp')
+
+    args = parser.parse_args()
+
+    if args.command == 'fixture':
+        with open(args.posts, encoding='utf-8') as f:
+            records = posts_to_records(json.load(f), args.handle)
+        with open(args.car, 'wb') as f:
+            write_repo_car(f, args.did, records)
+        print(f"Wrote {len(records)} records to {args.car} ({os.path.getsize(args.car):,} bytes)")
+        return
+
+    if args.command == 'fetch':
+        profile = get_profile(args.actor)
+        if not profile:
+            print("Failed to fetch profile. Exiting.")
+            return
+        did, handle = profile['did'], profile['handle']
+        pds_url = args.pds or resolve_pds(did)
+        car_path = args.car or f"{did.replace(':', '_')}.car"
+
+        print(f"Downloading repo for @{handle} from {pds_url}...")
+        start = time.perf_counter()
+        size = download_repo(pds_url, did, car_path)
+        print(f"  {size:,} bytes in {time.perf_counter() - start:.2f}s -> {car_path}")
+        verify = False
+    else:
+        car_path, handle, verify = args.car, args.handle, args.verify
+
+    start = time.perf_counter()
+    with open(car_path, 'rb') as f:
+        posts = export_posts(f, handle, verify)
+    print(f"Exported {len(posts)} posts in {time.perf_counter() - start:.2f}s")
+
+    if args.command == 'fetch' and args.hydrate:
+        print(f"Hydrating engagement counts ({GET_POSTS_BATCH} posts per request)...")
+        print(f"  {hydrate_engagement(posts)} posts updated")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(posts, f, indent=2, ensure_ascii=False)
+    print(f"Saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compact, persistent set of post CIDs for deduplicating ingestion.
+
+The same post reaches us many times: on overlapping pages, on every
+re-run, and once per watched account that reposted it. A CID names a
+post's exact content, so remembering the CIDs already ingested lets a
+crawl drop repeats before they are written or scored.
+
+A Python set of 59-character CID strings costs ~130 bytes per entry.
+CidSet keeps a 64-bit BLAKE2b hash of each CID in a sorted `array('Q')`
+(8 bytes per entry, binary-searched), with recent additions in a small
+set that is merged in batches. The odds of any false "already seen" are
+about n^2 / 2^65: roughly 3 in a million at 10 million posts.
+
+On disk (`seen_cids.bin`) it is a flat file of u64 hashes. flush() appends
+only the hashes added since the last flush, so saving after every page is
+cheap; compact() rewrites it sorted and de-duplicated.
+
+Usage:
+    seen = CidSet('seen_cids.bin')
+    new_posts = [post for post in posts if seen.add(post['cid'])]
+    seen.flush()
+"""
+
+import hashlib
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+
+SEEN_FILE = 'seen_cids.bin'
+
+# Recent additions merged into the sorted array once there are this many
+MERGE_THRESHOLD = 50_000
+
+def cid_hash(cid: str) -> int:
+    return int.from_bytes(hashlib.blake2b(cid.encode('ascii'), digest_size=8).digest(), 'little')
+
+def _to_file_order(values: array) -> array:
+    """Hashes are stored little-endian whatever the machine's byte order."""
+    if sys.byteorder == 'big':
+        values = array('Q', values)
+        values.byteswap()
+    return values
+
+class CidSet:
+    """Set of CIDs stored as sorted 64-bit hashes; optionally backed by a file."""
+
+    def __init__(self, path: Optional[str] = None, cids: Iterable[str] = ()):
+        self.path = path
+        self._sorted = array('Q')
+        self._recent = set()
+        # Hashes added since the last flush, in insertion order
+        self._unflushed: List[int] = []
+
+        if path and os.path.exists(path):
+            loaded = array('Q')
+            with open(path, 'rb') as f:
+                data = f.read()
+            # A crash mid-append can leave a partial entry at the end
+            loaded.frombytes(data[:len(data) - len(data) % loaded.itemsize])
+            self._sorted = array('Q', sorted(set(_to_file_order(loaded))))
+
+        for cid in cids:
+            self.add(cid)
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+    def _contains_hash(self, value: int) -> bool:
+        if value in self._recent:
+            return True
+        index = bisect_left(self._sorted, value)
+        return index < len(self._sorted) and self._sorted[index] == value
+
+    def __contains__(self, cid: str) -> bool:
+        return self._contains_hash(cid_hash(cid))
+
+    def add(self, cid: str) -> bool:
+        """Record cid; True if it was new, False if it had been seen before."""
+        value = cid_hash(cid)
+        if self._contains_hash(value):
+            return False
+
+        self._recent.add(value)
+        self._unflushed.append(value)
+        if len(self._recent) >= MERGE_THRESHOLD:
+            self._merge()
+        return True
+
+    def _merge(self):
+        self._sorted = array('Q', sorted(self._sorted.tolist() + list(self._recent)))
+        self._recent = set()
+
+    def flush(self):
+        """Append hashes added since the last flush to the file (no-op without a path)."""
+        if not self.path or not self._unflushed:
+            return
+        with open(self.path, 'ab') as f:
+            f.write(_to_file_order(array('Q', self._unflushed)).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._unflushed = []
+
+    def compact(self):
+        """Rewrite the file as one sorted run (drops duplicates left by interrupted runs)."""
+        if not self.path:
+            return
+        self._merge()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_to_file_order(self._sorted).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._unflushed = []
+
+    def close(self):
+        self.compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
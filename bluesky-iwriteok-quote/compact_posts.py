@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory post representations.
+
+Every post is normally a plain dict with eight keys, a full `at://` URI,
+a 59-character CID string and its own copy of the author handle. At
+millions of posts the per-object overhead dominates memory. Two compact
+alternatives, both converting losslessly to and from the JSON schema:
+
+    Post       -- a __slots__ record; the DID and author handle are
+                  interned, and the URI is stored as (did, rkey)
+    PostBatch  -- a columnar batch: interned author/DID tables with
+                  integer ids, CIDs packed as raw bytes in one bytearray,
+                  likes/reposts/replies in typed integer arrays and the
+                  feed reason as a one-byte code
+
+Keys outside the standard schema are kept in a per-post `extra` dict so
+nothing is lost in the round trip.
+
+Usage:
+    python3 compact_posts.py all_posts.json     # measure memory of each representation
+"""
+
+import argparse
+import base64
+import json
+import sys
+import tracemalloc
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+POST_KEYS = ('uri', 'cid', 'text', 'created_at', 'author', 'likes', 'reposts', 'replies')
+
+# The optional 'reason' key, coded by position (0: no reason key)
+REASON_CODES = (None, 'original', 'repost', 'reply')
+
+POST_COLLECTION = 'app.bsky.feed.post'
+
+# CIDv1 + dag-cbor + sha2-256: 36 bytes, written as 'b' + base32
+CID_BYTES = 36
+
+def split_uri(uri: str) -> Tuple[Optional[str], str]:
+    """Split at://<did>/app.bsky.feed.post/<rkey> into (did, rkey); (None, uri) otherwise."""
+    prefix = 'at://'
+    if uri.startswith(prefix):
+        did, _, rest = uri[len(prefix):].partition('/')
+        collection, _, rkey = rest.partition('/')
+        if collection == POST_COLLECTION and rkey and '/' not in rkey:
+            return did, rkey
+    return None, uri
+
+def join_uri(did: Optional[str], rkey: str) -> str:
+    if did is None:
+        return rkey
+    return f"at://{did}/{POST_COLLECTION}/{rkey}"
+
+def cid_to_bytes(cid: str) -> Optional[bytes]:
+    """Decode a base32 CIDv1 string to its 36 raw bytes, or None if it doesn't round-trip."""
+    if not cid.startswith('b'):
+        return None
+    body = cid[1:].upper()
+    try:
+        raw = base64.b32decode(body + '=' * (-len(body) % 8))
+    except ValueError:
+        return None
+    if len(raw) != CID_BYTES or bytes_to_cid(raw) != cid:
+        return None
+    return raw
+
+def bytes_to_cid(raw: bytes) -> str:
+    return 'b' + base64.b32encode(raw).decode('ascii').rstrip('=').lower()
+
+def _extra_keys(post: Dict) -> Optional[Dict]:
+    extra = {key: value for key, value in post.items() if key not in POST_KEYS and key != 'reason'}
+    if post.get('reason') not in REASON_CODES:
+        extra['reason'] = post['reason']
+    return extra or None
+
+class Post:
+    """A post record with __slots__ and interned repeated strings."""
+
+    __slots__ = ('did', 'rkey', 'cid', 'text', 'created_at', 'author',
+                 'likes', 'reposts', 'replies', 'reason', 'extra')
+
+    def __init__(self, uri: str, cid: str, text: str, created_at: str, author: str,
+                 likes: int = 0, reposts: int = 0, replies: int = 0, reason: Optional[str] = None,
+                 extra: Optional[Dict] = None):
+        did, self.rkey = split_uri(uri)
+        self.did = sys.intern(did) if did is not None else None
+        self.cid = cid
+        self.text = text
+        self.created_at = created_at
+        self.author = sys.intern(author)
+        self.likes = likes
+        self.reposts = reposts
+        self.replies = replies
+        self.reason = sys.intern(reason) if reason is not None else None
+        self.extra = extra
+
+    @property
+    def uri(self) -> str:
+        return join_uri(self.did, self.rkey)
+
+    @classmethod
+    def from_dict(cls, post: Dict) -> 'Post':
+        reason = post.get('reason')
+        return cls(*(post[key] for key in POST_KEYS), reason=reason if reason in REASON_CODES else None,
+                   extra=_extra_keys(post))
+
+    def to_dict(self) -> Dict:
+        post = {
+            'uri': self.uri,
+            'cid': self.cid,
+            'text': self.text,
+            'created_at': self.created_at,
+            'author': self.author,
+            'likes': self.likes,
+            'reposts': self.reposts,
+            'replies': self.replies,
+        }
+        if self.reason is not None:
+            post['reason'] = self.reason
+        if self.extra:
+            post.update(self.extra)
+        return post
+
+class _StringTable:
+    """Interns strings to small integer ids."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+class PostBatch:
+    """Columnar, array-backed storage for many posts. Indexing returns post dicts."""
+
+    # did id used for URIs that aren't plain post URIs (rkey then holds the full URI)
+    NO_DID = 0xFFFFFFFF
+
+    def __init__(self, posts: Iterable[Dict] = ()):
+        self.authors = _StringTable()
+        self.dids = _StringTable()
+        self.author_ids = array('I')
+        self.did_ids = array('I')
+        self.rkeys: List[str] = []
+        self.cids = bytearray()
+        self.texts: List[str] = []
+        self.created_at: List[str] = []
+        self.likes = array('q')
+        self.reposts = array('q')
+        self.replies = array('q')
+        self.reasons = array('B')
+        # Rare cases stored out of line: non-standard CIDs and extra keys
+        self.cid_overrides: Dict[int, str] = {}
+        self.extras: Dict[int, Dict] = {}
+
+        for post in posts:
+            self.append(post)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def append(self, post: Dict):
+        index = len(self.texts)
+
+        did, rkey = split_uri(post['uri'])
+        self.did_ids.append(self.NO_DID if did is None else self.dids.add(did))
+        self.rkeys.append(rkey)
+
+        raw_cid = cid_to_bytes(post['cid'])
+        if raw_cid is None:
+            self.cid_overrides[index] = post['cid']
+            raw_cid = bytes(CID_BYTES)
+        self.cids += raw_cid
+
+        self.texts.append(post['text'])
+        self.created_at.append(post['created_at'])
+        self.author_ids.append(self.authors.add(post['author']))
+        self.likes.append(post['likes'])
+        self.reposts.append(post['reposts'])
+        self.replies.append(post['replies'])
+        reason = post.get('reason')
+        self.reasons.append(REASON_CODES.index(reason) if reason in REASON_CODES else 0)
+
+        extra = _extra_keys(post)
+        if extra:
+            self.extras[index] = extra
+
+    def uri(self, index: int) -> str:
+        did_id = self.did_ids[index]
+        return join_uri(None if did_id == self.NO_DID else self.dids.values[did_id], self.rkeys[index])
+
+    def cid(self, index: int) -> str:
+        if index in self.cid_overrides:
+            return self.cid_overrides[index]
+        start = index * CID_BYTES
+        return bytes_to_cid(bytes(self.cids[start:start + CID_BYTES]))
+
+    def __getitem__(self, index: int) -> Dict:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        post = {
+            'uri': self.uri(index),
+            'cid': self.cid(index),
+            'text': self.texts[index],
+            'created_at': self.created_at[index],
+            'author': self.authors.values[self.author_ids[index]],
+            'likes': self.likes[index],
+            'reposts': self.reposts[index],
+            'replies': self.replies[index],
+        }
+        if self.reasons[index]:
+            post['reason'] = REASON_CODES[self.reasons[index]]
+        if index in self.extras:
+            post.update(self.extras[index])
+        return post
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self)
+
+def _traced_size(build) -> Tuple[object, int]:
+    """Build an object and return it with the bytes it holds according to tracemalloc."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return value, size
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure compact post representations")
+    parser.add_argument('posts', nargs='?', default='all_posts.json')
+    args = parser.parse_args()
+
+    with open(args.posts, encoding='utf-8') as f:
+        raw = f.read()
+
+    dicts, dict_size = _traced_size(lambda: json.loads(raw))
+    records, record_size = _traced_size(lambda: [Post.from_dict(post) for post in json.loads(raw)])
+    batch, batch_size = _traced_size(lambda: PostBatch(json.loads(raw)))
+
+    assert [record.to_dict() for record in records] == dicts
+    assert batch.to_dicts() == dicts
+
+    print(f"{len(dicts)} posts from {args.posts} (round trip verified)")
+    print(f"  dicts:          {dict_size / 1e6:6.2f} MB")
+    print(f"  Post records:   {record_size / 1e6:6.2f} MB ({record_size / dict_size:.0%})")
+    print(f"  PostBatch:      {batch_size / 1e6:6.2f} MB ({batch_size / dict_size:.0%})")
+
+if __name__ == '__main__':
+    main()
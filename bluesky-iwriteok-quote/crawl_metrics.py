@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Crawl instrumentation: latency histograms, bytes, retries, status codes
+and time per phase for every XRPC call.
+
+The `\\r` progress line in `fetch_all_posts` was the only view into a
+crawl, and failed requests were printed and forgotten. Every XRPC call
+now reports to the process-wide METRICS:
+    - request latency histogram and bytes received, per method
+    - status-code counts, retries (and why), network errors, cache hits
+    - wall time spent in network (concurrent requests count once, so it
+      never exceeds the run's duration), JSON parsing and scoring; the
+      per-method latency totals are summed over requests instead
+    - the slowest pages seen, with their parameters
+
+Read it as a JSON summary at the end of a run (`summary()`), or while the
+run is active as Prometheus text, either written to a file every few
+seconds or served at http://host:port/metrics (`start_exporter()`).
+
+Usage:
+    python3 working_fetch_script.py --metrics --metrics-port 9108
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How many of the slowest requests to remember
+SLOWEST_KEPT = 10
+
+PHASES = ('network', 'parse', 'scoring')
+
+# Seconds of past request intervals kept to merge overlapping requests with
+# (far longer than any one request runs)
+NETWORK_HORIZON = 600.0
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            running += count
+            result.append((str(bound), running))
+        return result
+
+    def quantile(self, fraction: float) -> Optional[str]:
+        """Upper bound label ('0.25', '+Inf') of the bucket holding the quantile (None if empty)."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        for bound, running in self.cumulative():
+            if running >= target:
+                return bound
+        return None
+
+class CrawlMetrics:
+    """Thread-safe counters and histograms for one process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+            self.bytes_received: Counter = Counter()
+            self.status_codes: Counter = Counter()   # (method, status)
+            self.retries: Counter = Counter()        # (method, reason)
+            self.errors: Counter = Counter()         # (method, exception name)
+            self.cache_hits: Counter = Counter()     # method
+            self.phase_seconds: Dict[str, float] = {phase: 0.0 for phase in PHASES}
+            self.slowest: List[Tuple[float, str, Dict]] = []
+            # Disjoint (start, end) perf_counter intervals with a request in flight, oldest first
+            self._in_flight: List[Tuple[float, float]] = []
+
+    def _add_network_time(self, seconds: float):
+        """Add a request that just finished to the network wall time, minus any overlap."""
+        now = time.perf_counter()
+        start = now - seconds
+        # Requests are reported as they finish, so the new interval reaches past every
+        # earlier one: it absorbs all intervals that end after it starts
+        added = seconds
+        while self._in_flight and self._in_flight[-1][1] > start:
+            earlier_start, earlier_end = self._in_flight.pop()
+            added -= earlier_end - max(earlier_start, start)
+            start = min(start, earlier_start)
+        self._in_flight.append((start, now))
+        self.phase_seconds['network'] += max(added, 0.0)
+
+        while self._in_flight[0][1] < now - NETWORK_HORIZON:
+            del self._in_flight[0]
+
+    def observe_request(self, method: str, status: int, seconds: float, size: int,
+                        params: Optional[Dict] = None):
+        with self.lock:
+            self.latency[method].observe(seconds)
+            self.bytes_received[method] += size
+            self.status_codes[(method, status)] += 1
+            self._add_network_time(seconds)
+            self.slowest.append((seconds, method, dict(params or {})))
+            self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def record_retry(self, method: str, reason: str):
+        with self.lock:
+            self.retries[(method, reason)] += 1
+
+    def record_error(self, method: str, error: BaseException, seconds: float = 0.0):
+        with self.lock:
+            self.errors[(method, error.__class__.__name__)] += 1
+            self._add_network_time(seconds)
+
+    def record_cache_hit(self, method: str):
+        with self.lock:
+            self.cache_hits[method] += 1
+
+    def add_phase_time(self, phase: str, seconds: float):
+        with self.lock:
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block of work under the given phase name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+
+    def summary(self) -> Dict:
+        """Machine-readable snapshot of everything recorded so far."""
+        with self.lock:
+            methods = {}
+            for method, histogram in self.latency.items():
+                methods[method] = {
+                    'requests': histogram.count,
+                    'latency_seconds_total': round(histogram.total, 4),
+                    'latency_p50_le': histogram.quantile(0.50),
+                    'latency_p99_le': histogram.quantile(0.99),
+                    'latency_buckets': dict(histogram.cumulative()),
+                    'bytes_received': self.bytes_received[method],
+                    'cache_hits': self.cache_hits[method],
+                }
+
+            return {
+                'elapsed_seconds': round(time.time() - self.started, 3),
+                'methods': methods,
+                'status_codes': {f"{method} {status}": count
+                                 for (method, status), count in sorted(self.status_codes.items())},
+                'retries': {f"{method} {reason}": count
+                            for (method, reason), count in sorted(self.retries.items())},
+                'errors': {f"{method} {name}": count
+                           for (method, name), count in sorted(self.errors.items())},
+                'phase_seconds': {phase: round(seconds, 4) for phase, seconds in self.phase_seconds.items()},
+                'slowest_requests': [{'seconds': round(seconds, 4), 'method': method, 'params': params}
+                                     for seconds, method, params in self.slowest],
+            }
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            lines.append('# HELP xrpc_request_duration_seconds XRPC request latency')
+            lines.append('# TYPE xrpc_request_duration_seconds histogram')
+            for method, histogram in sorted(self.latency.items()):
+                for bound, running in histogram.cumulative():
+                    lines.append(f'xrpc_request_duration_seconds_bucket{{method="{method}",le="{bound}"}} {running}')
+                lines.append(f'xrpc_request_duration_seconds_sum{{method="{method}"}} {histogram.total:.6f}')
+                lines.append(f'xrpc_request_duration_seconds_count{{method="{method}"}} {histogram.count}')
+
+            lines.append('# HELP xrpc_response_bytes_total Response bytes received')
+            lines.append('# TYPE xrpc_response_bytes_total counter')
+            for method, size in sorted(self.bytes_received.items()):
+                lines.append(f'xrpc_response_bytes_total{{method="{method}"}} {size}')
+
+            lines.append('# HELP xrpc_responses_total Responses by status code')
+            lines.append('# TYPE xrpc_responses_total counter')
+            for (method, status), count in sorted(self.status_codes.items()):
+                lines.append(f'xrpc_responses_total{{method="{method}",status="{status}"}} {count}')
+
+            lines.append('# HELP xrpc_retries_total Retried requests by reason')
+            lines.append('# TYPE xrpc_retries_total counter')
+            for (method, reason), count in sorted(self.retries.items()):
+                lines.append(f'xrpc_retries_total{{method="{method}",reason="{reason}"}} {count}')
+
+            lines.append('# HELP xrpc_errors_total Requests that failed without a response')
+            lines.append('# TYPE xrpc_errors_total counter')
+            for (method, name), count in sorted(self.errors.items()):
+                lines.append(f'xrpc_errors_total{{method="{method}",error="{name}"}} {count}')
+
+            lines.append('# HELP xrpc_cache_hits_total Requests answered from the response cache')
+            lines.append('# TYPE xrpc_cache_hits_total counter')
+            for method, count in sorted(self.cache_hits.items()):
+                lines.append(f'xrpc_cache_hits_total{{method="{method}"}} {count}')
+
+            lines.append('# HELP crawl_phase_seconds_total Wall time spent per phase')
+            lines.append('# TYPE crawl_phase_seconds_total counter')
+            for phase, seconds in sorted(self.phase_seconds.items()):
+                lines.append(f'crawl_phase_seconds_total{{phase="{phase}"}} {seconds:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_summary(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        # Atomic swap so a scraper never reads half a file
+        os.replace(tmp_path, path)
+
+class MetricsExporter:
+    """Publishes metrics while a run is active: a periodically rewritten file and/or /metrics."""
+
+    def __init__(self, metrics: CrawlMetrics, path: Optional[str] = None, port: Optional[int] = None,
+                 interval: float = 5.0, host: str = '127.0.0.1'):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._threads = []
+        self.httpd = None
+
+        if port is not None:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip('/') != '/metrics':
+                        self.send_error(404)
+                        return
+                    body = exporter.metrics.to_prometheus().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self.httpd = ThreadingHTTPServer((host, port), Handler)
+            self.httpd.daemon_threads = True
+
+    def start(self) -> 'MetricsExporter':
+        if self.httpd:
+            thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.path:
+            thread = threading.Thread(target=self._write_loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.metrics.write_prometheus(self.path)
+
+    def stop(self):
+        self._stop.set()
+        if self.path:
+            self.metrics.write_prometheus(self.path)
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+def start_exporter(path: Optional[str] = None, port: Optional[int] = None,
+                   interval: float = 5.0) -> MetricsExporter:
+    """Start exporting METRICS to a Prometheus text file and/or an HTTP /metrics endpoint."""
+    return MetricsExporter(METRICS, path, port, interval).start()
+
+# Shared by every XRPC call in the process
+METRICS = CrawlMetrics()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Sharded multi-process crawler over a persistent work queue.
+
+`fetch_all_posts` walks one account at a time in one process, and nothing
+remembers what it was doing if it dies. The crawl queue keeps the
+frontier in SQLite (`crawl_queue.db`), one row per account:
+
+    state         pending -> leased -> done, or failed after MAX_ATTEMPTS
+    lease         which worker holds the account and until when; a worker
+                  renews it after every page it stores
+    cursor        where an unfinished crawl stopped, so whoever picks the
+                  account up next resumes there instead of at page 1
+    newest        the newest feed item of the last completed crawl; a
+                  refresh stops when it gets back to it
+    attempts      failures so far, with a backoff before the next try
+
+Workers (separate processes, each with its own rate-limit share) pick
+accounts by consistent hashing: every live worker owns VNODES points on a
+hash ring and claims the pending accounts whose DID hashes into its arcs.
+Workers register a heartbeat; when one stops beating for a lease period
+it drops out of the ring, its arcs pass to its neighbours and, once its
+leases expire, its accounts are resumed from their saved cursors by their
+new owners. A worker that finds nothing in its own shard takes any
+unleased account rather than idle. Pages are stored in a PostStore (upsert
+on uri), so the one page a dying worker may have stored without recording
+it is rewritten harmlessly, never duplicated.
+
+Several hosts can split one account list with --hosts/--host: each host
+enqueues only the DIDs that hash to it on a ring of host names, into its
+own local queue. Removing a host from the list moves only that host's
+DIDs.
+
+More workers only finish sooner when a crawl waits on the network with
+rate budget to spare: the processes split one per-IP budget, so under a
+budget that already paces a single worker (the AppView's default ~10
+requests/sec) N workers take as long as one, and against a fast server
+they are bounded by CPU (~29ms per page here, mostly the FTS upsert). The
+queue's lasting gains are the resumable frontier and crash recovery.
+
+Usage:
+    python3 crawl_queue.py enqueue iwriteok.bsky.social did:plc:... --refresh-after 6
+    python3 crawl_queue.py work --workers 4 --db posts.db
+    python3 crawl_queue.py status
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import rate_limit
+import working_fetch_script
+from feed_decoder import feed_item_to_post
+from post_store import DB_FILE, PostStore
+from rate_limit import RateLimiter, backoff_delay
+from working_fetch_script import item_sort_at, resolve_dids, xrpc_get
+
+QUEUE_FILE = 'crawl_queue.db'
+
+# Seconds a lease (and a worker's heartbeat) stays valid without renewal
+LEASE_SECONDS = 60.0
+
+# Points per worker on the hash ring; more points, more even shards
+VNODES = 64
+
+# Failures before an account is marked failed
+MAX_ATTEMPTS = 5
+
+# Seconds an idle worker waits before looking for work again
+IDLE_POLL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    did TEXT PRIMARY KEY,
+    ring_position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    cursor TEXT,
+    newest TEXT,
+    crawl_newest TEXT,
+    posts INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    crawled_at REAL
+);
+CREATE INDEX IF NOT EXISTS accounts_state_ring ON accounts(state, ring_position);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+# Pending, or leased by a worker that stopped renewing, and not backing off
+CLAIMABLE = "(state = 'pending' OR (state = 'leased' AND lease_expires < :now)) AND not_before <= :now"
+
+def ring_hash(key: str) -> int:
+    """Position of key on the ring: 63 bits, so it fits an SQLite integer."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big') >> 1
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class HashRing:
+    """Consistent hashing: each node owns the arcs ending at its VNODES points."""
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = VNODES):
+        self.points = sorted((ring_hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(vnodes))
+        self._positions = [position for position, _ in self.points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """The node owning key: the first point at or after its hash, wrapping around."""
+        if not self.points:
+            return None
+        index = bisect_left(self._positions, ring_hash(key)) % len(self.points)
+        return self.points[index][1]
+
+    def arcs(self, node: str) -> List[Tuple[int, int]]:
+        """(start, end] ring ranges owned by node; the wrap-around arc is split in two."""
+        arcs = []
+        for index, (position, owner) in enumerate(self.points):
+            if owner != node:
+                continue
+            if index == 0:
+                arcs.append((-1, position))
+                arcs.append((self.points[-1][0], 2 ** 63 - 1))
+            else:
+                arcs.append((self.points[index - 1][0], position))
+        return arcs
+
+class CrawlQueue:
+    """Durable frontier of accounts to crawl, with leases, retries and per-account progress."""
+
+    def __init__(self, path: str = QUEUE_FILE, lease_seconds: float = LEASE_SECONDS):
+        self.lease_seconds = lease_seconds
+        # Autocommit; claims take an explicit write lock so two workers can't lease one account
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def enqueue(self, dids: Sequence[str], refresh_after: Optional[float] = None) -> int:
+        """
+        Add accounts to the frontier. Returns how many are now pending because of this call.
+
+        Accounts already done (or failed) are queued again if their last crawl is
+        more than refresh_after seconds old (None: leave them); a refresh only
+        fetches what's newer than that crawl.
+        """
+        now = time.time()
+        queued = 0
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for did in dict.fromkeys(dids):
+                cursor = self.conn.execute('INSERT OR IGNORE INTO accounts (did, ring_position) VALUES (?, ?)',
+                                           (did, ring_hash(did)))
+                if cursor.rowcount:
+                    queued += 1
+                elif refresh_after is not None:
+                    queued += self.conn.execute(
+                        "UPDATE accounts SET state = 'pending', attempts = 0, not_before = 0, last_error = NULL "
+                        "WHERE did = ? AND state IN ('done', 'failed') AND COALESCE(crawled_at, 0) <= ?",
+                        (did, now - refresh_after)).rowcount
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return queued
+
+    def heartbeat(self, worker_id: str):
+        self.conn.execute('INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)',
+                          (worker_id, time.time()))
+
+    def live_workers(self) -> List[str]:
+        """Workers that have checked in within a lease period."""
+        rows = self.conn.execute('SELECT worker_id FROM workers WHERE heartbeat >= ?',
+                                 (time.time() - self.lease_seconds,))
+        return [row['worker_id'] for row in rows]
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Lease the next account for worker_id: from its own shard if it has any
+        work, otherwise any claimable account. None when there's nothing to do.
+        """
+        self.heartbeat(worker_id)
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            arcs = HashRing(self.live_workers() + [worker_id]).arcs(worker_id)
+            in_shard = ' OR '.join(f'(ring_position > :start{i} AND ring_position <= :end{i})'
+                                   for i in range(len(arcs)))
+            params = {'now': now}
+            for i, (start, end) in enumerate(arcs):
+                params[f'start{i}'], params[f'end{i}'] = start, end
+            # Accounts never crawled first, then the stalest
+            order = ' ORDER BY crawled_at IS NOT NULL, crawled_at LIMIT 1'
+
+            row = self.conn.execute(f"SELECT * FROM accounts WHERE {CLAIMABLE} AND ({in_shard}){order}",
+                                    params).fetchone()
+            if row is None:
+                # Nothing left in our shard: help with someone else's rather than idle
+                row = self.conn.execute(f"SELECT * FROM accounts WHERE {CLAIMABLE}{order}", {'now': now}).fetchone()
+            if row is not None:
+                self.conn.execute("UPDATE accounts SET state = 'leased', lease_owner = ?, lease_expires = ? "
+                                  "WHERE did = ?", (worker_id, now + self.lease_seconds, row['did']))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        return dict(row) if row is not None else None
+
+    def progress(self, did: str, worker_id: str, cursor: Optional[str], posts: int,
+                 crawl_newest: Optional[str]) -> bool:
+        """
+        Record a stored page and renew the lease. False if worker_id no longer
+        holds the account (its lease expired and another worker took it over).
+        """
+        now = time.time()
+        updated = self.conn.execute(
+            "UPDATE accounts SET cursor = ?, posts = posts + ?, crawl_newest = ?, lease_expires = ? "
+            "WHERE did = ? AND state = 'leased' AND lease_owner = ?",
+            (cursor, posts, crawl_newest, now + self.lease_seconds, did, worker_id)).rowcount
+        self.heartbeat(worker_id)
+        return bool(updated)
+
+    def complete(self, did: str, worker_id: str):
+        """Mark a crawl finished; the next refresh stops at its newest item."""
+        self.conn.execute(
+            "UPDATE accounts SET state = 'done', cursor = NULL, newest = COALESCE(crawl_newest, newest), "
+            "crawl_newest = NULL, attempts = 0, lease_owner = NULL, lease_expires = NULL, last_error = NULL, "
+            "crawled_at = ? WHERE did = ? AND lease_owner = ?", (time.time(), did, worker_id))
+
+    def fail(self, did: str, worker_id: str, error: str):
+        """Give the account back with a backoff, or mark it failed after MAX_ATTEMPTS; progress is kept."""
+        # One transaction, and guarded on the owner: if our lease expired and another
+        # worker claimed the account meanwhile, its live lease must be left alone
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute('SELECT attempts FROM accounts WHERE did = ? AND lease_owner = ?',
+                                    (did, worker_id)).fetchone()
+            if row is not None:
+                attempts = row['attempts'] + 1
+                state = 'failed' if attempts >= MAX_ATTEMPTS else 'pending'
+                self.conn.execute(
+                    "UPDATE accounts SET state = ?, attempts = ?, not_before = ?, last_error = ?, "
+                    "lease_owner = NULL, lease_expires = NULL WHERE did = ? AND lease_owner = ?",
+                    (state, attempts, time.time() + backoff_delay(attempts), error, did, worker_id))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def release(self, worker_id: str):
+        """Hand back a stopping worker's leases and leave the ring."""
+        self.conn.execute("UPDATE accounts SET state = 'pending', lease_owner = NULL, lease_expires = NULL "
+                          "WHERE state = 'leased' AND lease_owner = ?", (worker_id,))
+        self.conn.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,))
+
+    def unfinished(self) -> int:
+        """Accounts pending or leased (including ones waiting out a backoff)."""
+        return self.conn.execute("SELECT COUNT(*) FROM accounts WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+    def failed(self) -> List[Dict]:
+        """Accounts that used up their attempts, with the last error."""
+        return [dict(row) for row in self.conn.execute("SELECT * FROM accounts WHERE state = 'failed'")]
+
+    def stats(self) -> Dict[str, int]:
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for row in self.conn.execute('SELECT state, COUNT(*) AS n FROM accounts GROUP BY state'):
+            counts[row['state']] = row['n']
+        return counts
+
+def crawl_account(queue: CrawlQueue, store: PostStore, worker_id: str, account: Dict) -> int:
+    """
+    Crawl one leased account into store, resuming from its saved cursor and
+    stopping at the newest item of its last completed crawl. Returns pages fetched.
+    """
+    did = account['did']
+    cursor = account['cursor']
+    crawl_newest = account['crawl_newest']
+    known = _parse_time(account['newest']) if account['newest'] else None
+    pages = 0
+
+    while True:
+        params = {'actor': did, 'limit': '100'}
+        if cursor:
+            params['cursor'] = cursor
+        response = xrpc_get('app.bsky.feed.getAuthorFeed', params)
+        pages += 1
+
+        items = response.get('feed') or []
+        if crawl_newest is None and items:
+            crawl_newest = item_sort_at(items[0])
+        if known is not None:
+            fresh = [item for item in items if _parse_time(item_sort_at(item)) > known]
+            caught_up = len(fresh) < len(items)
+            items = fresh
+        else:
+            caught_up = False
+
+        posts = [post for post in map(feed_item_to_post, items) if post]
+        store.insert_posts(posts)
+        cursor = response.get('cursor')
+        done = not items or not cursor or caught_up
+
+        # After the posts are stored, so a crash repeats a page rather than skipping one
+        if not queue.progress(did, worker_id, None if done else cursor, len(posts), crawl_newest):
+            print(f"  {worker_id}: lost the lease on {did}, stopping")
+            return pages
+        if done:
+            queue.complete(did, worker_id)
+            return pages
+
+def run_worker(queue_path: str = QUEUE_FILE, db_path: str = DB_FILE, worker_id: Optional[str] = None,
+               share: float = 1.0, base_url: Optional[str] = None, lease_seconds: float = LEASE_SECONDS) -> int:
+    """Claim and crawl accounts until none are left unfinished. Returns pages fetched."""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    if base_url:
+        working_fetch_script.BASE_URL = base_url
+    # This process's share of the per-IP budget
+    rate_limit.LIMITER = RateLimiter(share=share)
+
+    pages = 0
+    with CrawlQueue(queue_path, lease_seconds) as queue, PostStore(db_path) as store:
+        try:
+            while True:
+                account = queue.claim(worker_id)
+                if account is None:
+                    if not queue.unfinished():
+                        return pages
+                    time.sleep(IDLE_POLL)
+                    continue
+                try:
+                    pages += crawl_account(queue, store, worker_id, account)
+                except Exception as e:
+                    print(f"  {worker_id}: {account['did']} failed: {e}")
+                    queue.fail(account['did'], worker_id, str(e))
+        finally:
+            queue.release(worker_id)
+
+def run_workers(workers: int, queue_path: str = QUEUE_FILE, db_path: str = DB_FILE,
+                base_url: Optional[str] = None) -> int:
+    """Run workers processes (splitting the rate budget between them) until the queue drains."""
+    with multiprocessing.Pool(workers) as pool:
+        results = [pool.apply_async(run_worker, (queue_path, db_path, None, 1 / workers, base_url))
+                   for _ in range(workers)]
+        return sum(result.get() for result in results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded multi-process crawl over a persistent queue")
+    parser.add_argument('--queue', default=QUEUE_FILE, help=f"queue database (default {QUEUE_FILE})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_cmd = commands.add_parser('enqueue', help="add accounts (handles or DIDs) to the frontier")
+    enqueue_cmd.add_argument('actors', nargs='+')
+    enqueue_cmd.add_argument('--refresh-after', type=float, default=None,
+                             help="re-queue accounts last crawled more than this many hours ago")
+    enqueue_cmd.add_argument('--hosts', default=None, help="comma-separated hosts splitting the account list")
+    enqueue_cmd.add_argument('--host', default=socket.gethostname(), help="this host's name in --hosts")
+
+    work_cmd = commands.add_parser('work', help="crawl until the queue is drained")
+    work_cmd.add_argument('--workers', type=int, default=4)
+    work_cmd.add_argument('--db', default=DB_FILE, help=f"PostStore to write posts to (default {DB_FILE})")
+    work_cmd.add_argument('--base-url', default=None, help="XRPC base URL (default the public AppView)")
+
+    commands.add_parser('status', help="accounts per state")
+
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        dids = list(dict.fromkeys(did for did in resolve_dids(args.actors).values()))
+        if args.hosts:
+            ring = HashRing(args.hosts.split(','))
+            dids = [did for did in dids if ring.owner(did) == args.host]
+        refresh_after = args.refresh_after * 3600 if args.refresh_after is not None else None
+        with CrawlQueue(args.queue) as queue:
+            print(f"Queued {queue.enqueue(dids, refresh_after)} of {len(dids)} accounts")
+
+    elif args.command == 'work':
+        start = time.perf_counter()
+        pages = run_workers(args.workers, args.queue, args.db, args.base_url)
+        print(f"{args.workers} workers fetched {pages} pages in {time.perf_counter() - start:.2f}s")
+
+    with CrawlQueue(args.queue) as queue:
+        print(', '.join(f"{state}: {count}" for state, count in queue.stats().items()))
+        for row in queue.failed():
+            print(f"  failed {row['did']} after {row['attempts']} attempts: {row['last_error']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Selective decoding of getAuthorFeed pages.
+
+`response.json()` builds the whole hydrated tree for every item: the
+author view with avatar and labels, embeds (images, quoted posts with
+their own authors and embeds), facets, viewer state, thread gates...
+and `feed_item_to_post` then keeps eight fields. decode_feed_page goes
+straight from the response body to our flat post dicts.
+
+With msgspec installed, the page is decoded against Structs that declare
+only what we read:
+
+    post.uri, post.cid, post.author.handle, post.record.text,
+    post.record.createdAt, post.record.reply (presence only), the like,
+    repost and reply counts, and reason.$type
+
+Everything else is skipped by the parser without building Python
+objects, and the reply reference is kept as raw bytes. Without msgspec
+it falls back to json.loads and feed_item_to_post, with the same output.
+
+Requirements (optional):
+    pip install msgspec
+
+Usage:
+    page = xrpc_get('app.bsky.feed.getAuthorFeed', params, decode=decode_feed_page)
+    page['posts'], page['cursor']
+"""
+
+import json
+from typing import Dict, List, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+REPOST_REASON = 'app.bsky.feed.defs#reasonRepost'
+
+def feed_item_reason(item: Dict) -> str:
+    """'repost' if the author reposted it, 'reply' if it answers another post, else 'original'."""
+    reason = item.get('reason') or {}
+    if reason.get('$type') == REPOST_REASON:
+        return 'repost'
+    if item['post']['record'].get('reply'):
+        return 'reply'
+    return 'original'
+
+def feed_item_to_post(item: Dict) -> Optional[Dict]:
+    """Convert a getAuthorFeed item into our flat post dict (None if it has no record)."""
+    if 'post' not in item or 'record' not in item['post']:
+        return None
+
+    post = item['post']
+    record = post['record']
+
+    return {
+        'uri': post['uri'],
+        'cid': post['cid'],
+        'text': record.get('text', ''),
+        'created_at': record.get('createdAt', ''),
+        'author': post['author']['handle'],
+        'likes': post.get('likeCount', 0),
+        'reposts': post.get('repostCount', 0),
+        'replies': post.get('replyCount', 0),
+        'reason': feed_item_reason(item),
+    }
+
+if msgspec is not None:
+    class _Author(msgspec.Struct):
+        handle: str
+
+    class _Record(msgspec.Struct, rename='camel'):
+        text: str = ''
+        created_at: str = ''
+        # Only whether it's there matters, so leave it undecoded
+        reply: Optional[msgspec.Raw] = None
+
+    class _Post(msgspec.Struct, rename='camel'):
+        uri: str
+        cid: str
+        author: _Author
+        record: Optional[_Record] = None
+        like_count: int = 0
+        repost_count: int = 0
+        reply_count: int = 0
+
+    class _Reason(msgspec.Struct):
+        type: str = msgspec.field(name='$type', default='')
+
+    class _FeedItem(msgspec.Struct):
+        post: Optional[_Post] = None
+        reason: Optional[_Reason] = None
+
+    class _FeedPage(msgspec.Struct):
+        feed: List[_FeedItem] = []
+        cursor: Optional[str] = None
+
+    _page_decoder = msgspec.json.Decoder(_FeedPage)
+
+def _item_reason(item: '_FeedItem') -> str:
+    if item.reason is not None and item.reason.type == REPOST_REASON:
+        return 'repost'
+    if item.post.record.reply is not None:
+        return 'reply'
+    return 'original'
+
+def decode_feed_page(body: bytes) -> Dict:
+    """
+    A getAuthorFeed response body as {'posts', 'cursor', 'items'}.
+
+    posts are flat post dicts like feed_item_to_post's (items without a record
+    are dropped); items is the number of feed items on the page.
+    """
+    if msgspec is None:
+        page = json.loads(body)
+        feed = page.get('feed') or []
+        posts = [post for post in map(feed_item_to_post, feed) if post]
+        return {'posts': posts, 'cursor': page.get('cursor'), 'items': len(feed)}
+
+    page = _page_decoder.decode(body)
+    posts = [
+        {
+            'uri': item.post.uri,
+            'cid': item.post.cid,
+            'text': item.post.record.text,
+            'created_at': item.post.record.created_at,
+            'author': item.post.author.handle,
+            'likes': item.post.like_count,
+            'reposts': item.post.repost_count,
+            'replies': item.post.reply_count,
+            'reason': _item_reason(item),
+        }
+        for item in page.feed
+        if item.post is not None and item.post.record is not None
+    ]
+    return {'posts': posts, 'cursor': page.cursor, 'items': len(page.feed)}
@@ -4,20 +4,15 @@ Fetch posts from @iwriteok on Bluesky using direct HTTP API calls.
 """
 
 import json
-import urllib.request
-import urllib.parse
-import time
+
+from actor_resolver import get_resolver
+from transport import xrpc_get
 
 BASE_URL = "https://public.api.bsky.app/xrpc"
 
 def get_profile(handle):
-    """Get profile information for a user."""
-    url = f"{BASE_URL}/app.bsky.actor.getProfile?actor={urllib.parse.quote(handle)}"
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'Mozilla/5.0 (compatible; ResearchBot/1.0)'
-    })
-    with urllib.request.urlopen(req) as response:
-        return json.loads(response.read())
+    """Get profile information for a user (cached; see actor_resolver.py)."""
+    return get_resolver().resolve(handle, BASE_URL)
 
 def get_author_feed(actor_did, limit=100, cursor=None):
     """Get posts from an author's feed."""
@@ -25,12 +20,7 @@ def get_author_feed(actor_did, limit=100, cursor=None):
     if cursor:
         params['cursor'] = cursor
 
-    url = f"{BASE_URL}/app.bsky.feed.getAuthorFeed?{urllib.parse.urlencode(params)}"
-    req = urllib.request.Request(url, headers={
-        'User-Agent': 'Mozilla/5.0 (compatible; ResearchBot/1.0)'
-    })
-    with urllib.request.urlopen(req) as response:
-        return json.loads(response.read())
+    return xrpc_get(BASE_URL, 'app.bsky.feed.getAuthorFeed', params)
 
 def fetch_user_posts(handle, max_posts=1000):
     """Fetch posts from a Bluesky user."""
@@ -76,9 +66,6 @@ def fetch_user_posts(handle, max_posts=1000):
             if not cursor:
                 break
 
-            # Be nice to the API
-            time.sleep(0.5)
-
         return posts
 
     except Exception as e:
@@ -113,8 +100,11 @@ if __name__ == '__main__':
         'iwriteok.com',
     ]
 
+    # One getProfiles call for every candidate; only handles that exist are crawled
+    profiles = get_resolver().resolve_many(possible_handles, BASE_URL)
+
     posts = []
-    for handle in possible_handles:
+    for handle in [handle for handle in possible_handles if profiles[handle]]:
         print(f"\nTrying handle: {handle}")
         print("=" * 80)
         try:
@@ -5,10 +5,11 @@ Try different approaches including web scraping.
 """
 
 import json
-import requests
 import time
 import re
 
+from transport import http_get
+
 def try_api_approach():
     """Try using the API with different endpoints."""
 
@@ -32,7 +33,7 @@ def try_api_approach():
                     'Accept': 'application/json',
                 }
 
-                response = requests.get(url, params=params, headers=headers, timeout=10)
+                response = http_get(url, params=params, headers=headers)
                 print(f"  Status: {response.status_code}")
 
                 if response.status_code == 200:
@@ -57,7 +58,7 @@ def try_web_scrape(handle):
         }
 
         print(f"\nTrying to scrape: {url}")
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_get(url, headers=headers)
         print(f"Status: {response.status_code}")
 
         if response.status_code == 200:
@@ -91,7 +92,7 @@ def search_bluesky_social(query):
         }
 
         print(f"\nTrying search: {url}")
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = http_get(url, params=params, headers=headers)
         print(f"Status: {response.status_code}")
 
         if response.status_code == 200:
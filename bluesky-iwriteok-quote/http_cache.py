@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+On-disk response cache for XRPC GETs.
+
+Re-running an analysis minutes later, or retrying after a crash, used to
+refetch every profile and feed page. ResponseCache keeps raw response
+bodies in a small SQLite file keyed by endpoint + parameters (the cursor
+is just another parameter):
+    - each entry has a time-to-live chosen per endpoint by ttl_for():
+      profiles and older (cursor) feed pages rarely change and live for
+      hours, the newest feed page only for a minute
+    - expired entries are kept while there's room, and if the server gave
+      an ETag we revalidate with If-None-Match; a 304 refreshes the entry
+      without re-downloading the body
+    - the file is bounded by max_bytes with least-recently-used eviction
+
+Cache hits skip both the network and the rate limiter.
+
+Usage:
+    cache = get_cache()
+    key = cache_key(url, params)
+    entry = cache.lookup(key)
+    if entry and entry.fresh:
+        return json.loads(entry.body)
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urlencode
+
+CACHE_PATH = 'xrpc_cache.db'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds each kind of response stays fresh
+PROFILE_TTL = 6 * 60 * 60
+FEED_HEAD_TTL = 60
+FEED_PAGE_TTL = 24 * 60 * 60
+DEFAULT_TTL = 5 * 60
+
+# Evict down to this fraction of max_bytes so we don't evict on every store
+EVICT_TARGET = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    etag TEXT,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+"""
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    fresh: bool
+
+def cache_key(url: str, params: Dict) -> str:
+    """Stable key for a GET: endpoint URL plus sorted query parameters (lists as repeated keys)."""
+    return f"{url}?{urlencode(sorted(params.items()), doseq=True)}"
+
+def ttl_for(method: str, params: Dict) -> float:
+    """How long a response for this call stays fresh."""
+    # getProfiles isn't cached here: actor_resolver is the one cache for batched lookups
+    if method == 'app.bsky.actor.getProfile':
+        return PROFILE_TTL
+    if method == 'app.bsky.feed.getAuthorFeed':
+        # The first page is where new posts show up; later pages are history
+        return FEED_PAGE_TTL if params.get('cursor') else FEED_HEAD_TTL
+    return DEFAULT_TTL
+
+class ResponseCache:
+    """Size-bounded LRU cache of response bodies with TTLs and ETags."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Return the cached response for key (fresh or stale), or None."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT body, etag, expires_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+
+        body, etag, expires_at = row
+        return CacheEntry(bytes(body), etag, expires_at > now)
+
+    def store(self, key: str, body: bytes, etag: Optional[str], ttl: float):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses (key, body, etag, expires_at, last_used, size) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, body, etag, now + ttl, now, len(body))
+            )
+            self._evict()
+
+    def refresh(self, key: str, ttl: float):
+        """Mark an entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE responses SET expires_at = ?, last_used = ? WHERE key = ?',
+                              (now + ttl, now, key))
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache is under its size budget."""
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * EVICT_TARGET
+        doomed = []
+        for key, size in self.conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self.conn.executemany('DELETE FROM responses WHERE key = ?', doomed)
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM responses')
+
+_cache: Optional[ResponseCache] = None
+_cache_enabled = True
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[ResponseCache]:
+    """The process-wide cache (opened on first use), or None if caching is disabled."""
+    global _cache
+    if not _cache_enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def set_cache(cache: Optional[ResponseCache]):
+    """Replace the process-wide cache; pass None to disable caching."""
+    global _cache, _cache_enabled
+    with _cache_lock:
+        _cache = cache
+        _cache_enabled = cache is not None
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Jetstream server, for testing live ingestion offline.
+
+Replays recorded events (a JSONL file written by `live_ingest.py --record`)
+or events built from `all_posts.json`, then keeps the socket open and
+pushes anything passed to `publish()` as it happens. Like Jetstream it
+honours `wantedCollections`, `wantedDids` and a `time_us` `cursor`
+(replay starts at the first event at or after it; identity and account
+events are sent whatever the collections). `drop_after` closes
+each connection after that many events, to exercise reconnects.
+
+Usage:
+    python3 jetstream_stub.py --events all_posts.json --port 6008 --rate 200
+    python3 live_ingest.py iwriteok.bsky.social --url ws://127.0.0.1:6008/subscribe
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+POST_COLLECTION = 'app.bsky.feed.post'
+
+def _time_us(created_at: str) -> int:
+    return int(datetime.fromisoformat(created_at.replace('Z', '+00:00')).timestamp() * 1_000_000)
+
+def post_event(did: str, rkey: str, text: str, created_at: str, time_us: int, cid: str = '') -> Dict:
+    """A Jetstream commit event for a new post."""
+    return {
+        'did': did,
+        'time_us': time_us,
+        'kind': 'commit',
+        'commit': {
+            'rev': rkey,
+            'operation': 'create',
+            'collection': POST_COLLECTION,
+            'rkey': rkey,
+            'record': {'$type': POST_COLLECTION, 'text': text, 'createdAt': created_at},
+            'cid': cid,
+        },
+    }
+
+def posts_to_events(posts: List[Dict]) -> List[Dict]:
+    """Post-creation events for flat post dicts, oldest first (one per distinct URI)."""
+    events = {}
+    for post in posts:
+        did, _, rkey = post['uri'][len('at://'):].split('/')
+        events[post['uri']] = post_event(did, rkey, post['text'], post['created_at'],
+                                         _time_us(post['created_at']), post['cid'])
+    ordered = sorted(events.values(), key=lambda event: event['time_us'])
+    # time_us is unique per event on a real server
+    for previous, event in zip(ordered, ordered[1:]):
+        if event['time_us'] <= previous['time_us']:
+            event['time_us'] = previous['time_us'] + 1
+    return ordered
+
+def load_events(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return posts_to_events(json.load(f))
+
+class JetstreamStub:
+    """aiohttp WebSocket server replaying events, run on its own thread and event loop."""
+
+    def __init__(self, events: List[Dict], host: str = '127.0.0.1', port: int = 0,
+                 rate: float = 0.0, drop_after: Optional[int] = None):
+        self.events = sorted(events, key=lambda event: event['time_us'])
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.drop_after = drop_after
+        self.connections = 0
+        self.sent = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._ready = threading.Event()
+        self._new_event: Optional[asyncio.Condition] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/subscribe"
+
+    def start(self) -> 'JetstreamStub':
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def publish(self, event: Dict):
+        """Append a live event (stamped with the current time_us if it has none) and push it out."""
+        event.setdefault('time_us', int(time.time() * 1_000_000))
+        asyncio.run_coroutine_threadsafe(self._publish(event), self._loop).result()
+
+    async def _publish(self, event: Dict):
+        async with self._new_event:
+            self.events.append(event)
+            self._new_event.notify_all()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._new_event = asyncio.Condition()
+        app = web.Application()
+        app.router.add_get('/subscribe', self._subscribe)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _subscribe(self, request: web.Request) -> web.WebSocketResponse:
+        collections = set(request.query.getall('wantedCollections', []))
+        dids = set(request.query.getall('wantedDids', []))
+        cursor = int(request.query['cursor']) if 'cursor' in request.query else None
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        # Reading is what notices the client going away
+        reader = asyncio.create_task(self._drain(ws))
+
+        if cursor is None:
+            # No cursor: live tail only, like Jetstream
+            index = len(self.events)
+        else:
+            index = bisect.bisect_left([event['time_us'] for event in self.events], cursor)
+
+        try:
+            await self._replay(ws, index, collections, dids)
+        finally:
+            reader.cancel()
+        return ws
+
+    async def _drain(self, ws: web.WebSocketResponse):
+        async for message in ws:
+            if message.type == WSMsgType.ERROR:
+                break
+
+    async def _replay(self, ws: web.WebSocketResponse, index: int, collections, dids):
+        sent = 0
+        while not ws.closed:
+            async with self._new_event:
+                while index >= len(self.events) and not ws.closed:
+                    try:
+                        await asyncio.wait_for(self._new_event.wait(), 0.5)
+                    except asyncio.TimeoutError:
+                        pass
+            if ws.closed:
+                break
+            event = self.events[index]
+            index += 1
+
+            # Like Jetstream, identity and account events ignore wantedCollections
+            if collections and event.get('kind') == 'commit' and event['commit'].get('collection') not in collections:
+                continue
+            if dids and event.get('did') not in dids:
+                continue
+
+            await ws.send_str(json.dumps(event))
+            sent += 1
+            self.sent += 1
+            if self.drop_after and sent >= self.drop_after:
+                await ws.close()
+                break
+            if self.rate:
+                await asyncio.sleep(1 / self.rate)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Jetstream stand-in replaying recorded events")
+    parser.add_argument('--events', default='all_posts.json',
+                        help="events .jsonl recorded by live_ingest.py, or a posts .json file")
+    parser.add_argument('--port', type=int, default=6008)
+    parser.add_argument('--rate', type=float, default=0.0, help="events per second (0: as fast as possible)")
+    parser.add_argument('--drop-after', type=int, default=None,
+                        help="close each connection after this many events")
+    args = parser.parse_args()
+
+    stub = JetstreamStub(load_events(args.events), port=args.port, rate=args.rate,
+                         drop_after=args.drop_after).start()
+    print(f"Replaying {len(stub.events)} events at {stub.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Streaming JSONL output for crawls.
+
+`fetch_all_posts` keeps every post in memory and `main` writes one big
+pretty-printed JSON file at the end. This module instead appends each
+page's posts to a JSONL file (one post dict per line) as soon as the page
+arrives and flushes after every page, so memory stays flat however many
+accounts we crawl and a crash still leaves every completed page on disk.
+
+Posts whose CID is already in the persistent `seen_cids.bin` are skipped,
+so re-running a crawl, or crawling accounts that repost each other, only
+appends posts the file doesn't have yet.
+
+Usage:
+    python3 jsonl_store.py iwriteok.bsky.social other.bsky.social --output all_posts.jsonl
+    python3 jsonl_store.py iwriteok.bsky.social --skip-reposts --filter posts_no_replies
+
+Reading it back:
+    for post in iter_jsonl('all_posts.jsonl'):
+        ...
+"""
+
+import argparse
+import json
+import os
+from typing import Collection, Dict, IO, Iterable, Iterator, List, Optional
+
+from cid_set import SEEN_FILE, CidSet
+from working_fetch_script import (FEED_FILTERS, FEED_REASONS, HANDLE, MAX_POSTS, filter_posts, iter_feed_pages,
+                                  resolve_dids)
+
+def open_jsonl_for_append(path: str) -> IO[str]:
+    """Open path for appending, first terminating a line left half-written by a crash."""
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+        if needs_newline:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+    return open(path, 'a', encoding='utf-8')
+
+def append_posts(f: IO[str], posts: Iterable[Dict]):
+    """Append posts as JSON lines and flush them to disk."""
+    for post in posts:
+        f.write(json.dumps(post, ensure_ascii=False))
+        f.write('\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """Yield posts from a JSONL file one at a time, skipping lines cut short by a crash."""
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping truncated line {line_number} in {path}")
+
+def stream_posts_to_jsonl(actor: str, f: IO[str], max_posts: int = MAX_POSTS,
+                          seen: Optional[CidSet] = None, reasons: Optional[Collection[str]] = None,
+                          feed_filter: Optional[str] = None) -> int:
+    """
+    Crawl one actor's feed, appending each page's new posts to f. Returns the number written.
+
+    Posts already in seen (by CID) or without a wanted reason are skipped.
+    """
+    written = 0
+    for page, (page_posts, _) in enumerate(iter_feed_pages(actor, feed_filter=feed_filter), 1):
+        page_posts = filter_posts(page_posts, reasons, seen)
+        append_posts(f, page_posts)
+        if seen is not None:
+            # After the posts, so a crash can repeat a page but never lose one
+            seen.flush()
+        written += len(page_posts)
+        print(f"  @{actor} page {page}: {written} posts written...", end='\r')
+        if written >= max_posts:
+            break
+
+    print(f"\n  @{actor}: {written} posts")
+    return written
+
+def stream_accounts(actors: List[str], path: str, max_posts: int = MAX_POSTS,
+                    seen_path: Optional[str] = SEEN_FILE, reasons: Optional[Collection[str]] = None,
+                    feed_filter: Optional[str] = None) -> int:
+    """
+    Crawl several actors into one JSONL file. Returns the total number of posts written.
+
+    Handles are resolved to DIDs up front in one batched lookup, and each
+    account is crawled once however many ways it is named. seen_path persists
+    the CIDs already written, across accounts and runs (None: this run only).
+    """
+    dids = dict.fromkeys(resolve_dids(actors).values())
+    with open_jsonl_for_append(path) as f, CidSet(seen_path) as seen:
+        return sum(stream_posts_to_jsonl(did, f, max_posts, seen, reasons, feed_filter)
+                   for did in dids)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream Bluesky author feeds to a JSONL file")
+    parser.add_argument('actors', nargs='*', default=[HANDLE], help=f"handles or DIDs (default {HANDLE})")
+    parser.add_argument('--output', default='all_posts.jsonl', help="JSONL file to append to")
+    parser.add_argument('--max-posts', type=int, default=MAX_POSTS, help="max posts per actor")
+    parser.add_argument('--seen', default=SEEN_FILE, help=f"persistent CID set (default {SEEN_FILE})")
+    parser.add_argument('--no-dedup', action='store_true', help="don't skip posts seen in earlier runs")
+    parser.add_argument('--filter', choices=FEED_FILTERS, default=None, help="server-side feed filter")
+    parser.add_argument('--skip-reposts', action='store_true', help="drop reposts of other accounts' posts")
+    args = parser.parse_args()
+
+    reasons = [reason for reason in FEED_REASONS if reason != 'repost'] if args.skip_reposts else None
+    total = stream_accounts(args.actors, args.output, args.max_posts,
+                            None if args.no_dedup else args.seen, reasons, args.filter)
+    print(f"\nWrote {total} posts to {args.output}")
+
+if __name__ == '__main__':
+    main()
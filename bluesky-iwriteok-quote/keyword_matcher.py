@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Compiled multi-keyword matcher (Aho-Corasick).
+
+`calculate_relevance_score` used to run `keyword in text` once per keyword
+and then rescan the matches for each concept group, so cost grew with
+posts x keywords. A KeywordMatcher is built once from the keyword list and
+finds every keyword in a single pass over the lowercased text, returning
+both the matched keywords (in keyword-list order) and the concept groups
+they belong to.
+
+With word_boundaries=False the result is identical to the substring test
+(`keyword.lower() in text.lower()`). With word_boundaries=True a hit only
+counts when it isn't glued to letters/digits on either side, so 'addict'
+no longer matches inside 'addiction'.
+
+Example:
+    matcher = KeywordMatcher(KEYWORDS, CONCEPT_GROUPS)
+    matched, groups = matcher.match(post['text'])
+"""
+
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed keyword list."""
+
+    def __init__(self, keywords: List[str], groups: Optional[Dict[str, List[str]]] = None,
+                 word_boundaries: bool = False):
+        self.keywords = list(keywords)
+        self.word_boundaries = word_boundaries
+
+        # Duplicate keywords (or ones that only differ in case) share one pattern
+        patterns: Dict[str, int] = {}
+        self.pattern_keywords: List[List[int]] = []
+        for index, keyword in enumerate(self.keywords):
+            pattern = keyword.lower()
+            if pattern not in patterns:
+                patterns[pattern] = len(self.pattern_keywords)
+                self.pattern_keywords.append([])
+            self.pattern_keywords[patterns[pattern]].append(index)
+        self.patterns = list(patterns)
+
+        # Group membership is by exact keyword string, like the original any(...) checks
+        self.keyword_groups: List[List[str]] = [[] for _ in self.keywords]
+        for group, members in (groups or {}).items():
+            for index, keyword in enumerate(self.keywords):
+                if keyword in members:
+                    self.keyword_groups[index].append(group)
+
+        self._build()
+
+    def _build(self):
+        """Build the trie, failure links and merged outputs."""
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+
+        # An empty keyword matches every text, as `'' in text` does
+        self.always: List[int] = []
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not pattern:
+                self.always.append(pattern_id)
+                continue
+            node = 0
+            for ch in pattern:
+                next_node = self.goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][ch] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = next_node
+            self.output[node].append(pattern_id)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def _at_boundary(self, text: str, start: int, end: int) -> bool:
+        before_ok = start == 0 or not text[start - 1].isalnum()
+        after_ok = end == len(text) or not text[end].isalnum()
+        return before_ok and after_ok
+
+    def find_patterns(self, text: str) -> Set[int]:
+        """Return the ids of every pattern occurring in text, in one pass."""
+        text = text.lower()
+        found = set(self.always)
+        remaining = len(self.patterns) - len(found)
+        goto, fail, output = self.goto, self.fail, self.output
+        patterns, word_boundaries = self.patterns, self.word_boundaries
+
+        node = 0
+        for position, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+
+            for pattern_id in output[node]:
+                if pattern_id in found:
+                    continue
+                if word_boundaries:
+                    end = position + 1
+                    if not self._at_boundary(text, end - len(patterns[pattern_id]), end):
+                        continue
+                found.add(pattern_id)
+                remaining -= 1
+
+            if not remaining:
+                break
+
+        return found
+
+    def match(self, text: str) -> Tuple[List[str], Set[str]]:
+        """Return (matched keywords in keyword-list order, concept groups hit)."""
+        indices = sorted(index for pattern_id in self.find_patterns(text)
+                         for index in self.pattern_keywords[pattern_id])
+        groups = {group for index in indices for group in self.keyword_groups[index]}
+        return [self.keywords[index] for index in indices], groups
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Live ingestion: score new posts from watched accounts as they're published.
+
+Finding new matches used to mean re-running the batch crawl and
+`search_posts`. This subscribes to a Jetstream WebSocket (the JSON
+re-encoding of the firehose), limited server-side to `app.bsky.feed.post`
+events from the watched DIDs, and runs `calculate_relevance_score` on
+each post as it arrives:
+    - matches are upserted into the SQLite PostStore and appended to
+      `keyword_matches_live.jsonl`, seconds after they were posted
+    - events go through a bounded queue; when the writer falls behind the
+      reader stops reading, so TCP pushes back on the server instead of
+      memory growing without limit
+    - the last processed event's `time_us` cursor is saved to
+      `live_cursor.json` after each write. Reconnects (and restarts)
+      resume from it, rewound a few seconds as Jetstream recommends; URIs
+      already handled in that window are skipped. Delivery is
+      at-least-once, and the store upserts on uri
+    - identity events keep watched handles (and the actor_resolver cache)
+      current when an account changes handle
+
+Requirements:
+    pip install aiohttp requests
+
+Usage:
+    python3 live_ingest.py iwriteok.bsky.social
+    python3 live_ingest.py did:plc:... --url ws://127.0.0.1:6008/subscribe --record events.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from jsonl_store import append_posts, open_jsonl_for_append
+from post_store import DB_FILE, PostStore
+from rate_limit import backoff_delay
+from sync_posts import _write_json_atomic
+from actor_resolver import get_resolver
+from working_fetch_script import KEYWORDS, calculate_relevance_score, resolve_actors
+
+JETSTREAM_URL = "wss://jetstream2.us-east.bsky.network/subscribe"
+POST_COLLECTION = 'app.bsky.feed.post'
+
+CURSOR_FILE = 'live_cursor.json'
+MATCHES_FILE = 'keyword_matches_live.jsonl'
+
+# Events buffered between the socket reader and the scorer/writer
+QUEUE_SIZE = 1000
+
+# Most events handled per store write
+BATCH_SIZE = 200
+
+# How far back to resume after a reconnect, in microseconds
+REWIND_US = 5 * 1_000_000
+
+# Jetstream accepts at most this many wantedDids per connection
+MAX_WANTED_DIDS = 10000
+
+def load_cursor(cursor_path: str = CURSOR_FILE) -> Optional[int]:
+    if not os.path.exists(cursor_path):
+        return None
+    with open(cursor_path, encoding='utf-8') as f:
+        return json.load(f).get('cursor')
+
+def save_cursor(cursor: int, cursor_path: str = CURSOR_FILE):
+    _write_json_atomic(cursor_path, {'cursor': cursor, 'saved_at': time.time()})
+
+def event_to_post(event: Dict, handles: Dict[str, str]) -> Optional[Dict]:
+    """Post dict for a post-creation commit event (None for anything else)."""
+    commit = event.get('commit')
+    if event.get('kind') != 'commit' or not commit:
+        return None
+    if commit.get('operation') != 'create' or commit.get('collection') != POST_COLLECTION:
+        return None
+
+    did = event['did']
+    record = commit.get('record') or {}
+    return {
+        'uri': f"at://{did}/{POST_COLLECTION}/{commit['rkey']}",
+        'cid': commit.get('cid', ''),
+        'text': record.get('text', ''),
+        'created_at': record.get('createdAt', ''),
+        'author': handles.get(did, did),
+        'likes': 0,
+        'reposts': 0,
+        'replies': 0,
+        'reason': 'reply' if record.get('reply') else 'original',
+    }
+
+def resolve_watched(actors: List[str]) -> Dict[str, str]:
+    """Map each watched actor's DID to its handle (a DID that can't be looked up maps to itself)."""
+    watched = {}
+    for actor, profile in resolve_actors(actors).items():
+        if profile:
+            watched[profile['did']] = profile['handle']
+        elif actor.startswith('did:'):
+            watched[actor] = actor
+        else:
+            print(f"Skipping {actor}: could not resolve handle")
+    return watched
+
+class LiveIngester:
+    """Reads a Jetstream subscription into a bounded queue and scores/stores posts in batches."""
+
+    def __init__(self, watched: Dict[str, str], store: PostStore, keywords: List[str] = KEYWORDS,
+                 url: str = JETSTREAM_URL, cursor_path: str = CURSOR_FILE,
+                 matches_path: str = MATCHES_FILE, queue_size: int = QUEUE_SIZE,
+                 record_path: Optional[str] = None, store_all: bool = False):
+        if len(watched) > MAX_WANTED_DIDS:
+            raise ValueError(f"Jetstream filters at most {MAX_WANTED_DIDS} DIDs per connection")
+        self.watched = watched
+        self.store = store
+        self.keywords = keywords
+        self.url = url
+        self.cursor_path = cursor_path
+        self.matches_path = matches_path
+        self.queue_size = queue_size
+        self.record_path = record_path
+        self.store_all = store_all
+
+        self.cursor = load_cursor(cursor_path)
+        # uri -> time_us for events in the rewind window, so replays aren't handled twice
+        self._recent: Dict[str, int] = {}
+        # time_us the current subscription replays from
+        self._resumed_at = 0
+        self._stop = asyncio.Event()
+        self.stats = {'events': 0, 'posts': 0, 'matches': 0, 'duplicates': 0, 'bad_frames': 0,
+                      'reconnects': 0, 'max_queue': 0, 'last_lag_seconds': None}
+
+    def stop(self):
+        self._stop.set()
+
+    def _subscribe_params(self) -> List:
+        params = [('wantedCollections', POST_COLLECTION)]
+        params += [('wantedDids', did) for did in self.watched]
+        if self.cursor is not None:
+            self._resumed_at = max(self.cursor - REWIND_US, 0)
+            params.append(('cursor', str(self._resumed_at)))
+        return params
+
+    async def run(self):
+        """Ingest until stop() is called, reconnecting with backoff when the stream drops."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        consumer = asyncio.create_task(self._consume(queue))
+        record = open_jsonl_for_append(self.record_path) if self.record_path else None
+        attempt = 0
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                while not self._stop.is_set():
+                    receiver = asyncio.create_task(self._receive(session, queue, record))
+                    # Once the consumer dies nothing drains the queue, so stop reading rather than hang
+                    await asyncio.wait({receiver, consumer}, return_when=asyncio.FIRST_COMPLETED)
+                    if consumer.done():
+                        receiver.cancel()
+                        await asyncio.gather(receiver, return_exceptions=True)
+                        # Re-raises the consumer's error
+                        consumer.result()
+                        break
+                    try:
+                        receiver.result()
+                        attempt = 0
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        print(f"  stream error: {e.__class__.__name__}: {e}")
+                    if self._stop.is_set():
+                        break
+
+                    delay = backoff_delay(attempt)
+                    attempt += 1
+                    self.stats['reconnects'] += 1
+                    print(f"  reconnecting in {delay:.1f}s from cursor {self.cursor}")
+                    stop_wait = asyncio.create_task(self._stop.wait())
+                    await asyncio.wait({stop_wait, consumer}, timeout=delay,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    stop_wait.cancel()
+        finally:
+            try:
+                if not consumer.done():
+                    # Let the consumer finish what's already queued, then persist the cursor
+                    # (unless it fails first, with the queue full)
+                    sentinel = asyncio.create_task(queue.put(None))
+                    await asyncio.wait({sentinel, consumer}, return_when=asyncio.FIRST_COMPLETED)
+                    sentinel.cancel()
+                    await consumer
+            finally:
+                if record:
+                    record.close()
+
+    async def _receive(self, session: aiohttp.ClientSession, queue: asyncio.Queue, record):
+        async with session.ws_connect(self.url, params=self._subscribe_params(), heartbeat=30) as ws:
+            print(f"Subscribed to {len(self.watched)} accounts at {self.url}")
+            stop_wait = asyncio.create_task(self._stop.wait())
+            try:
+                while True:
+                    receive = asyncio.create_task(ws.receive())
+                    done, _ = await asyncio.wait({receive, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+                    if receive not in done:
+                        receive.cancel()
+                        return
+                    message = receive.result()
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        return
+
+                    try:
+                        event = json.loads(message.data)
+                        if not isinstance(event, dict):
+                            raise ValueError(f"expected an object, got {type(event).__name__}")
+                    except ValueError as e:
+                        # A malformed or truncated frame: skip it rather than stop ingesting
+                        self.stats['bad_frames'] += 1
+                        print(f"  skipping undecodable frame ({e}): {message.data[:80]!r}")
+                        continue
+
+                    if record:
+                        record.write(message.data + '\n')
+                    # Blocks while the queue is full: the socket stops being read (backpressure)
+                    await queue.put(event)
+                    self.stats['max_queue'] = max(self.stats['max_queue'], queue.qsize())
+            finally:
+                stop_wait.cancel()
+
+    async def _consume(self, queue: asyncio.Queue):
+        matches_file = open_jsonl_for_append(self.matches_path)
+        try:
+            while True:
+                batch = [await queue.get()]
+                while len(batch) < BATCH_SIZE and not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                done = batch[-1] is None
+                events = [event for event in batch if event is not None]
+                if events:
+                    # Scoring, the upsert and the fsynced append stay off the event loop
+                    await asyncio.to_thread(self._process, events, matches_file)
+                if done:
+                    return
+        finally:
+            matches_file.close()
+
+    def _update_handle(self, event: Dict):
+        """An identity event: a watched account may have a new handle."""
+        handle = (event.get('identity') or {}).get('handle')
+        if handle and handle != self.watched[event['did']]:
+            print(f"  @{self.watched[event['did']]} is now @{handle}")
+            self.watched[event['did']] = handle
+            get_resolver().observe(event['did'], handle)
+
+    def _process(self, events: List[Dict], matches_file):
+        """Score a batch, write it, then advance the cursor past it."""
+        posts, matches = [], []
+        newest = self.cursor
+
+        for event in events:
+            self.stats['events'] += 1
+            time_us = event.get('time_us')
+            if time_us is not None:
+                newest = max(newest or 0, time_us)
+
+            if event.get('did') not in self.watched:
+                continue
+            if event.get('kind') == 'identity':
+                self._update_handle(event)
+                continue
+            post = event_to_post(event, self.watched)
+            if post is None:
+                continue
+            if post['uri'] in self._recent:
+                self.stats['duplicates'] += 1
+                continue
+            self._recent[post['uri']] = time_us or 0
+
+            self.stats['posts'] += 1
+            score, matched = calculate_relevance_score(post, self.keywords)
+            if self.store_all or score > 0:
+                posts.append(post)
+            if score > 0:
+                matches.append({**post, 'matched_keywords': matched, 'relevance_score': score})
+                if time_us:
+                    self.stats['last_lag_seconds'] = round(time.time() - time_us / 1_000_000, 3)
+
+        if posts:
+            self.store.insert_posts(posts)
+        if matches:
+            append_posts(matches_file, matches)
+            self.stats['matches'] += len(matches)
+            for match in matches:
+                print(f"  [{match['relevance_score']}] @{match['author']}: {match['text'][:100]!r}")
+
+        if newest is not None and newest != self.cursor:
+            self.cursor = newest
+            save_cursor(newest, self.cursor_path)
+            # Keep everything the current subscription may still replay
+            horizon = min(newest - REWIND_US, self._resumed_at)
+            if len(self._recent) > QUEUE_SIZE:
+                self._recent = {uri: t for uri, t in self._recent.items() if t >= horizon}
+
+def main():
+    parser = argparse.ArgumentParser(description="Score watched accounts' new posts from a Jetstream feed")
+    parser.add_argument('actors', nargs='+', help="handles or DIDs to watch")
+    parser.add_argument('--url', default=JETSTREAM_URL, help="Jetstream subscribe endpoint")
+    parser.add_argument('--db', default=DB_FILE, help=f"post store for matches (default {DB_FILE})")
+    parser.add_argument('--matches', default=MATCHES_FILE, help="JSONL file matches are appended to")
+    parser.add_argument('--cursor-file', default=CURSOR_FILE)
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    parser.add_argument('--store-all', action='store_true', help="store every watched post, not just matches")
+    parser.add_argument('--record', help="also append raw events to this JSONL file (for replay)")
+    args = parser.parse_args()
+
+    watched = resolve_watched(args.actors)
+    if not watched:
+        print("No accounts to watch. Exiting.")
+        return
+
+    with PostStore(args.db) as store:
+        ingester = LiveIngester(watched, store, KEYWORDS, args.url, args.cursor_file, args.matches,
+                                args.queue_size, args.record, args.store_all)
+        try:
+            asyncio.run(ingester.run())
+        except KeyboardInterrupt:
+            pass
+    print(f"\n{ingester.stats}")
+
+if __name__ == '__main__':
+    main()
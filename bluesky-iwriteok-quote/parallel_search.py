@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Process-pool parallel version of `search_posts`.
+
+`search_posts` scores one post at a time on a single core. For large
+multi-account corpora, search_posts_parallel splits the corpus into
+chunks and scores them in a ProcessPoolExecutor:
+    - the keyword list is sent to each worker once (pool initializer), and
+      each worker compiles its matcher once
+    - only post texts go to the workers and only (index, score, keywords)
+      for hits come back, so per-chunk pickling stays small
+    - results are merged in corpus order and sorted with the same key as
+      `search_posts`, so the output (including tie order) is identical
+
+Usage:
+    python3 parallel_search.py all_posts.json --workers 8
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from working_fetch_script import KEYWORDS, calculate_relevance_score, search_posts
+
+# Posts per task: big enough that pickling overhead is small next to scoring
+DEFAULT_CHUNK_SIZE = 5000
+
+# Below this many posts, process start-up costs more than it saves
+MIN_PARALLEL_POSTS = 20000
+
+_worker_keywords: List[str] = []
+
+def _init_worker(keywords: List[str]):
+    global _worker_keywords
+    _worker_keywords = keywords
+
+def _score_chunk(task: Tuple[int, List[str]]) -> List[Tuple[int, int, List[str]]]:
+    """Score one chunk of texts; return (corpus index, score, matched keywords) for hits."""
+    start, texts = task
+    hits = []
+    for offset, text in enumerate(texts):
+        score, matched = calculate_relevance_score({'text': text}, _worker_keywords)
+        if score > 0:
+            hits.append((start + offset, score, matched))
+    return hits
+
+def search_posts_parallel(posts: Sequence[Dict], keywords: List[str], workers: Optional[int] = None,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE,
+                          min_parallel_posts: int = MIN_PARALLEL_POSTS) -> List[Dict]:
+    """Same result as search_posts(posts, keywords), scored across worker processes."""
+    if len(posts) < min_parallel_posts:
+        return search_posts(posts, keywords)
+
+    tasks = ((start, [post['text'] for post in posts[start:start + chunk_size]])
+             for start in range(0, len(posts), chunk_size))
+
+    matches = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(list(keywords),)) as executor:
+        # map() yields chunks in submission order, so matches stay in corpus order
+        for hits in executor.map(_score_chunk, tasks):
+            for index, score, matched in hits:
+                matches.append({
+                    **posts[index],
+                    'matched_keywords': matched,
+                    'relevance_score': score
+                })
+
+    # Same key as search_posts; sorted() is stable, so ties keep corpus order
+    return sorted(matches, key=lambda x: (x['relevance_score'], x['likes']), reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a post corpus across worker processes")
+    parser.add_argument('posts', nargs='?', default='all_posts.json', help="posts JSON file")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--output', default='keyword_matches.json')
+    args = parser.parse_args()
+
+    with open(args.posts, encoding='utf-8') as f:
+        posts = json.load(f)
+
+    matches = search_posts_parallel(posts, KEYWORDS, args.workers, args.chunk_size, min_parallel_posts=0)
+    print(f"Found {len(matches)} posts with relevant keywords in {len(posts)} posts")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(matches, f, indent=2, ensure_ascii=False)
+    print(f"Saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Pipelined crawl: fetching, normalizing, scoring and storing overlap.
+
+`fetch_all_posts` runs one step at a time: request a page, wait, convert
+it, request the next; scoring starts only once the whole crawl is in
+memory. CrawlPipeline runs each step on its own thread, connected by
+bounded queues:
+
+    fetch -> normalize -> score -> write
+
+    - fetch only waits on the network: as soon as a page (and so its
+      cursor) arrives the next request goes out, then the page is handed on
+    - normalize turns feed items into post dicts and drops unwanted
+      reasons and CIDs already seen
+    - score runs `calculate_relevance_score` on every post
+    - write records the CIDs as seen and appends posts and matches to
+      JSONL files (and optionally upserts into a PostStore), flushing
+      after every page. Only the writer adds to the seen set, so a CID is
+      never saved before its post is
+
+Each queue holds a few pages; a slow stage blocks the one before it, so
+a slow disk throttles the crawl instead of pages piling up in memory. The
+network waits release the GIL, so end-to-end time is close to network
+time alone. If a stage fails, the others stop and run() re-raises its
+error.
+
+Usage:
+    python3 pipeline.py iwriteok.bsky.social --output all_posts.jsonl --matches keyword_matches.jsonl
+"""
+
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Callable, Collection, Dict, Iterator, List, Optional
+
+from cid_set import SEEN_FILE, CidSet
+from feed_decoder import feed_item_to_post
+from jsonl_store import append_posts, open_jsonl_for_append
+from post_store import PostStore
+from working_fetch_script import (FEED_FILTERS, FEED_REASONS, HANDLE, KEYWORDS, MAX_POSTS,
+                                  calculate_relevance_score, filter_posts, get_author_feed, resolve_dids)
+
+# Pages buffered between two stages
+QUEUE_SIZE = 4
+
+STAGES = ('fetch', 'normalize', 'score', 'write')
+
+# Seconds between checks for a failed stage while blocked on a full queue
+POLL_INTERVAL = 0.1
+
+# Seconds a page waits for the next request to go out before being handed on
+SEND_GRACE = 0.005
+
+_DONE = object()
+
+class _Aborted(Exception):
+    """Another stage failed; stop quietly."""
+
+class CrawlPipeline:
+    """Threaded fetch -> normalize -> score -> write pipeline over one or more accounts."""
+
+    def __init__(self, actors: List[str], output: str = 'all_posts.jsonl',
+                 matches_path: str = 'keyword_matches.jsonl', keywords: List[str] = KEYWORDS,
+                 max_posts: int = MAX_POSTS, seen: Optional[CidSet] = None,
+                 reasons: Optional[Collection[str]] = None, feed_filter: Optional[str] = None,
+                 db_path: Optional[str] = None, queue_size: int = QUEUE_SIZE):
+        self.actors = actors
+        self.output = output
+        self.matches_path = matches_path
+        self.keywords = keywords
+        self.max_posts = max_posts
+        self.seen = seen if seen is not None else CidSet()
+        self.reasons = reasons
+        self.feed_filter = feed_filter
+        self.db_path = db_path
+        self.queue_size = queue_size
+
+        self.matches: List[Dict] = []
+        # Posts kept per DID, so fetch knows when an account has enough
+        self._kept: Dict[str, int] = {}
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+        self.stats = {'pages': 0, 'posts': 0, 'matches': 0, 'seconds': 0.0,
+                      'busy_seconds': dict.fromkeys(STAGES, 0.0)}
+
+    def run(self) -> List[Dict]:
+        """Crawl every actor through the pipeline. Returns the matches, ranked like search_posts."""
+        start = time.perf_counter()
+        dids = list(dict.fromkeys(resolve_dids(self.actors).values()))
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES[1:]]
+        inboxes = [None] + queues
+        outboxes = queues + [None]
+        stages = [lambda inbox, outbox: self._fetch(dids, outbox), self._normalize, self._score, self._write]
+
+        threads = [
+            threading.Thread(target=self._run_stage, args=(stage, inbox, outbox), name=f"pipeline-{name}")
+            for name, stage, inbox, outbox in zip(STAGES, stages, inboxes, outboxes)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stats['seconds'] = round(time.perf_counter() - start, 4)
+        if self._error is not None:
+            raise self._error
+        return sorted(self.matches, key=lambda x: (x['relevance_score'], x['likes']), reverse=True)
+
+    def _run_stage(self, stage: Callable, inbox: Optional[queue.Queue], outbox: Optional[queue.Queue]):
+        """Run one stage, then tell the next one it's done (also after a failure)."""
+        try:
+            stage(inbox, outbox)
+        except _Aborted:
+            pass
+        except BaseException as e:
+            self._error = self._error or e
+            self._failed.set()
+        finally:
+            if inbox is not None:
+                # Unblock the stage before us if it's waiting on a full queue
+                while not inbox.empty():
+                    inbox.get_nowait()
+            if outbox is not None:
+                try:
+                    self._put(outbox, _DONE)
+                except _Aborted:
+                    pass
+
+    def _put(self, outbox: queue.Queue, item):
+        """Blocking put that gives up if another stage has failed."""
+        while True:
+            try:
+                outbox.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                if self._failed.is_set():
+                    raise _Aborted()
+
+    def _items(self, inbox: queue.Queue, stage: str) -> Iterator:
+        """Items from inbox until the previous stage is done; time until the next get counts as busy."""
+        while True:
+            item = inbox.get()
+            if item is _DONE or self._failed.is_set():
+                return
+            started = time.perf_counter()
+            yield item
+            self.stats['busy_seconds'][stage] += time.perf_counter() - started
+
+    def _fetch(self, dids: List[str], outbox: queue.Queue):
+        # One request always in flight: the next page is requested before
+        # this one is handed on, so downstream CPU work overlaps the wait
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-request') as requests:
+            for did in dids:
+                self._kept[did] = 0
+                pending = requests.submit(get_author_feed, did, 100, None, self.feed_filter)
+                while pending is not None:
+                    started = time.perf_counter()
+                    response = pending.result()
+                    self.stats['busy_seconds']['fetch'] += time.perf_counter() - started
+                    if not response.get('feed'):
+                        break
+
+                    cursor = response.get('cursor')
+                    pending = None
+                    if cursor and self._kept[did] < self.max_posts and not self._failed.is_set():
+                        pending = requests.submit(get_author_feed, did, 100, cursor, self.feed_filter)
+                        # Let the request get on the wire before the next stages wake up
+                        wait([pending], timeout=SEND_GRACE)
+                    self.stats['pages'] += 1
+                    self._put(outbox, (did, response['feed']))
+
+    def _normalize(self, inbox: queue.Queue, outbox: queue.Queue):
+        for did, items in self._items(inbox, 'normalize'):
+            posts = [post for post in map(feed_item_to_post, items) if post]
+            # Read-only check; the writer does the authoritative add
+            posts = [post for post in filter_posts(posts, self.reasons) if post['cid'] not in self.seen]
+            self._put(outbox, (did, posts))
+
+    def _score(self, inbox: queue.Queue, outbox: queue.Queue):
+        for did, posts in self._items(inbox, 'score'):
+            matches = []
+            for post in posts:
+                score, matched = calculate_relevance_score(post, self.keywords)
+                if score > 0:
+                    matches.append({**post, 'matched_keywords': matched, 'relevance_score': score})
+            self._put(outbox, (did, posts, matches))
+
+    def _write(self, inbox: queue.Queue, outbox: None):
+        # Files and the SQLite connection are opened on the writer thread
+        with open_jsonl_for_append(self.output) as posts_file, \
+                open_jsonl_for_append(self.matches_path) as matches_file, \
+                (PostStore(self.db_path) if self.db_path else nullcontext()) as store:
+            for did, posts, matches in self._items(inbox, 'write'):
+                # Pages can still be in flight when an account reaches max_posts
+                remaining = self.max_posts - self._kept[did]
+                kept = []
+                for post in posts:
+                    if len(kept) >= remaining:
+                        break
+                    if self.seen.add(post['cid']):
+                        kept.append(post)
+                posts = kept
+                self._kept[did] += len(posts)
+                kept_cids = {post['cid'] for post in posts}
+                matches = [match for match in matches if match['cid'] in kept_cids]
+
+                append_posts(posts_file, posts)
+                append_posts(matches_file, matches)
+                if store is not None:
+                    store.insert_posts(posts)
+                # After the posts, so a crash can repeat a page but never lose one
+                self.seen.flush()
+
+                self.matches.extend(matches)
+                self.stats['posts'] += len(posts)
+                self.stats['matches'] += len(matches)
+                print(f"  {self.stats['posts']} posts, {self.stats['matches']} matches...", end='\r')
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl, score and store author feeds in a pipeline")
+    parser.add_argument('actors', nargs='*', default=[HANDLE], help=f"handles or DIDs (default {HANDLE})")
+    parser.add_argument('--output', default='all_posts.jsonl', help="JSONL file posts are appended to")
+    parser.add_argument('--matches', default='keyword_matches.jsonl', help="JSONL file matches are appended to")
+    parser.add_argument('--db', default=None, help="also upsert posts into this PostStore")
+    parser.add_argument('--max-posts', type=int, default=MAX_POSTS, help="max posts per actor")
+    parser.add_argument('--seen', default=SEEN_FILE, help=f"persistent CID set (default {SEEN_FILE})")
+    parser.add_argument('--no-dedup', action='store_true', help="don't skip posts seen in earlier runs")
+    parser.add_argument('--filter', choices=FEED_FILTERS, default=None, help="server-side feed filter")
+    parser.add_argument('--skip-reposts', action='store_true', help="drop reposts of other accounts' posts")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help="pages buffered between stages")
+    args = parser.parse_args()
+
+    reasons = [reason for reason in FEED_REASONS if reason != 'repost'] if args.skip_reposts else None
+    with CidSet(None if args.no_dedup else args.seen) as seen:
+        pipeline = CrawlPipeline(args.actors, args.output, args.matches, KEYWORDS, args.max_posts, seen,
+                                 reasons, args.filter, args.db, args.queue_size)
+        matches = pipeline.run()
+
+    stats = pipeline.stats
+    print(f"\n\n{stats['posts']} posts from {stats['pages']} pages, {stats['matches']} matches "
+          f"in {stats['seconds']:.2f}s")
+    print("Busy time per stage: " + ', '.join(f"{stage} {seconds:.2f}s"
+                                             for stage, seconds in stats['busy_seconds'].items()))
+    for post in matches[:10]:
+        print(f"  [{post['relevance_score']}] {post['text'][:100]!r}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Persistent SQLite post store with an FTS5 full-text index.
+
+Instead of re-reading `all_posts.json` and scanning every post for every
+search, posts live in `posts.db`:
+    - `posts` table, unique on uri, with indexes on author, created_at
+      and the engagement counts
+    - `posts_fts`, an external-content FTS5 index over the text, kept in
+      sync by triggers. It uses the trigram tokenizer, so a MATCH finds the
+      same substrings `keyword in text` does ('addict' inside 'addiction').
+
+Keyword/phrase/date/likes filters run as index lookups, and
+`search_scored()` only runs `calculate_relevance_score` on the FTS
+candidates. The database runs in WAL mode so a crawler can write while
+analysts query. Inserts are batched and upsert on uri, so re-importing
+refreshes engagement counts.
+
+Usage:
+    python3 post_store.py import all_posts.json          # or a .jsonl file
+    python3 post_store.py search addiction "social media" --since 2025-01-01 --min-likes 100
+    python3 post_store.py rank                           # search_posts over the store
+"""
+
+import argparse
+import json
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from jsonl_store import iter_jsonl
+from working_fetch_script import FEED_REASONS, KEYWORDS, calculate_relevance_score
+
+DB_FILE = 'posts.db'
+
+POST_COLUMNS = ['uri', 'cid', 'text', 'created_at', 'author', 'likes', 'reposts', 'replies']
+
+# FTS5's trigram tokenizer can't look up anything shorter than this
+MIN_FTS_TERM = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    uri TEXT NOT NULL UNIQUE,
+    cid TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    author TEXT NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    reposts INTEGER NOT NULL DEFAULT 0,
+    replies INTEGER NOT NULL DEFAULT 0,
+    reason TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_posts_author ON posts(author, created_at);
+CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at);
+CREATE INDEX IF NOT EXISTS idx_posts_likes ON posts(likes);
+CREATE INDEX IF NOT EXISTS idx_posts_reposts ON posts(reposts);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+    text, content='posts', content_rowid='id', tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS posts_ai AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts(rowid, text) VALUES (new.id, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_ad AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS posts_au AFTER UPDATE OF text ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO posts_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+# Columns that older post files may not have (NULL when missing)
+OPTIONAL_COLUMNS = ['reason']
+
+UPSERT_SQL = f"""
+INSERT INTO posts ({', '.join(POST_COLUMNS + OPTIONAL_COLUMNS)})
+VALUES ({', '.join('?' for _ in POST_COLUMNS + OPTIONAL_COLUMNS)})
+ON CONFLICT(uri) DO UPDATE SET
+    cid = excluded.cid,
+    text = excluded.text,
+    likes = excluded.likes,
+    reposts = excluded.reposts,
+    replies = excluded.replies,
+    reason = COALESCE(excluded.reason, posts.reason)
+"""
+
+def _fts_quote(term: str) -> str:
+    """Quote a term as an FTS5 string (a phrase/substring, not query syntax)."""
+    return '"' + term.replace('"', '""') + '"'
+
+def _like_pattern(term: str) -> str:
+    """A LIKE pattern (used with ESCAPE '\\') matching term anywhere, with % and _ taken literally."""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def _row_to_post(row: sqlite3.Row) -> Dict:
+    """Post dict for a row, leaving out optional columns that are NULL."""
+    post = dict(row)
+    for column in OPTIONAL_COLUMNS:
+        if post[column] is None:
+            del post[column]
+    return post
+
+def load_posts_file(path: str) -> Iterator[Dict]:
+    """Yield posts from an all_posts.json-style file or a JSONL file."""
+    if path.endswith('.jsonl'):
+        yield from iter_jsonl(path)
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield from json.load(f)
+
+class PostStore:
+    """SQLite-backed store for fetched posts."""
+
+    def __init__(self, path: str = DB_FILE):
+        # A store may be handed to a worker thread (live_ingest), but is used by one thread at a time
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets one writer and many readers work at the same time
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns introduced after a database was created."""
+        existing = {row['name'] for row in self.conn.execute('PRAGMA table_info(posts)')}
+        with self.conn:
+            for column in OPTIONAL_COLUMNS:
+                if column not in existing:
+                    self.conn.execute(f'ALTER TABLE posts ADD COLUMN {column} TEXT')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def insert_posts(self, posts: Iterable[Dict], batch_size: int = 1000) -> int:
+        """Upsert posts in batches of batch_size per transaction. Returns the number written."""
+        written = 0
+        batch = []
+        for post in posts:
+            batch.append(tuple(post[column] for column in POST_COLUMNS)
+                         + tuple(post.get(column) for column in OPTIONAL_COLUMNS))
+            if len(batch) >= batch_size:
+                written += self._write_batch(batch)
+                batch = []
+        if batch:
+            written += self._write_batch(batch)
+        return written
+
+    def _write_batch(self, batch: List[tuple]) -> int:
+        with self.conn:
+            self.conn.executemany(UPSERT_SQL, batch)
+        return len(batch)
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+
+    def search(self, keywords: Optional[List[str]] = None, phrase: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None,
+               min_likes: int = 0, author: Optional[str] = None,
+               reasons: Optional[List[str]] = None,
+               order_by: str = 'id', limit: Optional[int] = None) -> List[Dict]:
+        """
+        Find posts by keyword (any of), phrase, date range, minimum likes, author and feed reason.
+
+        Keywords and phrases are matched as case-insensitive substrings, like
+        `keyword in text`. since/until compare against created_at (ISO strings,
+        so '2025-01-01' works). Keywords too short for the trigram index are
+        checked with LIKE instead. reasons keeps posts whose reason is one of
+        them; posts stored without a reason are kept too.
+        """
+        clauses = []
+        params: List = []
+
+        fts_terms = []
+        like_terms = []
+        for keyword in keywords or []:
+            (fts_terms if len(keyword) >= MIN_FTS_TERM else like_terms).append(keyword)
+
+        match_parts = []
+        if fts_terms and not like_terms:
+            match_parts.append('(' + ' OR '.join(_fts_quote(term) for term in fts_terms) + ')')
+        elif like_terms:
+            # Mixed lengths: one OR over LIKE keeps "any keyword" semantics
+            clauses.append('(' + ' OR '.join("p.text LIKE ? ESCAPE '\\'" for _ in keywords) + ')')
+            params.extend(_like_pattern(keyword) for keyword in keywords)
+
+        if phrase:
+            if len(phrase) >= MIN_FTS_TERM:
+                match_parts.append(_fts_quote(phrase))
+            else:
+                clauses.append("p.text LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(phrase))
+
+        if match_parts:
+            clauses.append('p.id IN (SELECT rowid FROM posts_fts WHERE posts_fts MATCH ?)')
+            params.append(' AND '.join(match_parts))
+        if since:
+            clauses.append('p.created_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('p.created_at < ?')
+            params.append(until)
+        if min_likes:
+            clauses.append('p.likes >= ?')
+            params.append(min_likes)
+        if author:
+            clauses.append('p.author = ?')
+            params.append(author)
+        if reasons:
+            clauses.append(f"(p.reason IS NULL OR p.reason IN ({', '.join('?' for _ in reasons)}))")
+            params.extend(reasons)
+
+        order = {'id': 'p.id', 'created_at': 'p.created_at DESC', 'likes': 'p.likes DESC'}[order_by]
+        sql = f"SELECT {', '.join('p.' + column for column in POST_COLUMNS + OPTIONAL_COLUMNS)} FROM posts p"
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += f' ORDER BY {order}'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        return [_row_to_post(row) for row in self.conn.execute(sql, params)]
+
+    def search_scored(self, keywords: List[str], **filters) -> List[Dict]:
+        """search_posts over the store: score only the FTS candidates, same ranking."""
+        matches = []
+        for post in self.search(keywords=keywords, **filters):
+            score, matched = calculate_relevance_score(post, keywords)
+            if score > 0:
+                matches.append({**post, 'matched_keywords': matched, 'relevance_score': score})
+
+        return sorted(matches, key=lambda x: (x['relevance_score'], x['likes']), reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite/FTS5 store for fetched Bluesky posts")
+    parser.add_argument('--db', default=DB_FILE, help=f"database file (default {DB_FILE})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_cmd = commands.add_parser('import', help="load posts from .json or .jsonl files")
+    import_cmd.add_argument('files', nargs='+')
+
+    search_cmd = commands.add_parser('search', help="filter posts by keyword/phrase/date/likes")
+    search_cmd.add_argument('keywords', nargs='*')
+    search_cmd.add_argument('--phrase')
+    search_cmd.add_argument('--since')
+    search_cmd.add_argument('--until')
+    search_cmd.add_argument('--min-likes', type=int, default=0)
+    search_cmd.add_argument('--author')
+    search_cmd.add_argument('--reason', action='append', choices=FEED_REASONS, dest='reasons',
+                            help="only posts with this feed reason (repeatable)")
+    search_cmd.add_argument('--limit', type=int, default=20)
+
+    commands.add_parser('rank', help="rank the store with the default KEYWORDS")
+
+    args = parser.parse_args()
+
+    with PostStore(args.db) as store:
+        if args.command == 'import':
+            for path in args.files:
+                written = store.insert_posts(load_posts_file(path))
+                print(f"Imported {written} posts from {path}")
+            print(f"{store.count()} posts in {args.db}")
+
+        elif args.command == 'search':
+            posts = store.search(keywords=args.keywords, phrase=args.phrase, since=args.since,
+                                 until=args.until, min_likes=args.min_likes, author=args.author,
+                                 reasons=args.reasons,
+                                 order_by='created_at', limit=args.limit)
+            for post in posts:
+                print(f"[{post['created_at']}] @{post['author']} ({post['likes']} likes)")
+                print(f"  {post['text']}\n")
+            print(f"{len(posts)} posts")
+
+        elif args.command == 'rank':
+            matches = store.search_scored(KEYWORDS)
+            print(f"Found {len(matches)} posts with relevant keywords")
+            for post in matches[:20]:
+                print(f"  [{post['relevance_score']}] {post['text'][:100]!r}")
+
+if __name__ == '__main__':
+    main()
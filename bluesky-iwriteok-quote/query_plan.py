@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Evaluate many keyword queries in one pass over the corpus.
+
+Trying another keyword set used to mean another `search_posts` run over
+every post, and the three fetch scripts each carry their own keyword list
+and scoring. A QueryPlan takes any number of named queries (keywords,
+concept groups, bonus rules) and compiles all their keywords into one
+Aho-Corasick matcher:
+    - keywords shared between queries (or repeated with different case)
+      are one pattern in the automaton
+    - each post's text is scanned once, and every pattern found is routed
+      to the queries that use it
+    - a query only costs anything on posts that hit one of its keywords,
+      so adding a query costs close to nothing next to another full pass
+
+Each query scores like `calculate_relevance_score` (one point per matched
+keyword plus its bonus rules) and is ranked like `search_posts`, so the
+query {KEYWORDS, CONCEPT_GROUPS, BONUS_RULES} gives exactly
+`search_posts(posts, KEYWORDS)`. Queries are read from a JSON file:
+
+    {
+      "baseline": {
+        "keywords": ["addiction", "drugs", "social media"],
+        "groups": {"addiction": ["addiction"], "drugs": ["drugs"]},
+        "bonus_rules": [{"concepts": ["addiction", "drugs"], "bonus": 5}]
+      },
+      "short": {"keywords": ["dopamine", "habit"]}
+    }
+
+`queries.json` holds the keyword sets of the three fetch scripts.
+
+Usage:
+    python3 query_plan.py all_posts.json --queries queries.json --output-dir query_matches
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from keyword_matcher import KeywordMatcher
+from post_store import load_posts_file
+from working_fetch_script import BONUS_RULES, CONCEPT_GROUPS, KEYWORDS
+
+QUERIES_FILE = 'queries.json'
+
+class Query:
+    """A named keyword set with its concept groups and bonus rules."""
+
+    def __init__(self, name: str, keywords: List[str], groups: Optional[Dict[str, List[str]]] = None,
+                 bonus_rules: Sequence[Tuple[Sequence[str], int]] = ()):
+        self.name = name
+        self.keywords = list(keywords)
+        self.bonus_rules = [(frozenset(required), bonus) for required, bonus in bonus_rules]
+
+        # Group membership is by exact keyword string, like KeywordMatcher's
+        self.keyword_groups: List[List[str]] = [
+            [group for group, members in (groups or {}).items() if keyword in members]
+            for keyword in self.keywords
+        ]
+
+    def score(self, indices: List[int]) -> Tuple[int, List[str]]:
+        """(score, matched keywords) for the matched keyword indices, in keyword-list order."""
+        concepts = {group for index in indices for group in self.keyword_groups[index]}
+        score = len(indices)
+        for required, bonus in self.bonus_rules:
+            if concepts.issuperset(required):
+                score += bonus
+        return score, [self.keywords[index] for index in indices]
+
+class QueryPlan:
+    """Many queries compiled into one matcher, evaluated with a single scan per text."""
+
+    def __init__(self, queries: List[Query], word_boundaries: bool = False):
+        self.queries = queries
+        all_keywords = [keyword for query in queries for keyword in query.keywords]
+        self.matcher = KeywordMatcher(all_keywords, word_boundaries=word_boundaries)
+
+        # Flat keyword position -> (query, keyword index within the query)
+        owners = [(q, index) for q, query in enumerate(queries) for index in range(len(query.keywords))]
+        # Pattern -> every (query, keyword index) it stands for
+        self.pattern_hits: List[List[Tuple[int, int]]] = [
+            [owners[position] for position in positions] for positions in self.matcher.pattern_keywords
+        ]
+
+    def evaluate(self, text: str) -> Dict[int, Tuple[int, List[str]]]:
+        """{query index: (score, matched keywords)} for the queries text matches."""
+        hits: Dict[int, List[int]] = {}
+        for pattern_id in self.matcher.find_patterns(text):
+            for q, index in self.pattern_hits[pattern_id]:
+                hits.setdefault(q, []).append(index)
+        return {q: self.queries[q].score(sorted(indices)) for q, indices in hits.items()}
+
+    def search(self, posts: Iterable[Dict]) -> Dict[str, List[Dict]]:
+        """Ranked matches per query name, each list shaped and ordered like search_posts'."""
+        matches: List[List[Dict]] = [[] for _ in self.queries]
+        for post in posts:
+            for q, (score, matched) in self.evaluate(post['text']).items():
+                if score > 0:
+                    matches[q].append({**post, 'matched_keywords': matched, 'relevance_score': score})
+
+        return {
+            query.name: sorted(query_matches, key=lambda x: (x['relevance_score'], x['likes']), reverse=True)
+            for query, query_matches in zip(self.queries, matches)
+        }
+
+def default_queries() -> List[Query]:
+    """The one query working_fetch_script runs."""
+    return [Query('working_fetch_script', KEYWORDS, CONCEPT_GROUPS, BONUS_RULES)]
+
+def load_queries(path: str) -> List[Query]:
+    """Read named queries from a JSON file (see the module docstring for the format)."""
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    return [
+        Query(name, query['keywords'], query.get('groups'),
+              [(rule['concepts'], rule['bonus']) for rule in query.get('bonus_rules', [])])
+        for name, query in spec.items()
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many keyword queries over posts in one pass")
+    parser.add_argument('posts', nargs='?', default='all_posts.json', help="a .json or .jsonl posts file")
+    parser.add_argument('--queries', default=QUERIES_FILE,
+                        help=f"JSON file of named queries (default {QUERIES_FILE}; "
+                             "working_fetch_script's query if it doesn't exist)")
+    parser.add_argument('--output-dir', default='query_matches', help="where to write <query>.json")
+    parser.add_argument('--word-boundaries', action='store_true', help="only match whole words")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if os.path.exists(args.queries) else default_queries()
+    posts = list(load_posts_file(args.posts))
+
+    start = time.perf_counter()
+    plan = QueryPlan(queries, args.word_boundaries)
+    results = plan.search(posts)
+    elapsed = time.perf_counter() - start
+    print(f"{len(queries)} queries ({len(plan.matcher.patterns)} distinct keywords) over {len(posts)} posts "
+          f"in {elapsed:.2f}s\n")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, matches in results.items():
+        path = os.path.join(args.output_dir, f"{name}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(matches, f, indent=2, ensure_ascii=False)
+        top = matches[0]['relevance_score'] if matches else 0
+        print(f"  {name}: {len(matches)} matches (top score {top}) -> {path}")
+
+if __name__ == '__main__':
+    main()
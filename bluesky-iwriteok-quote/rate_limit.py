@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Adaptive rate limiting for XRPC calls.
+
+A token bucket shared by every request replaces the fixed
+`time.sleep(0.5)` between pages. The bucket starts at a conservative
+rate and is re-tuned from the server's `RateLimit-*` headers, so we go as
+fast as the remaining budget allows. On 429 (and 5xx) responses callers
+retry with jittered exponential backoff, honouring `Retry-After` when the
+server sends it.
+
+The AppView sends:
+    RateLimit-Limit: 3000
+    RateLimit-Remaining: 2987
+    RateLimit-Reset: 1731542400      (unix time the window resets)
+    RateLimit-Policy: 3000;w=300
+"""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+# Starting budget before we've seen any headers: 3000 requests / 5 minutes
+DEFAULT_RATE = 10.0  # requests per second
+DEFAULT_BURST = 10
+
+# Never throttle below this, even when the server says the budget is nearly gone
+MIN_RATE = 0.2
+
+# Status codes worth retrying, and how many times
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 6
+
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 60.0
+
+def _header_float(headers: Mapping, name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _reset_in(headers: Mapping) -> Optional[float]:
+    """Seconds until the rate-limit window resets (accepts unix time or delta seconds)."""
+    reset = _header_float(headers, 'RateLimit-Reset')
+    if reset is None:
+        return None
+    # Anything that looks like a timestamp is absolute; small values are a delta
+    if reset > 1e9:
+        reset -= time.time()
+    return max(reset, 0.0)
+
+def retry_after_seconds(headers: Mapping) -> Optional[float]:
+    """How long the server asked us to wait, from Retry-After or an exhausted RateLimit window."""
+    retry_after = headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    if _header_float(headers, 'RateLimit-Remaining') == 0:
+        return _reset_in(headers)
+
+    return None
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def retry_delay(attempt: int, headers: Mapping) -> float:
+    """Delay before retrying: the server's requested wait (plus jitter) or plain backoff."""
+    server_wait = retry_after_seconds(headers)
+    if server_wait is not None:
+        return server_wait + random.uniform(0, BACKOFF_BASE)
+    return backoff_delay(attempt)
+
+class RateLimiter:
+    """
+    Thread-safe token bucket whose rate follows the server's RateLimit-* headers.
+
+    share is the fraction of the budget this bucket may use, for one of several
+    processes crawling from the same IP (the budget is per IP).
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, share: float = 1.0):
+        self.share = share
+        self.rate = rate * share
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds the caller must wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(self.blocked_until - now, 0.0)
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait (without blocking the event loop) until a request may be sent."""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop every caller from sending for the next `seconds` (e.g. after a 429)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping):
+        """Re-tune the bucket so the remaining budget is spread over the rest of the window."""
+        remaining = _header_float(headers, 'RateLimit-Remaining')
+        reset_in = _reset_in(headers)
+        if remaining is None or reset_in is None:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining <= 0:
+                self.blocked_until = max(self.blocked_until, now + reset_in)
+                return
+            self.rate = max(remaining * self.share / max(reset_in, 1.0), MIN_RATE)
+            self.tokens = min(self.tokens, remaining * self.share)
+
+# Shared by every XRPC call in the process
+LIMITER = RateLimiter()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory streaming search over on-disk corpora.
+
+`search_posts` needs the whole corpus in memory and copies every match
+before sorting. stream_search instead reads posts from disk one at a time
+(JSONL, or an all_posts.json array decoded incrementally), scores each
+with `calculate_relevance_score`, appends every match to a JSONL file as
+it's found, and keeps only the current top K in a heap. Memory is bounded
+by K and the read buffer, not the archive size.
+
+The top K come out in the same order as `search_posts(...)[:K]`.
+
+Usage:
+    python3 stream_search.py all_posts.json --top 200
+    python3 stream_search.py archive.jsonl --top 50 --matches-jsonl keyword_matches.jsonl
+"""
+
+import argparse
+import heapq
+import json
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+from jsonl_store import iter_jsonl
+from working_fetch_script import KEYWORDS, calculate_relevance_score
+
+READ_CHUNK = 1 << 16  # characters per read from a JSON array file
+
+def iter_json_array(path: str) -> Iterator[Dict]:
+    """Yield the elements of a top-level JSON array file without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        started = False
+        eof = False
+
+        while True:
+            # Skip whitespace, the opening bracket and separators between elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            if position < len(buffer) and started:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # An element running right up to the end of the buffer may be cut short
+                    if end < len(buffer) or eof:
+                        yield element
+                        position = end
+                        continue
+            elif eof:
+                return
+
+            # Need more data: drop what's consumed and read the next chunk
+            chunk = f.read(READ_CHUNK)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
+
+def iter_posts(path: str) -> Iterator[Dict]:
+    """Stream posts from a .jsonl file or an all_posts.json-style array."""
+    if path.endswith('.jsonl'):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+def stream_search(posts: Iterable[Dict], keywords: List[str], top_k: int = 20,
+                  matches_out: Optional[IO[str]] = None) -> List[Dict]:
+    """
+    Score a stream of posts and return the best top_k matches, ranked like search_posts.
+
+    Every match is also written to matches_out (JSONL, corpus order) as it's found.
+    """
+    # Min-heap of (score, likes, -position, match): the root is the weakest of the current top K
+    heap = []
+    matched_count = 0
+
+    for position, post in enumerate(posts):
+        score, matched = calculate_relevance_score(post, keywords)
+        if score <= 0:
+            continue
+
+        matched_count += 1
+        match = {**post, 'matched_keywords': matched, 'relevance_score': score}
+
+        if matches_out is not None:
+            matches_out.write(json.dumps(match, ensure_ascii=False))
+            matches_out.write('\n')
+
+        entry = (score, post['likes'], -position, match)
+        if len(heap) < top_k:
+            heapq.heappush(heap, entry)
+        elif entry[:3] > heap[0][:3]:
+            heapq.heapreplace(heap, entry)
+
+    if matches_out is not None:
+        matches_out.flush()
+
+    print(f"Found {matched_count} posts with relevant keywords")
+    return [entry[3] for entry in sorted(heap, key=lambda entry: entry[:3], reverse=True)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Search an on-disk corpus with bounded memory")
+    parser.add_argument('posts', nargs='?', default='all_posts.json', help=".json array or .jsonl corpus")
+    parser.add_argument('--top', type=int, default=20, help="how many ranked matches to keep")
+    parser.add_argument('--matches-jsonl', default='keyword_matches.jsonl',
+                        help="every match, written as it's found")
+    parser.add_argument('--output', default='keyword_matches.json', help="ranked top matches")
+    args = parser.parse_args()
+
+    with open(args.matches_jsonl, 'w', encoding='utf-8') as matches_out:
+        top = stream_search(iter_posts(args.posts), KEYWORDS, args.top, matches_out)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(top, f, indent=2, ensure_ascii=False)
+
+    print(f"Saved all matches to {args.matches_jsonl} and the top {len(top)} to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Incremental, resumable sync of an author's feed into a local posts file.
+
+Instead of re-downloading the whole history every run, a per-actor
+checkpoint in `sync_state.json` remembers the newest post stored by the
+last completed sync plus the cursor of the last page written. Re-runs
+stop paginating as soon as they reach the checkpointed post, and a crawl
+that dies mid-way resumes from the saved cursor instead of page 1.
+
+The posts file keeps the `all_posts.json` format (newest first). Use one
+posts file per actor; the checkpoint tracks where this run's posts end.
+
+Usage:
+    python3 sync_posts.py iwriteok.bsky.social --posts all_posts.json
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Collection, Dict, List, Optional
+
+from working_fetch_script import FEED_FILTERS, FEED_REASONS, HANDLE, filter_posts, iter_feed_pages
+
+STATE_FILE = 'sync_state.json'
+
+def _write_json_atomic(path: str, data, indent: Optional[int] = 2):
+    """Write JSON to a temp file and rename it over path, so a crash never leaves half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_state(state_path: str = STATE_FILE) -> Dict:
+    """Load all per-actor checkpoints ({} if none saved yet)."""
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state: Dict, state_path: str = STATE_FILE):
+    _write_json_atomic(state_path, state)
+
+def load_posts(posts_path: str) -> List[Dict]:
+    if not os.path.exists(posts_path):
+        return []
+    with open(posts_path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _parse_time(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+def _older_than(page_posts: List[Dict], marker: Dict) -> bool:
+    """
+    True if every post the author wrote on the page is older than the checkpoint post.
+
+    Reposts are left out (their created_at is the original post's), and so the
+    whole page must be older, so one backdated post can't end a sync early.
+    """
+    checkpoint_time = _parse_time(marker['created_at'])
+    times = [_parse_time(post['created_at']) for post in page_posts if post.get('reason') != 'repost']
+    times = [t for t in times if t is not None]
+    if checkpoint_time is None or not times:
+        return False
+    try:
+        return max(times) < checkpoint_time
+    except TypeError:
+        # A timestamp without a timezone can't be compared
+        return False
+
+def _post_marker(post: Dict) -> Dict:
+    """The fields we keep in a checkpoint to recognise a post again."""
+    return {'uri': post['uri'], 'cid': post['cid'], 'created_at': post['created_at']}
+
+def sync_actor(actor: str, posts_path: str = 'all_posts.json', state_path: str = STATE_FILE,
+               feed_filter: Optional[str] = None, reasons: Optional[Collection[str]] = None) -> List[Dict]:
+    """
+    Bring posts_path up to date with actor's feed and return all stored posts.
+
+    feed_filter and reasons select posts like fetch_all_posts; a posts file must
+    always be synced with the same ones.
+
+    Checkpoint layout (per actor):
+        newest     -- uri/cid/created_at of the newest post from the last completed sync
+        cursor     -- cursor of the last page written by an unfinished crawl (None when idle)
+        run_count  -- how many posts at the head of posts_path belong to the unfinished crawl
+        filter     -- the feed_filter the posts were fetched with
+        reasons    -- the reasons kept (None: all of them)
+    """
+    state = load_state(state_path)
+    stored = load_posts(posts_path)
+    checkpoint = state.get(actor)
+    selection = {'filter': feed_filter, 'reasons': sorted(reasons) if reasons else None}
+
+    if checkpoint is None:
+        # A posts file from a full fetch counts as a completed sync
+        checkpoint = {'newest': _post_marker(stored[0]) if stored else None, 'cursor': None, 'run_count': 0,
+                      **selection}
+
+    if {key: checkpoint.get(key) for key in selection} != selection:
+        print(f"@{actor} was synced into {posts_path} with different filter/reasons "
+              f"({checkpoint.get('filter')}, {checkpoint.get('reasons')}); use another posts and state file")
+        return []
+
+    newest = checkpoint['newest']
+    cursor = checkpoint['cursor']
+    run_count = checkpoint['run_count']
+
+    if cursor:
+        print(f"Resuming @{actor} from saved cursor ({run_count} posts already written)")
+    elif newest:
+        print(f"Syncing @{actor} since {newest['created_at']}")
+    else:
+        print(f"No checkpoint for @{actor}, fetching full history")
+
+    run_posts = stored[:run_count]
+    older_posts = stored[run_count:]
+    known = {post['uri'] for post in stored}
+
+    pages = 0
+    for page_posts, next_cursor in iter_feed_pages(actor, cursor=cursor, feed_filter=feed_filter):
+        pages += 1
+        page_posts = filter_posts(page_posts, reasons)
+        reached_checkpoint = False
+        fresh = []
+
+        for post in page_posts:
+            if newest and post['uri'] == newest['uri']:
+                reached_checkpoint = True
+                break
+            if post['uri'] not in known:
+                known.add(post['uri'])
+                fresh.append(post)
+
+        run_posts.extend(fresh)
+
+        # A page older than the checkpoint post also means we've caught up (e.g. it was
+        # deleted). A page of stored URIs doesn't: after a crash between the two writes
+        # below, the resumed run re-fetches a page it already wrote and must keep going
+        caught_up = newest is not None and _older_than(page_posts, newest)
+        done = reached_checkpoint or caught_up or not next_cursor
+
+        # Posts first, then checkpoint: a crash in between only re-fetches a page we dedupe
+        _write_json_atomic(posts_path, run_posts + older_posts)
+        if done:
+            checkpoint = {
+                'newest': _post_marker(run_posts[0]) if run_posts else newest,
+                'cursor': None,
+                'run_count': 0,
+                **selection,
+            }
+        else:
+            checkpoint = {'newest': newest, 'cursor': next_cursor, 'run_count': len(run_posts), **selection}
+        state[actor] = checkpoint
+        save_state(state, state_path)
+
+        print(f"  Page {pages}: {len(run_posts)} new posts so far...", end='\r')
+        if done:
+            break
+
+    print(f"\n@{actor}: {len(run_posts)} new posts in {pages} page(s), {len(run_posts) + len(older_posts)} stored")
+    return run_posts + older_posts
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync an author's Bluesky posts")
+    parser.add_argument('actor', nargs='?', default=HANDLE, help=f"handle or DID (default {HANDLE})")
+    parser.add_argument('--posts', default='all_posts.json', help="posts file for this actor")
+    parser.add_argument('--state', default=STATE_FILE, help="checkpoint file")
+    parser.add_argument('--filter', choices=FEED_FILTERS, default=None, help="server-side feed filter")
+    parser.add_argument('--skip-reposts', action='store_true', help="drop reposts of other accounts' posts")
+    args = parser.parse_args()
+
+    reasons = [reason for reason in FEED_REASONS if reason != 'repost'] if args.skip_reposts else None
+    sync_actor(args.actor, args.posts, args.state, args.filter, reasons)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Shared keep-alive HTTP transport for every XRPC call.
+
+The fetch scripts used to make one-off requests (`requests.get` with no
+Session, a fresh `urllib.request.urlopen` per page), so every page paid for
+a new TCP + TLS handshake and, for urllib, an uncompressed body. All of
+them now go through one process-wide `requests.Session`:
+    - a pooled HTTPAdapter keeps connections to the AppView open between
+      pages (and between threads)
+    - compressed responses are requested and decoded transparently (gzip
+      and deflate always, brotli/zstd when urllib3 can decode them)
+    - the default headers and (connect, read) timeouts live here once
+
+`xrpc_get()` layers the response cache, rate limiter, retries and crawl
+metrics on top, so `get_profile` / `get_author_feed` in every script only
+build parameters.
+
+Usage:
+    from transport import xrpc_get
+    profile = xrpc_get(BASE_URL, 'app.bsky.actor.getProfile', {'actor': handle})
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+
+import rate_limit
+from crawl_metrics import METRICS
+from http_cache import cache_key, get_cache, ttl_for
+from rate_limit import MAX_RETRIES, RETRY_STATUSES, backoff_delay, retry_delay
+
+# Headers sent with every XRPC request
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+    'Accept': 'application/json',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Origin': 'https://bsky.app',
+    'Referer': 'https://bsky.app/',
+    # Only advertise encodings urllib3 can actually decode here (br/zstd need extra packages)
+    'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding'],
+}
+
+# Seconds to establish a connection / to wait for response bytes
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+
+# Connections kept open per host
+POOL_SIZE = 16
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def new_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """A Session with the default headers and a keep-alive pool for http and https."""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session() -> requests.Session:
+    """The process-wide Session (created on first use)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = new_session()
+    return _session
+
+def close_session():
+    """Close pooled connections; the next call opens a new Session."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def http_get(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+             timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) -> requests.Response:
+    """Plain GET over the shared Session (no cache, limiter or retries)."""
+    return get_session().get(url, params=params, headers=headers, timeout=timeout)
+
+def xrpc_get(base_url: str, method: str, params: Dict, decode: Callable[[bytes], Any] = json.loads,
+             use_cache: bool = True) -> Any:
+    """
+    GET an XRPC method through the shared rate limiter, retrying 429s, 5xx and network errors.
+
+    Responses are served from the on-disk cache while fresh and revalidated with their ETag once stale;
+    use_cache=False always asks the server (for callers that keep their own cache, like actor_resolver).
+    decode turns the response body into the result (see feed_decoder.py for a selective one).
+    """
+    url = f"{base_url}/{method}"
+
+    cache = get_cache() if use_cache else None
+    key = cache_key(url, params)
+    cached = cache.lookup(key) if cache else None
+    if cached and cached.fresh:
+        METRICS.record_cache_hit(method)
+        with METRICS.phase('parse'):
+            return decode(cached.body)
+
+    headers = None
+    if cached and cached.etag:
+        # Stale but revalidatable: a 304 lets us reuse the body
+        headers = {'If-None-Match': cached.etag}
+
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limit.LIMITER.acquire()
+        started = time.perf_counter()
+        try:
+            response = http_get(url, params, headers)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            METRICS.record_error(method, e, time.perf_counter() - started)
+            if attempt == MAX_RETRIES:
+                raise
+            METRICS.record_retry(method, e.__class__.__name__)
+            delay = backoff_delay(attempt)
+            print(f"\n  {method}: {e.__class__.__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        METRICS.observe_request(method, response.status_code, time.perf_counter() - started,
+                                len(response.content), params)
+        rate_limit.LIMITER.update_from_headers(response.headers)
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            METRICS.record_retry(method, str(response.status_code))
+            delay = retry_delay(attempt, response.headers)
+            print(f"\n  {method}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+            if response.status_code == 429:
+                # Throttle every caller, not just this one
+                rate_limit.LIMITER.pause(delay)
+            else:
+                time.sleep(delay)
+            continue
+
+        if response.status_code == 304 and cached:
+            cache.refresh(key, ttl_for(method, params))
+            with METRICS.phase('parse'):
+                return decode(cached.body)
+
+        response.raise_for_status()
+        if cache:
+            cache.store(key, response.content, response.headers.get('ETag'), ttl_for(method, params))
+        with METRICS.phase('parse'):
+            return decode(response.content)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Vectorized batch scoring with NumPy.
+
+`calculate_relevance_score` evaluates the concept bonuses with Python `if`
+statements per post, and `search_posts` fully sorts every match even
+though `main` only shows the top 20. BatchScorer instead:
+    1. runs one Aho-Corasick pass per post and accumulates, straight from
+       the hits, a matched-keyword count per post and a posts x
+       concept-groups boolean matrix (never a posts x keywords one)
+    2. evaluates every bonus rule at once: a rule fires when the post hits
+       all of the rule's groups, so rules are just rows of a requirement
+       matrix plus a bonus vector (declared as data in BONUS_RULES)
+    3. picks the top K with argpartition instead of sorting everything
+
+Texts are scored in chunks of CHUNK_SIZE, so besides the score vector
+memory stays bounded however large the corpus; matched keywords are only
+worked out again for the K posts returned.
+
+Scores are identical to `calculate_relevance_score`, and top_k() returns
+the same posts in the same order as `search_posts(...)[:k]`.
+
+Requirements:
+    pip install numpy
+
+Usage:
+    python3 vector_scoring.py all_posts.json --top 20
+"""
+
+import argparse
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+from working_fetch_script import BONUS_RULES, CONCEPT_GROUPS, KEYWORDS
+
+# Texts scored per batch of matrix operations
+CHUNK_SIZE = 50_000
+
+class BatchScorer:
+    """Scores whole batches of texts with matrix operations."""
+
+    def __init__(self, keywords: List[str], groups: Dict[str, List[str]] = CONCEPT_GROUPS,
+                 rules: Sequence[Tuple[Tuple[str, ...], int]] = BONUS_RULES,
+                 word_boundaries: bool = False):
+        self.keywords = list(keywords)
+        self.matcher = KeywordMatcher(self.keywords, groups, word_boundaries)
+
+        group_names = list(groups)
+        group_index = {name: column for column, name in enumerate(group_names)}
+
+        self.group_count = len(group_names)
+
+        # Per matcher pattern: how many keywords it stands for, and the groups
+        # they belong to (by exact keyword string, like the original)
+        self.pattern_counts = [len(indices) for indices in self.matcher.pattern_keywords]
+        self.pattern_groups: List[List[int]] = [
+            sorted({group_index[name] for index in indices
+                    for name, members in groups.items() if self.keywords[index] in members})
+            for indices in self.matcher.pattern_keywords
+        ]
+
+        # rules x groups requirements, and the bonus each rule adds
+        self.requirements = np.zeros((len(rules), len(group_names)), dtype=np.int32)
+        for row, (required, _) in enumerate(rules):
+            for name in required:
+                self.requirements[row, group_index[name]] = 1
+        self.required_counts = self.requirements.sum(axis=1)
+        self.bonuses = np.array([bonus for _, bonus in rules], dtype=np.int64)
+
+    def hits(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(matched keyword count per text, texts x groups boolean concept matrix)."""
+        counts = np.zeros(len(texts), dtype=np.int64)
+        concepts = np.zeros((len(texts), self.group_count), dtype=bool)
+        for row, text in enumerate(texts):
+            for pattern_id in self.matcher.find_patterns(text):
+                counts[row] += self.pattern_counts[pattern_id]
+                concepts[row, self.pattern_groups[pattern_id]] = True
+        return counts, concepts
+
+    def score_hits(self, counts: np.ndarray, concepts: np.ndarray) -> np.ndarray:
+        """Relevance score per text from its keyword count and concept row."""
+        satisfied = concepts.astype(np.int32) @ self.requirements.T
+        fired = satisfied == self.required_counts
+        return counts + fired.astype(np.int64) @ self.bonuses
+
+    def score(self, texts: Sequence[str], chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+        """Relevance score per text, computed chunk_size texts at a time."""
+        scores = np.zeros(len(texts), dtype=np.int64)
+        for start in range(0, len(texts), chunk_size):
+            chunk = texts[start:start + chunk_size]
+            scores[start:start + len(chunk)] = self.score_hits(*self.hits(chunk))
+        return scores
+
+    def matched_keywords(self, text: str) -> List[str]:
+        """The keywords text contains, in keyword-list order."""
+        indices = sorted(index for pattern_id in self.matcher.find_patterns(text)
+                         for index in self.matcher.pattern_keywords[pattern_id])
+        return [self.keywords[index] for index in indices]
+
+def top_k_indices(scores: np.ndarray, likes: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k best posts with score > 0, ordered like search_posts:
+    score desc, likes desc, then corpus order.
+    """
+    candidates = np.flatnonzero(scores > 0)
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+
+    # One sortable int64 key per candidate: score first, likes as the tie-breaker
+    candidate_likes = likes[candidates]
+    key = scores[candidates] * (int(candidate_likes.max()) + 1) + candidate_likes
+
+    if len(candidates) > k:
+        threshold = np.partition(key, len(key) - k)[len(key) - k]
+        above = candidates[key > threshold]
+        # Fill the remaining slots with the earliest posts sitting exactly on the threshold
+        on_threshold = candidates[key == threshold][:k - len(above)]
+        candidates = np.concatenate([above, on_threshold])
+        key = scores[candidates] * (int(candidate_likes.max()) + 1) + likes[candidates]
+
+    # lexsort sorts by the last key first: key desc, then corpus index asc
+    order = np.lexsort((candidates, -key))
+    return candidates[order]
+
+def top_k(posts: Sequence[Dict], keywords: List[str], k: int = 20,
+          scorer: Optional[BatchScorer] = None) -> List[Dict]:
+    """Same as search_posts(posts, keywords)[:k], computed in batch."""
+    scorer = scorer or BatchScorer(keywords)
+    scores = scorer.score([post['text'] for post in posts])
+    likes = np.fromiter((post['likes'] for post in posts), dtype=np.int64, count=len(posts))
+
+    results = []
+    for index in top_k_indices(scores, likes, k):
+        results.append({
+            **posts[index],
+            'matched_keywords': scorer.matched_keywords(posts[index]['text']),
+            'relevance_score': int(scores[index])
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-score posts with NumPy and show the top K")
+    parser.add_argument('posts', nargs='?', default='all_posts.json', help="posts JSON file")
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.posts, encoding='utf-8') as f:
+        posts = json.load(f)
+
+    for i, post in enumerate(top_k(posts, KEYWORDS, args.top), 1):
+        print(f"#{i} [{post['relevance_score']}] {post['likes']} likes: {post['text'][:100]!r}")
+
+if __name__ == '__main__':
+    main()
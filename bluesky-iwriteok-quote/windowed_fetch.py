@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Time-sliced parallel pagination for one large account.
+
+`async_fetch` crawls accounts side by side, but each account is still one
+chain of dependent requests: page N+1 needs page N's cursor, so a backfill
+of @iwriteok is ~51 round trips in a row however many connections are
+open. getAuthorFeed's cursor is just a timestamp ("items older than
+this"), so we can make our own:
+
+    1. fetch the first page, which gives the newest timestamp
+    2. split the time from there back to the account's createdAt into
+       windows, and seed each window's crawl with its upper edge as cursor
+    3. crawl the windows concurrently, each stopping when it reaches the
+       next window's edge (the last window runs to the end of the feed, so
+       posts backdated before createdAt aren't lost)
+    4. stitch the windows back together newest first, dropping items seen
+       twice at a window edge, then de-duplicate by CID as usual
+
+Posting is rarely even over time (a week of live-posting an event can
+outweigh a quiet year), so equal windows alone would leave one long
+chain. Whenever windows finish and workers are free, the next busy window
+to get a page back splits the rest of its range evenly with one new crawl
+per free worker, so a burst is narrowed down several-fold per round trip. Round trips drop from O(pages) to roughly O(pages / workers),
+plus about one extra page per window edge: it spends requests to save
+time, so it only pays off with rate budget to spare.
+
+Requirements:
+    pip install aiohttp requests
+
+Usage:
+    python3 windowed_fetch.py iwriteok.bsky.social --workers 8 --output all_posts.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Collection, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from async_fetch import DEFAULT_CONCURRENCY, KEEPALIVE_TIMEOUT, REQUEST_TIMEOUT, get_author_feed
+from cid_set import CidSet
+from feed_decoder import feed_item_to_post
+from transport import DEFAULT_HEADERS
+from working_fetch_script import (FEED_FILTERS, FEED_REASONS, HANDLE, MAX_POSTS, filter_posts, item_sort_at,
+                                  resolve_actors)
+
+# Narrowest window worth splitting off (cursors have millisecond precision)
+MIN_WINDOW = timedelta(milliseconds=10)
+
+# Fallback lower edge when the profile has no createdAt (Bluesky's public beta)
+EARLIEST = '2023-02-01T00:00:00.000Z'
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def _edge(value: datetime) -> datetime:
+    """Round down to the millisecond, so a window edge and its cursor agree exactly."""
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+def split_windows(newest: datetime, oldest: datetime, count: int) -> List[Tuple[datetime, Optional[datetime]]]:
+    """
+    (upper, lower) edges of count equal windows from newest back to oldest, newest first.
+
+    A window holds the items older than upper and no older than lower; the
+    last window has no lower edge.
+    """
+    step = (newest - oldest) / count
+    edges = [_edge(newest - step * i) for i in range(count)]
+    return list(zip(edges, edges[1:] + [None]))
+
+def stitch_windows(windows: List[List[Dict]]) -> List[Dict]:
+    """Concatenate windows (newest first), dropping items fetched twice at a window edge."""
+    seen_items = set()
+    items = []
+    for window in windows:
+        for item in window:
+            key = (item['post']['uri'], item_sort_at(item))
+            if key not in seen_items:
+                seen_items.add(key)
+                items.append(item)
+    return items
+
+class _Window:
+    """One time window's crawl: items older than upper, down to lower (None: the end of the feed)."""
+
+    def __init__(self, upper: datetime, lower: Optional[datetime], cursor: Optional[str] = None):
+        self.upper = upper
+        self.lower = lower
+        self.cursor = cursor or _format_time(upper)
+        self.items: List[Dict] = []
+
+class WindowedCrawl:
+    """Crawls one account's feed as concurrent time windows, splitting busy windows as workers free up."""
+
+    def __init__(self, session: aiohttp.ClientSession, actor: str, oldest: datetime,
+                 workers: int = DEFAULT_CONCURRENCY, feed_filter: Optional[str] = None):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(workers)
+        self.actor = actor
+        self.oldest = oldest
+        self.workers = workers
+        self.feed_filter = feed_filter
+        self.windows: List[_Window] = []
+        self.pages = 0
+        self._tasks = set()
+        self._running = 0
+
+    async def run(self, windows: List[_Window]) -> List[Dict]:
+        """Crawl windows (and any split off them); returns their items stitched newest first."""
+        for window in windows:
+            self._start(window)
+        while self._tasks:
+            # Re-read the set each time: windows split off while we wait add tasks
+            done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self._tasks.discard(task)
+                task.result()
+        ordered = sorted(self.windows, key=lambda window: window.upper, reverse=True)
+        return stitch_windows([window.items for window in ordered])
+
+    def _start(self, window: _Window):
+        self.windows.append(window)
+        self._running += 1
+        self._tasks.add(asyncio.create_task(self._crawl(window)))
+
+    async def _crawl(self, window: _Window):
+        try:
+            await self._crawl_pages(window)
+        finally:
+            self._running -= 1
+
+    async def _crawl_pages(self, window: _Window):
+        while True:
+            response = await get_author_feed(self.session, self.semaphore, self.actor, limit=100,
+                                             cursor=window.cursor, feed_filter=self.feed_filter)
+            if not response.get('feed'):
+                return
+            self.pages += 1
+
+            for item in response['feed']:
+                if window.lower is not None and _parse_time(item_sort_at(item)) < window.lower:
+                    # Reached the next window
+                    return
+                window.items.append(item)
+
+            window.cursor = response.get('cursor')
+            if not window.cursor:
+                return
+            self._maybe_split(window)
+
+    def _maybe_split(self, window: _Window):
+        """Share the rest of window's range with a new crawl per idle worker, older parts first."""
+        idle = self.workers - self._running
+        if idle <= 0:
+            return
+        position = _parse_time(window.cursor)
+        lower = window.lower or self.oldest
+        parts = min(idle + 1, int((position - lower) / MIN_WINDOW))
+        if parts < 2:
+            return
+        edges = [upper for upper, _ in split_windows(position, lower, parts)][1:]
+        for upper, part_lower in zip(edges, edges[1:] + [window.lower]):
+            self._start(_Window(upper, part_lower))
+        window.lower = edges[0]
+
+async def fetch_windowed(actor: str, max_posts: int = MAX_POSTS, workers: int = DEFAULT_CONCURRENCY,
+                         seen: Optional[CidSet] = None, reasons: Optional[Collection[str]] = None,
+                         feed_filter: Optional[str] = None) -> Tuple[List[Dict], Dict]:
+    """
+    Fetch one account's feed with its history split into concurrently crawled time windows.
+
+    Returns (posts, stats): the posts in feed order, de-duplicated by CID (against
+    seen, if given) like fetch_all_posts, at most max_posts of them; and the
+    windows and pages used. Meant for full backfills: the whole history is
+    crawled, max_posts only truncates the result.
+    """
+    profile = (await asyncio.to_thread(resolve_actors, [actor]))[actor]
+    if not profile:
+        print(f"Skipping {actor}: profile not found")
+        return [], {'windows': 0, 'pages': 0}
+    if seen is None:
+        seen = CidSet()
+
+    connector = aiohttp.TCPConnector(limit=workers, keepalive_timeout=KEEPALIVE_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS,
+                                     timeout=REQUEST_TIMEOUT) as session:
+        oldest = _parse_time(profile.get('createdAt') or EARLIEST)
+        crawl = WindowedCrawl(session, profile['did'], oldest, workers, feed_filter)
+        first = await get_author_feed(session, crawl.semaphore, profile['did'], limit=100,
+                                      feed_filter=feed_filter)
+        if not first.get('feed'):
+            return [], {'windows': 0, 'pages': 0}
+
+        items = first['feed']
+        if first.get('cursor') and len(items) < max_posts:
+            newest = _parse_time(item_sort_at(items[-1]))
+            windows = [_Window(upper, lower)
+                       for upper, lower in split_windows(newest, min(oldest, newest), workers)]
+            # The first window carries on exactly where the first page stopped
+            windows[0].cursor = first['cursor']
+            items = stitch_windows([items, await crawl.run(windows)])
+
+    posts = [post for post in map(feed_item_to_post, items) if post]
+    posts = filter_posts(posts, reasons, seen)[:max_posts]
+    return posts, {'windows': len(crawl.windows), 'pages': crawl.pages + 1}
+
+def fetch_all_posts_windowed(actor: str, max_posts: int = MAX_POSTS, workers: int = DEFAULT_CONCURRENCY,
+                             seen: Optional[CidSet] = None, reasons: Optional[Collection[str]] = None,
+                             feed_filter: Optional[str] = None) -> List[Dict]:
+    """Blocking wrapper around fetch_windowed for use from scripts."""
+    posts, _ = asyncio.run(fetch_windowed(actor, max_posts, workers, seen, reasons, feed_filter))
+    return posts
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill one Bluesky account with parallel time windows")
+    parser.add_argument('actor', nargs='?', default=HANDLE, help=f"handle or DID (default {HANDLE})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"max requests in flight (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--max-posts', type=int, default=MAX_POSTS, help="max posts to keep")
+    parser.add_argument('--output', default='all_posts.json', help="where to save the posts")
+    parser.add_argument('--seen', default=None,
+                        help="persistent CID set file, to also skip posts fetched by earlier runs")
+    parser.add_argument('--filter', choices=FEED_FILTERS, default=None, help="server-side feed filter")
+    parser.add_argument('--skip-reposts', action='store_true', help="drop reposts of other accounts' posts")
+    args = parser.parse_args()
+
+    reasons = [reason for reason in FEED_REASONS if reason != 'repost'] if args.skip_reposts else None
+    start = time.perf_counter()
+    with CidSet(args.seen) as seen:
+        posts, stats = asyncio.run(fetch_windowed(args.actor, args.max_posts, args.workers,
+                                                  seen, reasons, args.filter))
+    print(f"Fetched {len(posts)} posts from {stats['pages']} pages over {stats['windows']} windows "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(posts, f, indent=2, ensure_ascii=False)
+    print(f"Saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -7,22 +7,39 @@ This script should work in an environment with proper internet access.
 
 Requirements:
     pip install requests
+    pip install msgspec   # optional, faster feed decoding (see feed_decoder.py)
 
 Usage:
-    python3 working_fetch_script.py
+    python3 working_fetch_script.py          # full fetch
+    python3 working_fetch_script.py --sync   # only fetch posts newer than last run
+    python3 working_fetch_script.py --skip-reposts --filter posts_no_replies
 """
 
+import argparse
 import json
-import requests
-import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import Any, Callable, Collection, Iterator, List, Dict, Optional, Tuple
+
+import transport
+from actor_resolver import get_resolver
+from cid_set import CidSet
+from crawl_metrics import METRICS, start_exporter
+from feed_decoder import decode_feed_page
+from keyword_matcher import KeywordMatcher
 
 # Configuration
 BASE_URL = "https://public.api.bsky.app/xrpc"
 HANDLE = "iwriteok.bsky.social"
 MAX_POSTS = 5000  # Fetch all posts (Robert Evans has ~4772)
 
+# Server-side getAuthorFeed filters. None of them drops reposts; that happens client-side
+FEED_FILTERS = ['posts_with_replies', 'posts_no_replies', 'posts_with_media',
+                'posts_and_author_threads', 'posts_with_video']
+
+# Why an item is in an author's feed (the 'reason' key of our post dicts)
+FEED_REASONS = ['original', 'repost', 'reply']
+
 # Keywords to search for
 KEYWORDS = [
     'addiction', 'addicted', 'addict',
@@ -34,53 +51,118 @@ KEYWORDS = [
     'abuse'
 ]
 
+# Keywords that stand for the same concept
+CONCEPT_GROUPS = {
+    'addiction': ['addiction', 'addicted', 'addict'],
+    'drugs': ['drug', 'drugs', 'substance'],
+    'social_media': ['social media', 'twitter', 'facebook', 'instagram'],
+    'understand': ['understand', 'don\'t understand', 'doesn\'t understand'],
+}
+
+# Bonus points when a post hits every concept in the combination
+BONUS_RULES = [
+    (('addiction', 'drugs'), 5),
+    (('addiction', 'social_media'), 5),
+    (('drugs', 'understand'), 3),
+    (('social_media', 'understand'), 3),
+]
+
+def xrpc_get(method: str, params: Dict, decode: Callable[[bytes], Any] = json.loads) -> Any:
+    """GET an XRPC method on BASE_URL over the shared keep-alive transport."""
+    return transport.xrpc_get(BASE_URL, method, params, decode)
+
+def resolve_actors(actors: List[str]) -> Dict[str, Optional[Dict]]:
+    """Profiles for many handles/DIDs, from the resolver cache or in getProfiles batches of 25."""
+    return get_resolver().resolve_many(actors, BASE_URL)
+
 def get_profile(handle: str) -> Optional[Dict]:
-    """Get profile information for a user."""
+    """Get profile information for a user (cached; see actor_resolver.py)."""
     try:
-        url = f"{BASE_URL}/app.bsky.actor.getProfile"
-        params = {'actor': handle}
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Origin': 'https://bsky.app',
-            'Referer': 'https://bsky.app/',
-        }
-
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        return resolve_actors([handle])[handle]
 
     except Exception as e:
         print(f"Error fetching profile: {e}")
         return None
 
-def get_author_feed(actor_did: str, limit: int = 100, cursor: Optional[str] = None) -> Optional[Dict]:
-    """Get posts from an author's feed."""
-    try:
-        url = f"{BASE_URL}/app.bsky.feed.getAuthorFeed"
-        params = {'actor': actor_did, 'limit': str(limit)}
-        if cursor:
-            params['cursor'] = cursor
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Origin': 'https://bsky.app',
-            'Referer': 'https://bsky.app/',
-        }
-
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.json()
+def resolve_dids(actors: List[str]) -> Dict[str, str]:
+    """DID for each actor (one batched lookup); actors that don't resolve are reported and left out."""
+    dids = {}
+    for actor, profile in resolve_actors(actors).items():
+        if profile:
+            dids[actor] = profile['did']
+        elif actor.startswith('did:'):
+            dids[actor] = actor
+        else:
+            print(f"Skipping {actor}: could not resolve handle")
+    return dids
+
+def get_author_feed(actor_did: str, limit: int = 100, cursor: Optional[str] = None,
+                    feed_filter: Optional[str] = None, decode: Callable[[bytes], Any] = json.loads) -> Any:
+    """
+    Get posts from an author's feed, optionally narrowed by one of FEED_FILTERS.
+
+    decode turns the body into the result (the full response by default; see
+    get_author_feed_posts). Raises once transport's retries are exhausted: a failed
+    page is not the end of the feed.
+    """
+    params = {'actor': actor_did, 'limit': str(limit)}
+    if cursor:
+        params['cursor'] = cursor
+    if feed_filter:
+        params['filter'] = feed_filter
+
+    return xrpc_get('app.bsky.feed.getAuthorFeed', params, decode)
+
+def item_sort_at(item: Dict) -> str:
+    """The timestamp an item is ordered by in an author feed (repost time for reposts)."""
+    reason = item.get('reason') or {}
+    return reason.get('indexedAt') or item['post']['indexedAt']
+
+def filter_posts(posts: List[Dict], reasons: Optional[Collection[str]] = None,
+                 seen: Optional[CidSet] = None) -> List[Dict]:
+    """Keep posts with a wanted reason whose CID isn't in seen (new CIDs are added to it)."""
+    kept = []
+    for post in posts:
+        if reasons and post.get('reason') not in reasons:
+            continue
+        if seen is not None and not seen.add(post['cid']):
+            continue
+        kept.append(post)
+    return kept
+
+def get_author_feed_posts(actor_did: str, limit: int = 100, cursor: Optional[str] = None,
+                          feed_filter: Optional[str] = None) -> Dict:
+    """One page of an author's feed decoded straight to flat posts: {'posts', 'cursor', 'items'}."""
+    return get_author_feed(actor_did, limit, cursor, feed_filter, decode=decode_feed_page)
+
+def iter_feed_pages(actor: str, cursor: Optional[str] = None,
+                    feed_filter: Optional[str] = None) -> Iterator[Tuple[List[Dict], Optional[str]]]:
+    """
+    Yield (posts, next_cursor) for each page of an author's feed, starting at cursor.
+
+    A page that still fails after retries raises, so callers never mistake it for the end of the feed.
+    """
+    while True:
+        page = get_author_feed_posts(actor, limit=100, cursor=cursor, feed_filter=feed_filter)
+
+        if not page['items']:
+            return
+
+        cursor = page['cursor']
+        yield page['posts'], cursor
 
-    except Exception as e:
-        print(f"Error fetching feed: {e}")
-        return None
+        if not cursor:
+            return
+
+def fetch_all_posts(handle: str, max_posts: int = 2000, feed_filter: Optional[str] = None,
+                    reasons: Optional[Collection[str]] = None,
+                    seen: Optional[CidSet] = None) -> List[Dict]:
+    """
+    Fetch all posts from a user.
 
-def fetch_all_posts(handle: str, max_posts: int = 2000) -> List[Dict]:
-    """Fetch all posts from a user."""
+    Posts are de-duplicated by CID (against seen, if given, so across runs and
+    accounts too), and limited to the given feed reasons.
+    """
     print(f"Fetching profile for @{handle}...")
     profile = get_profile(handle)
 
@@ -96,73 +178,40 @@ def fetch_all_posts(handle: str, max_posts: int = 2000) -> List[Dict]:
     print()
 
     posts = []
-    cursor = None
-    page = 0
+    if seen is None:
+        seen = CidSet()
 
     print("Fetching posts...")
-    while len(posts) < max_posts:
-        page += 1
-        print(f"  Page {page}: {len(posts)} posts fetched so far...", end='\r')
-
-        response = get_author_feed(profile['did'], limit=100, cursor=cursor)
-
-        if not response or not response.get('feed'):
-            break
-
-        for item in response['feed']:
-            if 'post' not in item or 'record' not in item['post']:
-                continue
-
-            post = item['post']
-            record = post['record']
-
-            posts.append({
-                'uri': post['uri'],
-                'cid': post['cid'],
-                'text': record.get('text', ''),
-                'created_at': record.get('createdAt', ''),
-                'author': post['author']['handle'],
-                'likes': post.get('likeCount', 0),
-                'reposts': post.get('repostCount', 0),
-                'replies': post.get('replyCount', 0),
-            })
-
-        cursor = response.get('cursor')
-        if not cursor:
-            break
-
-        # Be respectful to the API
-        time.sleep(0.5)
+    try:
+        for page, (page_posts, _) in enumerate(iter_feed_pages(profile['did'], feed_filter=feed_filter), 1):
+            posts.extend(filter_posts(page_posts, reasons, seen))
+            print(f"  Page {page}: {len(posts)} posts fetched so far...", end='\r')
+            if len(posts) >= max_posts:
+                break
+    except Exception as e:
+        print(f"\n\nCrawl incomplete: a page failed after retries ({e}); {len(posts)} posts fetched before it")
+        raise
 
     print(f"\n\nFetched {len(posts)} total posts")
     return posts
 
-def calculate_relevance_score(post: Dict, keywords: List[str]) -> tuple[int, List[str]]:
-    """Calculate how relevant a post is based on keyword matches."""
-    text_lower = post['text'].lower()
-    matched_keywords = []
+@lru_cache(maxsize=32)
+def get_matcher(keywords: Tuple[str, ...], word_boundaries: bool = False) -> KeywordMatcher:
+    """Compile (once) the matcher for a keyword list."""
+    return KeywordMatcher(list(keywords), CONCEPT_GROUPS, word_boundaries)
 
-    for keyword in keywords:
-        if keyword.lower() in text_lower:
-            matched_keywords.append(keyword)
+def calculate_relevance_score(post: Dict, keywords: List[str],
+                              word_boundaries: bool = False) -> tuple[int, List[str]]:
+    """Calculate how relevant a post is based on keyword matches."""
+    matched_keywords, concepts = get_matcher(tuple(keywords), word_boundaries).match(post['text'])
 
     # Bonus scoring
     score = len(matched_keywords)
 
     # Bonus for multiple key concepts
-    has_addiction = any(k in matched_keywords for k in ['addiction', 'addicted', 'addict'])
-    has_drugs = any(k in matched_keywords for k in ['drug', 'drugs', 'substance'])
-    has_social_media = any(k in matched_keywords for k in ['social media', 'twitter', 'facebook', 'instagram'])
-    has_understand = any(k in matched_keywords for k in ['understand', 'don\'t understand', 'doesn\'t understand'])
-
-    if has_addiction and has_drugs:
-        score += 5
-    if has_addiction and has_social_media:
-        score += 5
-    if has_drugs and has_understand:
-        score += 3
-    if has_social_media and has_understand:
-        score += 3
+    for required, bonus in BONUS_RULES:
+        if concepts.issuperset(required):
+            score += bonus
 
     return score, matched_keywords
 
@@ -170,18 +219,19 @@ def search_posts(posts: List[Dict], keywords: List[str]) -> List[Dict]:
     """Search posts for relevant keywords and rank by relevance."""
     matches = []
 
-    for post in posts:
-        score, matched = calculate_relevance_score(post, keywords)
+    with METRICS.phase('scoring'):
+        for post in posts:
+            score, matched = calculate_relevance_score(post, keywords)
 
-        if score > 0:
-            matches.append({
-                **post,
-                'matched_keywords': matched,
-                'relevance_score': score
-            })
+            if score > 0:
+                matches.append({
+                    **post,
+                    'matched_keywords': matched,
+                    'relevance_score': score
+                })
 
-    # Sort by relevance score, then by engagement
-    return sorted(matches, key=lambda x: (x['relevance_score'], x['likes']), reverse=True)
+        # Sort by relevance score, then by engagement
+        return sorted(matches, key=lambda x: (x['relevance_score'], x['likes']), reverse=True)
 
 def format_post_output(post: Dict, index: int) -> str:
     """Format a post for display."""
@@ -208,22 +258,55 @@ def format_post_output(post: Dict, index: int) -> str:
     return '\n'.join(output)
 
 def main():
+    parser = argparse.ArgumentParser(description="Find Robert Evans' social media addiction quote")
+    parser.add_argument('--sync', action='store_true',
+                        help="incrementally sync all_posts.json instead of refetching everything")
+    parser.add_argument('--filter', choices=FEED_FILTERS, default=None,
+                        help="server-side feed filter, e.g. posts_no_replies (never downloads replies)")
+    parser.add_argument('--skip-reposts', action='store_true',
+                        help="drop other accounts' posts that the author reposted")
+    parser.add_argument('--metrics', action='store_true',
+                        help="write crawl_metrics.prom during the run and crawl_metrics.json at the end")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="also serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    exporter = None
+    if args.metrics or args.metrics_port is not None:
+        exporter = start_exporter('crawl_metrics.prom' if args.metrics else None, args.metrics_port)
+    try:
+        run(args)
+    finally:
+        if exporter:
+            exporter.stop()
+        if args.metrics:
+            METRICS.write_summary('crawl_metrics.json')
+            print("\nCrawl metrics saved to crawl_metrics.json")
+
+def run(args: argparse.Namespace):
+    """Fetch (or sync) the posts, search them and report the top candidates."""
     print("="*80)
     print("ROBERT EVANS BLUESKY QUOTE FINDER")
     print("="*80)
     print()
 
-    # Fetch posts
-    posts = fetch_all_posts(HANDLE, MAX_POSTS)
+    reasons = [reason for reason in FEED_REASONS if reason != 'repost'] if args.skip_reposts else None
+    if args.sync:
+        # Only fetch what's new since the last run; sync_actor keeps all_posts.json up to date
+        from sync_posts import sync_actor
+        posts = sync_actor(HANDLE, 'all_posts.json', feed_filter=args.filter, reasons=reasons)
+    else:
+        posts = fetch_all_posts(HANDLE, MAX_POSTS, args.filter, reasons)
 
     if not posts:
         print("Failed to fetch posts. Check your internet connection and API access.")
         return
 
-    # Save all posts
-    print("\nSaving all posts to 'all_posts.json'...")
-    with open('all_posts.json', 'w', encoding='utf-8') as f:
-        json.dump(posts, f, indent=2, ensure_ascii=False)
+    if not args.sync:
+        # Save all posts
+        print("\nSaving all posts to 'all_posts.json'...")
+        with open('all_posts.json', 'w', encoding='utf-8') as f:
+            json.dump(posts, f, indent=2, ensure_ascii=False)
 
     # Search for relevant posts
     print(f"\nSearching for posts matching keywords...")
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Bluesky AppView, for offline benchmarks.
+
+Serves `app.bsky.actor.getProfile(s)` and `app.bsky.feed.getAuthorFeed` for
+the account captured in `all_posts.json`, replaying it in pages of up to
+100 items with timestamp cursors like the real API (each item gets an
+indexedAt; the cursor is the last item's, and the next page starts below
+it). Posts by other accounts, and repeat entries of the account's own
+posts, are served as reposts. The `filter` parameter is honoured for
+`posts_no_replies` (the other filters return everything).
+
+It also stands in for the account's PDS and PLC directory entry:
+`com.atproto.sync.getRepo` returns the account as a repository CAR,
+`app.bsky.feed.getPosts` hydrates up to 25 URIs, and `GET /<did>` returns a
+DID document pointing at this server (set `car_export.PLC_DIRECTORY` to
+`server.root_url`).
+
+Latency, server errors and 429s can be injected to exercise the retry and
+rate-limit paths, and every response carries RateLimit-* headers. New
+connections can be charged a handshake delay (standing in for TCP + TLS
+setup to the real AppView), and bodies are gzipped for clients that ask.
+
+Usage:
+    python3 xrpc_stub_server.py --port 8787 --latency-ms 80 --error-rate 0.02 --throttle-rate 0.01
+
+    # then point a script at it
+    import working_fetch_script
+    working_fetch_script.BASE_URL = 'http://127.0.0.1:8787/xrpc'
+"""
+
+import argparse
+import bisect
+import gzip
+import io
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+# The client's own ordering, so the stub's cursors can't drift from what it expects
+from working_fetch_script import item_sort_at
+
+HANDLE = 'iwriteok.bsky.social'
+DID = 'did:plc:kjixfa7wudorsmbyyfios3kp'
+DISPLAY_NAME = 'Robert Evans (the Only Robert Evans)'
+
+MAX_PAGE = 100
+MAX_PROFILES = 25
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _format_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def _did_from_uri(uri: str) -> str:
+    return uri[len('at://'):].split('/', 1)[0]
+
+def build_feed(posts: List[Dict], handle: str = HANDLE, did: str = DID) -> List[Dict]:
+    """
+    Turn flat post dicts (newest first, in feed order) into hydrated getAuthorFeed items.
+
+    Each item gets a strictly decreasing indexedAt: its created_at when that fits
+    the feed order, otherwise just below the previous item (reposts of older posts).
+    Items by other accounts, and later entries of a URI already in the feed, are reposts.
+    """
+    feed = []
+    previous: Optional[datetime] = None
+    seen_uris = set()
+
+    for post in posts:
+        sort_at = _parse_time(post['created_at'])
+        if previous is not None and sort_at >= previous:
+            sort_at = previous - timedelta(milliseconds=1)
+        previous = sort_at
+
+        view = {
+            'uri': post['uri'],
+            'cid': post['cid'],
+            'author': {'did': _did_from_uri(post['uri']), 'handle': post['author']},
+            'record': {
+                '$type': 'app.bsky.feed.post',
+                'text': post['text'],
+                'createdAt': post['created_at'],
+            },
+            'likeCount': post['likes'],
+            'repostCount': post['reposts'],
+            'replyCount': post['replies'],
+            'indexedAt': _format_time(sort_at),
+        }
+        item = {'post': view}
+        if post['author'] != handle or post['uri'] in seen_uris:
+            item['reason'] = {
+                '$type': 'app.bsky.feed.defs#reasonRepost',
+                'by': {'did': did, 'handle': handle},
+                'indexedAt': _format_time(sort_at),
+            }
+        seen_uris.add(post['uri'])
+        feed.append(item)
+
+    return feed
+
+class StubConfig:
+    """Fault injection knobs, adjustable while the server runs."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, rate_limit: int = 3000,
+                 window: int = 300, connect_latency_ms: float = 0.0, compress: bool = True):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.window = window
+        self.connect_latency_ms = connect_latency_ms
+        self.compress = compress
+
+class StubXrpcServer:
+    """Threaded HTTP server replaying one account's feed."""
+
+    def __init__(self, posts: List[Dict], config: Optional[StubConfig] = None,
+                 host: str = '127.0.0.1', port: int = 0, handle: str = HANDLE, did: str = DID,
+                 mirror_dids: Sequence[str] = ()):
+        self.config = config or StubConfig()
+        self.handle = handle
+        self.did = did
+        # Extra DIDs whose feed is this account's, standing in for many accounts
+        self.mirror_dids = set(mirror_dids)
+        self.posts = posts
+        self.feed = build_feed(posts, handle, did)
+        self._views = {item['post']['uri']: item['post'] for item in self.feed}
+        self._repo_car: Optional[bytes] = None
+        # Per filter: the feed and an ascending copy of its sort keys for bisecting cursors
+        self._filtered: Dict[str, tuple] = {}
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_used = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, keep-alive
+            # connections stall on the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stub._new_connection()
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def root_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.root_url}/xrpc"
+
+    def start(self) -> 'StubXrpcServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _new_connection(self):
+        with self._lock:
+            self.connections += 1
+        if self.config.connect_latency_ms > 0:
+            time.sleep(self.config.connect_latency_ms / 1000)
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        with self._lock:
+            self.requests += 1
+            now = time.time()
+            if now - self._window_start >= self.config.window:
+                self._window_start = now
+                self._window_used = 0
+            self._window_used += 1
+            remaining = max(self.config.rate_limit - self._window_used, 0)
+            reset = int(self._window_start + self.config.window)
+
+        return {
+            'RateLimit-Limit': str(self.config.rate_limit),
+            'RateLimit-Remaining': str(remaining),
+            'RateLimit-Reset': str(reset),
+            'RateLimit-Policy': f"{self.config.rate_limit};w={self.config.window}",
+        }
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, payload, headers: Dict[str, str]):
+        """Send a JSON payload, or raw bytes (a CAR) as-is."""
+        if isinstance(payload, bytes):
+            body, content_type = payload, 'application/vnd.ipld.car'
+        else:
+            body, content_type = json.dumps(payload).encode('utf-8'), 'application/json; charset=utf-8'
+        accept_encoding = handler.headers.get('Accept-Encoding', '')
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        if self.config.compress and 'gzip' in accept_encoding:
+            body = gzip.compress(body, compresslevel=5)
+            handler.send_header('Content-Encoding', 'gzip')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        config = self.config
+        headers = self._rate_limit_headers()
+
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if random.random() < config.throttle_rate or headers['RateLimit-Remaining'] == '0':
+            headers['Retry-After'] = str(config.retry_after)
+            return self._send(handler, 429, {'error': 'RateLimitExceeded', 'message': 'Rate Limit Exceeded'}, headers)
+        if random.random() < config.error_rate:
+            return self._send(handler, 502, {'error': 'UpstreamFailure', 'message': 'injected error'}, headers)
+
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        params = {key: values[0] for key, values in query.items()}
+        method = url.path.rsplit('/', 1)[-1]
+
+        if url.path.startswith('/did:'):
+            status, payload = self.get_did_document(url.path[1:])
+        elif method == 'app.bsky.actor.getProfile':
+            status, payload = self.get_profile(params)
+        elif method == 'app.bsky.actor.getProfiles':
+            status, payload = self.get_profiles(query.get('actors', []))
+        elif method == 'app.bsky.feed.getAuthorFeed':
+            status, payload = self.get_author_feed(params)
+        elif method == 'app.bsky.feed.getPosts':
+            status, payload = self.get_posts(query.get('uris', []))
+        elif method == 'com.atproto.sync.getRepo':
+            status, payload = self.get_repo(params)
+        else:
+            status, payload = 501, {'error': 'MethodNotImplemented', 'message': method}
+
+        self._send(handler, status, payload, headers)
+
+    def _known_actor(self, actor: Optional[str]) -> bool:
+        return actor in (self.handle, self.did) or actor in self.mirror_dids
+
+    def _profile(self) -> Dict:
+        profile = {
+            'did': self.did,
+            'handle': self.handle,
+            'displayName': DISPLAY_NAME,
+            'postsCount': len(self.feed),
+        }
+        if self.feed:
+            # Account creation: a day before the oldest item in the feed
+            profile['createdAt'] = _format_time(_parse_time(item_sort_at(self.feed[-1])) - timedelta(days=1))
+        return profile
+
+    def get_profile(self, params: Dict):
+        if not self._known_actor(params.get('actor')):
+            return 400, {'error': 'InvalidRequest', 'message': 'Profile not found'}
+        return 200, self._profile()
+
+    def get_profiles(self, actors: List[str]):
+        if not actors or len(actors) > MAX_PROFILES:
+            return 400, {'error': 'InvalidRequest', 'message': f"actors must have 1-{MAX_PROFILES} items"}
+        # Unknown actors are left out, like the real AppView
+        return 200, {'profiles': [self._profile()] if any(map(self._known_actor, actors)) else []}
+
+    def get_author_feed(self, params: Dict):
+        if not self._known_actor(params.get('actor')):
+            return 400, {'error': 'InvalidRequest', 'message': 'Profile not found'}
+
+        limit = min(max(int(params.get('limit', 50)), 1), MAX_PAGE)
+        cursor = params.get('cursor')
+        feed, ascending_keys = self._feed_for(params.get('filter', 'posts_with_replies'))
+
+        start = 0
+        if cursor:
+            # First item strictly older than the cursor
+            start = len(feed) - bisect.bisect_left(ascending_keys, cursor)
+
+        page = feed[start:start + limit]
+        payload = {'feed': page}
+        if start + limit < len(feed) and page:
+            payload['cursor'] = item_sort_at(page[-1])
+        return 200, payload
+
+    def _feed_for(self, feed_filter: str):
+        if feed_filter not in self._filtered:
+            feed = self.feed
+            if feed_filter == 'posts_no_replies':
+                feed = [item for item in feed if not item['post']['record'].get('reply')]
+            self._filtered[feed_filter] = (feed, [item_sort_at(item) for item in reversed(feed)])
+        return self._filtered[feed_filter]
+
+    def get_posts(self, uris: List[str]):
+        if len(uris) > 25:
+            return 400, {'error': 'InvalidRequest', 'message': 'uris must not have more than 25 elements'}
+        return 200, {'posts': [self._views[uri] for uri in uris if uri in self._views]}
+
+    def get_repo(self, params: Dict):
+        if params.get('did') != self.did:
+            return 400, {'error': 'RepoNotFound', 'message': f"Could not find repo for DID: {params.get('did')}"}
+        if self._repo_car is None:
+            # Imported here so the server runs without the exporter's dependencies
+            from car_export import posts_to_records, write_repo_car
+
+            buffer = io.BytesIO()
+            write_repo_car(buffer, self.did, posts_to_records(self.posts, self.handle))
+            self._repo_car = buffer.getvalue()
+        return 200, self._repo_car
+
+    def get_did_document(self, did: str):
+        if did != self.did:
+            return 404, {'message': f"DID not registered: {did}"}
+        return 200, {
+            'id': self.did,
+            'alsoKnownAs': [f"at://{self.handle}"],
+            'service': [{
+                'id': '#atproto_pds',
+                'type': 'AtprotoPersonalDataServer',
+                'serviceEndpoint': self.root_url,
+            }],
+        }
+
+def load_posts(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in XRPC server replaying all_posts.json")
+    parser.add_argument('--posts', default='all_posts.json')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered 502")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument('--rate-limit', type=int, default=3000, help="requests per 5-minute window")
+    parser.add_argument('--connect-latency-ms', type=float, default=0.0,
+                        help="delay charged once per new connection (handshake cost)")
+    parser.add_argument('--no-compress', action='store_true', help="never gzip responses")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+                        rate_limit=args.rate_limit, connect_latency_ms=args.connect_latency_ms,
+                        compress=not args.no_compress)
+    server = StubXrpcServer(load_posts(args.posts), config, port=args.port)
+    print(f"Serving {len(server.feed)} feed items for @{server.handle} at {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()